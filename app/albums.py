@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from aiogram.types import Message
+
+from app.metrics import SIZE_BUCKETS, metrics
+
+logger = logging.getLogger(__name__)
+
+# Альбомы (media group): Telegram присылает каждое фото альбома отдельным апдейтом.
+# Буфер копит апдейты одного media_group_id, пока они приходят чаще ALBUM_WINDOW,
+# и отдаёт их одной пачкой (в порядке альбома) — одна запись в БД и один ответ
+# вместо N. Обработчик апдейта не ждёт окна: пачку обрабатывает отдельная задача,
+# поэтому буфер работает и при строго последовательной обработке апдейтов чата.
+
+ALBUM_WINDOW = 1.0  # сек тишины после последнего фото — альбом собран
+
+OnReady = Callable[[list[Message]], Awaitable[None]]
+
+
+@dataclass
+class _Group:
+    on_ready: OnReady
+    messages: list[Message] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+
+class AlbumBuffer:
+    def __init__(self, window: float = ALBUM_WINDOW) -> None:
+        self.window = window
+        self._groups: dict[tuple[int, str], _Group] = {}
+        self._running: dict[asyncio.Task, int] = {}
+
+    def add(self, message: Message, on_ready: OnReady) -> None:
+        """Кладёт фото альбома в буфер; on_ready первого фото получит весь альбом."""
+        key = (message.chat.id, message.media_group_id)
+        g = self._groups.get(key)
+        if g is None:
+            g = self._groups[key] = _Group(on_ready)
+        g.messages.append(message)
+        if g.timer is not None:
+            g.timer.cancel()
+        g.timer = asyncio.get_running_loop().call_later(self.window, self._fire, key)
+
+    def _fire(self, key: tuple[int, str]) -> None:
+        g = self._groups.pop(key, None)
+        if g is None:
+            return
+        task = asyncio.create_task(self._run(g))
+        self._running[task] = key[0]
+        task.add_done_callback(self._running.pop)
+
+    @staticmethod
+    async def _run(g: _Group) -> None:
+        messages = sorted(g.messages, key=lambda m: m.message_id)
+        metrics.observe("album_size", len(messages), buckets=SIZE_BUCKETS)
+        try:
+            await g.on_ready(messages)
+        except Exception:
+            logger.exception("albums: batch of %s failed", len(messages))
+
+    async def flush(self, chat_id: int) -> None:
+        """Дообработать альбомы чата прямо сейчас (например, перед "✅ Готово")."""
+        for key in [k for k in self._groups if k[0] == chat_id]:
+            g = self._groups.pop(key)
+            if g.timer is not None:
+                g.timer.cancel()
+            await self._run(g)
+        running = [t for t, c in self._running.items() if c == chat_id]
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
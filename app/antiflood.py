@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+from aiogram.types import Update
+
+from app.metrics import metrics
+
+# Анти-флуд: token bucket на пользователя, проверка при приёме апдейта.
+#
+# Каждое сообщение / нажатие стоит токен; запас — burst, пополнение — rate в
+# секунду. Без токена апдейт даже не встаёт в очередь чата (ChatQueues зовёт
+# admit до постановки): нажатию отвечаем пустым answerCallbackQuery (чтобы у
+# пользователя не крутились "часики"), сообщение молча пропускаем. Альбом
+# (media group) считается за одно сообщение. Отброшенное так нажатие не стоит в
+# очереди чата и не задерживает экран нажатия перед ним (см. app/updates.py).
+#
+# Состояние — OrderedDict в порядке последней активности, не больше max_users
+# записей. Запись пользователя, который молчит дольше, чем нужно на полное
+# пополнение, ничего не помнит — такие удаляются с начала словаря по ходу дела.
+
+RATE = 2.0  # токенов/сек
+BURST = 5
+MAX_USERS = 10_000
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "media_group")
+
+    def __init__(self, tokens: float, now: float) -> None:
+        self.tokens = tokens
+        self.updated = now
+        self.media_group: str | None = None
+
+
+class AntiFlood:
+    def __init__(
+        self,
+        rate: float = RATE,
+        burst: int = BURST,
+        admin_ids: Iterable[int] = (),
+        exempt_admins: bool = True,
+        max_users: int = MAX_USERS,
+    ) -> None:
+        self.rate = rate
+        self.burst = float(burst)
+        self.exempt = frozenset(admin_ids) if exempt_admins else frozenset()
+        self.max_users = max_users
+        self._idle = self.burst / rate  # за столько секунд запас восстанавливается полностью
+        self._buckets: OrderedDict[int, _Bucket] = OrderedDict()
+        self._answers: set[asyncio.Task] = set()
+
+    def _cleanup(self, now: float) -> None:
+        while self._buckets:
+            uid, b = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_users and now - b.updated < self._idle:
+                return
+            del self._buckets[uid]
+
+    def allow(self, user_id: int, media_group: str | None = None) -> bool:
+        now = time.monotonic()
+        b = self._buckets.get(user_id)
+        if b is None:
+            b = self._buckets[user_id] = _Bucket(self.burst, now)
+        else:
+            self._buckets.move_to_end(user_id)
+            b.tokens = min(self.burst, b.tokens + (now - b.updated) * self.rate)
+            b.updated = now
+        self._cleanup(now)
+        if media_group is not None and media_group == b.media_group:
+            return True
+        if b.tokens < 1:
+            return False
+        b.tokens -= 1
+        b.media_group = media_group
+        return True
+
+    def admit(self, update: Update) -> bool:
+        """Пускать ли апдейт в обработку; отброшенному нажатию отвечает в фоне."""
+        event = update.message or update.callback_query
+        user = event.from_user if event is not None else None
+        if user is None or user.id in self.exempt:
+            return True
+
+        media_group = update.message.media_group_id if update.message else None
+        allowed = self.allow(user.id, media_group)
+        metrics.set("antiflood_tracked", len(self._buckets))
+        if allowed:
+            return True
+
+        if update.callback_query is not None:
+            metrics.inc("antiflood_dropped", kind="callback")
+            task = asyncio.create_task(self._answer(update))
+            self._answers.add(task)
+            task.add_done_callback(self._answers.discard)
+        else:
+            metrics.inc("antiflood_dropped", kind="message")
+        return False
+
+    @staticmethod
+    async def _answer(update: Update) -> None:
+        try:
+            await update.callback_query.answer()
+        except Exception:
+            pass
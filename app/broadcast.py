@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterable, Awaitable, Callable, Iterable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from app import texts
+from app.db.repo import Repo
+from app.metrics import RateMeter, metrics
+from app.outbound import ADMIN, BULK, outbound_lane
+from app.resilience import not_sent
+from app.segments import Segments
+from app.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram: ~30 сообщений/сек на бота в разные чаты, ~1 сообщение/сек в один чат.
+DEFAULT_RATE = 28.0
+DEFAULT_WORKERS = 16
+PER_CHAT_INTERVAL = 1.0
+MAX_ATTEMPTS = 3
+
+# итоги доставки
+OK = "ok"
+BLOCKED = "blocked"
+DEACTIVATED = "deactivated"
+FLOOD = "flood"
+NETWORK = "network"
+BAD_REQUEST = "bad_request"
+OTHER = "other"
+
+SendOne = Callable[[int], Awaitable[object]]
+OnResult = Callable[[int, str], Awaitable[None]]
+Gate = Callable[[], Awaitable[None]]
+
+
+def classify_error(exc: BaseException) -> str:
+    if isinstance(exc, TelegramRetryAfter):
+        return FLOOD
+    if isinstance(exc, TelegramForbiddenError):
+        return DEACTIVATED if "deactivated" in str(exc).lower() else BLOCKED
+    if isinstance(exc, (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError)):
+        return NETWORK
+    if isinstance(exc, TelegramBadRequest):
+        return BAD_REQUEST
+    return OTHER
+
+
+@dataclass
+class BroadcastResult:
+    outcomes: Counter = field(default_factory=Counter)
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+
+    @property
+    def ok(self) -> int:
+        return self.outcomes[OK]
+
+    @property
+    def fail(self) -> int:
+        return sum(v for k, v in self.outcomes.items() if k != OK)
+
+    def summary(self) -> str:
+        lines = [f"Успешно: {self.ok} / Ошибок: {self.fail}"]
+        failed = [(k, v) for k, v in self.outcomes.items() if k != OK and v]
+        if failed:
+            lines.append(", ".join(f"{k}: {v}" for k, v in sorted(failed)))
+        if self.finished_at is not None:
+            lines.append(f"Время: {self.finished_at - self.started_at:.0f} с")
+        return "\n".join(lines)
+
+
+class Broadcaster:
+    """Рассылка пулом воркеров под общим лимитом скорости.
+
+    - общий TokenBucket на все рассылки процесса (лимит Telegram на бота);
+    - не чаще раза в PER_CHAT_INTERVAL в один чат;
+    - RetryAfter ставит на паузу весь bucket и повторяет отправку;
+    - недошедшие запросы (нет соединения, breaker) повторяются с backoff,
+      остальные ошибки — сразу в итог.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, workers: int = DEFAULT_WORKERS) -> None:
+        self.bucket = TokenBucket(rate)
+        self.workers = max(1, workers)
+        self._chat_next: dict[int, float] = {}
+
+    async def run(
+        self,
+        chat_ids: Iterable[int] | AsyncIterable[int],
+        send_one: SendOne,
+        on_result: OnResult | None = None,
+        rate: float | None = None,
+        gate: Gate | None = None,
+    ) -> BroadcastResult:
+        """rate — дополнительный лимит этой рассылки (сообщ./сек) поверх общего;
+        gate — ожидание перед каждой отправкой (например, пауза в часы пик)."""
+        result = BroadcastResult()
+        queue: asyncio.Queue[int | None] = asyncio.Queue(maxsize=self.workers * 4)
+        run_bucket = TokenBucket(rate, capacity=1) if rate else None
+
+        async def worker() -> None:
+            # всё, что воркер шлёт, — в полосе рассылок, после интерактивных ответов
+            with outbound_lane(BULK):
+                while True:
+                    chat_id = await queue.get()
+                    try:
+                        if chat_id is None:
+                            return
+                        if gate is not None:
+                            await gate()
+                        if run_bucket is not None:
+                            await run_bucket.acquire()
+                        outcome = await self._deliver(chat_id, send_one)
+                        result.outcomes[outcome] += 1
+                        metrics.inc("broadcast_deliveries", outcome=outcome)
+                        if on_result is not None:
+                            await on_result(chat_id, outcome)
+                    finally:
+                        queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            if isinstance(chat_ids, AsyncIterable):
+                async for chat_id in chat_ids:
+                    await queue.put(chat_id)
+            else:
+                for chat_id in chat_ids:
+                    await queue.put(chat_id)
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+        result.finished_at = time.monotonic()
+        return result
+
+    async def _deliver(self, chat_id: int, send_one: SendOne) -> str:
+        outcome = OTHER
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await self._pace_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                await send_one(chat_id)
+                return OK
+            except Exception as e:
+                outcome = classify_error(e)
+                if outcome == FLOOD:
+                    retry_after = getattr(e, "retry_after", 1)
+                    metrics.inc("broadcast_retry_after")
+                    logger.warning("broadcast: flood control, pause %ss", retry_after)
+                    self.bucket.pause(retry_after)
+                    continue
+                # повторяем, только если сообщение точно не ушло — иначе получатель увидит дубль
+                if outcome == NETWORK and attempt < MAX_ATTEMPTS and not_sent(e):
+                    await asyncio.sleep(min(10.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+                    continue
+                if outcome == OTHER:
+                    logger.exception("broadcast: unexpected error for %s", chat_id)
+                return outcome
+            finally:
+                self._chat_next[chat_id] = time.monotonic() + PER_CHAT_INTERVAL
+        return outcome
+
+    async def _pace_chat(self, chat_id: int) -> None:
+        nxt = self._chat_next.pop(chat_id, None)
+        if nxt is not None:
+            delay = nxt - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        # заодно чистим устаревшие отметки, чтобы словарь не рос
+        if len(self._chat_next) > 10_000:
+            now = time.monotonic()
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+
+
+# --------- Durable jobs ----------
+
+FLUSH_BATCH = 100  # итогов в одной транзакции
+FLUSH_INTERVAL = 2.0  # сек; не держим итоги в памяти дольше
+AUDIENCE_CHUNK = 500  # получателей за один SELECT
+MIN_WINDOW_RATE = 0.05  # сообщ./сек — не медленнее, даже если окно почти закончилось
+BUSY_CHECK_INTERVAL = 5.0  # сек между проверками нагрузки в off-peak режиме
+
+
+def broadcast_markup(link_text: str | None, link_url: str | None) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    if link_text and link_url:
+        kb.button(text=link_text, url=link_url)
+    kb.button(text="🏠 Главное меню", callback_data="menu:main")
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+class BroadcastJobs:
+    """Долговечные рассылки поверх broadcast_jobs / broadcast_deliveries.
+
+    Аудитория снимается один раз при создании; получатели отмечаются пачками,
+    поэтому после рестарта задание продолжается с первого недоставленного.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        repo: Repo,
+        broadcaster: Broadcaster,
+        segments: Segments,
+        traffic: RateMeter | None = None,
+        busy_updates_per_sec: float = 5.0,
+    ) -> None:
+        self.bot = bot
+        self.repo = repo
+        self.broadcaster = broadcaster
+        self.segments = segments
+        # интерактивная нагрузка (апдейтов/сек) — для off-peak заданий
+        self.traffic = traffic
+        self.busy_updates_per_sec = busy_updates_per_sec
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._stop: dict[int, asyncio.Event] = {}
+
+    def is_active(self, job_id: int) -> bool:
+        return job_id in self._tasks
+
+    async def create(
+        self,
+        audience: str,
+        src_chat_id: int,
+        src_msg_id: int,
+        link_text: str | None,
+        link_url: str | None,
+        created_by: int | None,
+        deliver_until: str | None = None,
+        offpeak: bool = False,
+        scheduled_job_id: int | None = None,
+    ) -> tuple[int, int]:
+        """audience — выражение сегментов (см. app.segments), например 'role:collector&city:spb'.
+        deliver_until — растянуть доставку до этого момента (UTC ISO);
+        offpeak — приостанавливать доставку, пока интерактивная нагрузка высокая;
+        scheduled_job_id — отложенная задача, создавшая рассылку (на одну задачу — одно задание)."""
+        recipients = self.segments.members(self.segments.audience(audience))
+        job_id, total = await self.repo.create_broadcast_job(
+            audience, src_chat_id, src_msg_id, link_text, link_url, created_by, recipients,
+            deliver_until=deliver_until, offpeak=offpeak, scheduled_job_id=scheduled_job_id,
+        )
+        self._start(job_id)
+        return job_id, total
+
+    async def run_scheduled(self, scheduled_job_id: int, payload: dict) -> str:
+        """Обработчик планировщика (kind='broadcast'): запуск отложенной рассылки.
+
+        Отложенные рассылки всегда off-peak; window_hours > 0 — растянуть доставку на окно.
+        Процесс упал после создания задания, но до finish_scheduled_job — задача снова
+        в очереди, но второй рассылки не будет: задание уже есть, его и продолжаем.
+        """
+        job = await self.repo.get_scheduled_broadcast_job(scheduled_job_id)
+        if job is not None:
+            if job["status"] == "running":
+                self._start(job["id"])
+            return f"broadcast #{job['id']}, {job['total']} получателей"
+
+        window = float(payload.get("window_hours") or 0)
+        deliver_until = None
+        if window > 0:
+            until = datetime.now(timezone.utc) + timedelta(hours=window)
+            deliver_until = until.replace(microsecond=0).isoformat()
+        job_id, total = await self.create(
+            payload["audience"],
+            payload["src_chat_id"],
+            payload["src_msg_id"],
+            payload.get("link_text"),
+            payload.get("link_url"),
+            payload.get("created_by"),
+            deliver_until=deliver_until,
+            offpeak=True,
+            scheduled_job_id=scheduled_job_id,
+        )
+        if payload.get("created_by"):
+            try:
+                with outbound_lane(ADMIN):
+                    await self.bot.send_message(
+                        payload["created_by"],
+                        f"Запланированная рассылка запущена: #{job_id}, {total} получателей.",
+                    )
+            except Exception:
+                logger.warning("broadcast job #%s: can't notify admin", job_id, exc_info=True)
+        return f"broadcast #{job_id}, {total} получателей"
+
+    async def resume_all(self) -> None:
+        """Вызывается на старте: подхватывает задания, прерванные рестартом."""
+        for job in await self.repo.list_broadcast_jobs(limit=100, status="running"):
+            logger.info("broadcast job #%s: resuming", job["id"])
+            self._start(job["id"])
+
+    async def pause(self, job_id: int) -> None:
+        await self.repo.set_broadcast_job_status(job_id, "paused")
+        await self._halt(job_id)
+
+    async def resume(self, job_id: int) -> None:
+        await self.repo.set_broadcast_job_status(job_id, "running")
+        self._start(job_id)
+
+    async def cancel(self, job_id: int) -> None:
+        await self.repo.set_broadcast_job_status(job_id, "cancelled")
+        await self._halt(job_id)
+
+    async def shutdown(self) -> None:
+        # статус в БД не трогаем: running-задания продолжатся после рестарта
+        for job_id in list(self._tasks):
+            await self._halt(job_id)
+
+    def _start(self, job_id: int) -> None:
+        if job_id in self._tasks:
+            return
+        self._stop[job_id] = asyncio.Event()
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _t: self._forget(job_id))
+
+    def _forget(self, job_id: int) -> None:
+        self._tasks.pop(job_id, None)
+        self._stop.pop(job_id, None)
+
+    async def _halt(self, job_id: int) -> None:
+        stop = self._stop.get(job_id)
+        task = self._tasks.get(job_id)
+        if stop is not None:
+            stop.set()
+        if task is not None:
+            # воркеры дошлют уже взятые сообщения и запишут итоги
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _recipients(self, job_id: int, stop: asyncio.Event):
+        # очередь Broadcaster ограничена, поэтому куски читаются по мере отправки
+        async for tid in self.repo.iter_pending_deliveries(job_id, chunk=AUDIENCE_CHUNK):
+            if stop.is_set():
+                return
+            yield tid
+
+    async def _run(self, job_id: int) -> None:
+        job = await self.repo.get_broadcast_job(job_id)
+        if not job or job["status"] != "running":
+            return
+        stop = self._stop[job_id]
+        markup = broadcast_markup(job["link_text"], job["link_url"])
+
+        async def send_one(uid: int):
+            return await self.bot.copy_message(
+                chat_id=uid,
+                from_chat_id=job["src_chat_id"],
+                message_id=job["src_msg_id"],
+                reply_markup=markup,
+            )
+
+        buf: list[tuple[int, str]] = []
+        last_flush = time.monotonic()
+
+        async def flush() -> None:
+            nonlocal buf, last_flush
+            batch, buf = buf, []
+            last_flush = time.monotonic()
+            await self.repo.mark_deliveries(job_id, batch)
+
+        async def on_result(uid: int, outcome: str) -> None:
+            buf.append((uid, outcome))
+            if len(buf) >= FLUSH_BATCH or time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                await flush()
+
+        async def offpeak_gate() -> None:
+            while self._busy() and not stop.is_set():
+                metrics.inc("broadcast_offpeak_waits")
+                await asyncio.sleep(BUSY_CHECK_INTERVAL)
+
+        try:
+            await self.broadcaster.run(
+                self._recipients(job_id, stop),
+                send_one,
+                on_result,
+                rate=self._window_rate(job),
+                gate=offpeak_gate if job["offpeak"] else None,
+            )
+        finally:
+            await flush()
+
+        if stop.is_set():
+            return
+        await self.repo.set_broadcast_job_status(job_id, "done")
+        await self._report(job_id)
+
+    def _busy(self) -> bool:
+        return self.traffic is not None and self.traffic.rate() > self.busy_updates_per_sec
+
+    @staticmethod
+    def _window_rate(job: dict) -> float | None:
+        """Скорость, при которой оставшиеся получатели равномерно уложатся в окно доставки."""
+        if not job["deliver_until"]:
+            return None
+        left = (datetime.fromisoformat(job["deliver_until"]) - datetime.now(timezone.utc)).total_seconds()
+        pending = job["total"] - job["sent_ok"] - job["sent_fail"]
+        if left <= 0 or pending <= 0:
+            return None
+        return max(MIN_WINDOW_RATE, pending / left)
+
+    async def _report(self, job_id: int) -> None:
+        job = await self.repo.get_broadcast_job(job_id)
+        if not job or not job["created_by"]:
+            return
+        try:
+            text = f"{texts.BROADCAST_DONE_TEXT}\n{await self.progress_text(job_id)}"
+            with outbound_lane(ADMIN):
+                await self.bot.send_message(job["created_by"], text)
+        except Exception:
+            logger.warning("broadcast job #%s: can't report to admin", job_id, exc_info=True)
+
+    async def progress_text(self, job_id: int) -> str:
+        job = await self.repo.get_broadcast_job(job_id)
+        if not job:
+            return f"Рассылка #{job_id} не найдена."
+        breakdown = await self.repo.broadcast_delivery_breakdown(job_id)
+        pending = breakdown.pop("pending", 0)
+        lines = [
+            f"Рассылка #{job_id} ({job['audience']}): {job['status']}",
+            f"Доставлено: {job['sent_ok']} / Ошибок: {job['sent_fail']} / Осталось: {pending} из {job['total']}",
+        ]
+        failed = [(k, v) for k, v in breakdown.items() if k != OK]
+        if failed:
+            lines.append(", ".join(f"{k}: {v}" for k, v in sorted(failed)))
+        if job["deliver_until"]:
+            lines.append(f"Доставка до {job['deliver_until']} (UTC)")
+        if job["offpeak"]:
+            lines.append("Пауза в часы пик: да" + (" — сейчас ждёт" if self._busy() else ""))
+        return "\n".join(lines)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import logging
+import operator
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.filters.callback_data import CallbackQueryFilter
+from aiogram.types import CallbackQuery
+from magic_filter import MagicFilter
+from magic_filter.operations import CallOperation, ComparatorOperation, GetAttributeOperation
+
+from app.metrics import SIZE_BUCKETS, metrics
+
+logger = logging.getLogger(__name__)
+
+# Индекс callback-хендлеров: вместо перебора всех роутеров и их фильтров
+# F.data == "..." / F.data.startswith("...") по порядку — словарь.
+#
+# При старте обходим роутеры в том же порядке, что и aiogram (dp, потом
+# под-роутеры в глубину), и раскладываем хендлеры: точное значение -> список,
+# префикс на ":" -> список. Фабрики callback_data (app/callbacks.py) — тоже
+# префиксы: "<prefix>:" и старые __legacy__. Для callback_data кандидаты — точное совпадение плюс
+# префиксы на каждой границе ":" (несколько обращений к dict, сколько бы экранов
+# ни было); хендлеры с другими фильтрами (или без фильтра по data) проверяются
+# всегда, на своём месте в цепочке. У кандидатов остальные фильтры (StateFilter
+# и т.п.) и inner middleware срабатывают как обычно, первый подошедший и
+# вызывается — ровно как в цепочке aiogram.
+#
+# После сборки индекс сверяется с самими фильтрами: на каждом ключе список
+# подходящих хендлеров должен совпасть с линейным проходом. Не совпало, или у
+# под-роутеров есть свои outer middleware / фильтры роутера — индекс выключается
+# и работает обычная цепочка. Строится один раз: хендлеры, добавленные после
+# build, индекс не увидит. Регистрировать последним outer middleware
+# dp.callback_query.
+#
+# Индекс повторяет обход цепочки на внутренностях aiogram (magic._operations,
+# observer._handler, _resolve_middlewares, TelegramEventObserver.trigger), а
+# verify сверяет только фильтры, поэтому версия aiogram закреплена в
+# requirements.txt; tests/test_callback_index.py гоняет одни и те же callback'и
+# через настоящий Dispatcher и через индекс и ждёт одного и того же хендлера.
+
+SEP = ":"
+
+# проверка строки data без события — для сверки индекса с цепочкой
+_Match = Callable[[str], bool]
+
+# (позиция в цепочке, роутер, observer, хендлер, проверка data или None)
+_Entry = tuple[int, Router, TelegramEventObserver, HandlerObject, _Match | None]
+
+
+def _magic_match(magic: MagicFilter) -> _Match:
+    return lambda data: bool(magic.resolve(SimpleNamespace(data=data)))
+
+
+def _data_filter(handler: HandlerObject) -> tuple[str, tuple[str, ...], _Match] | None:
+    """("eq" | "prefix", значения, проверка) для F.data == "...", F.data.startswith("...") и Factory.filter()."""
+    for f in handler.filters or ():
+        if isinstance(f.callback, CallbackQueryFilter):
+            # unpack фабрики не примет строку без её префикса; правило фабрики проверит h.check
+            cls = f.callback.callback_data
+            keys = (cls.__prefix__ + cls.__separator__, *getattr(cls, "__legacy__", ()))
+            return "prefix", keys, lambda data, keys=keys: data.startswith(keys)
+        magic = f.magic
+        if magic is None:
+            continue
+        ops = magic._operations
+        if not ops or not isinstance(ops[0], GetAttributeOperation) or ops[0].name != "data":
+            continue
+        if (
+            len(ops) == 2
+            and isinstance(ops[1], ComparatorOperation)
+            and ops[1].comparator is operator.eq
+            and isinstance(ops[1].right, str)
+        ):
+            return "eq", (ops[1].right,), _magic_match(magic)
+        if (
+            len(ops) == 3
+            and isinstance(ops[1], GetAttributeOperation)
+            and ops[1].name == "startswith"
+            and isinstance(ops[2], CallOperation)
+            and len(ops[2].args) == 1
+            and isinstance(ops[2].args[0], str)
+            and not ops[2].kwargs
+        ):
+            return "prefix", (ops[2].args[0],), _magic_match(magic)
+    return None
+
+
+class CallbackIndex(BaseMiddleware):
+    def __init__(self, root: Router) -> None:
+        self.exact: dict[str, list[_Entry]] = {}
+        self.prefixes: dict[str, list[_Entry]] = {}
+        self.always: list[_Entry] = []
+        self._all: list[_Entry] = []
+        self.enabled = False
+        self.build(root)
+
+    def build(self, root: Router) -> None:
+        self.exact, self.prefixes, self.always, self._all = {}, {}, [], []
+        for router in root.chain_tail:
+            observer = router.observers["callback_query"]
+            if observer._handler.filters or (router is not root and len(observer.outer_middleware)):
+                logger.warning("callback index: router %s has own filters/outer middleware, disabled", router.name)
+                self.enabled = False
+                return
+            for handler in observer.handlers:
+                parsed = _data_filter(handler)
+                entry = (len(self._all), router, observer, handler, parsed[2] if parsed else None)
+                self._all.append(entry)
+                if parsed is None:
+                    self.always.append(entry)
+                elif parsed[0] == "eq":
+                    self.exact.setdefault(parsed[1][0], []).append(entry)
+                elif all(p.endswith(SEP) for p in parsed[1]):
+                    for p in parsed[1]:
+                        self.prefixes.setdefault(p, []).append(entry)
+                else:
+                    # префикс не по границе ":" — в индекс не кладём, проверяем всегда
+                    self.always.append(entry)
+        self.enabled = self.verify()
+        logger.info(
+            "callback index: %s handlers, %s exact, %s prefixes, %s unindexed%s",
+            len(self._all), len(self.exact), len(self.prefixes), len(self.always),
+            "" if self.enabled else " (disabled)",
+        )
+
+    def candidates(self, data: str | None) -> list[_Entry]:
+        if data is None:
+            return self.always
+        found = list(self.exact.get(data, ()))
+        i = data.find(SEP)
+        while i != -1:
+            found += self.prefixes.get(data[:i + 1], ())
+            i = data.find(SEP, i + 1)
+        if self.always:
+            found += self.always
+        if len(found) > 1:
+            found.sort(key=lambda e: e[0])
+        return found
+
+    def verify(self) -> bool:
+        """Индекс на каждом ключе даёт те же хендлеры и в том же порядке, что и проверка всех фильтров подряд."""
+        samples = set(self.exact)
+        for p in self.prefixes:
+            samples |= {p, p + "0", p + "x" + SEP + "1"}
+        for data in sorted(samples):
+            expected = [e[0] for e in self._all if e[4] is None or e[4](data)]
+            got = [e[0] for e in self.candidates(data)]
+            if got != expected:
+                logger.error("callback index: mismatch on %r: index %s, chain %s", data, got, expected)
+                return False
+        return True
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: dict[str, Any],
+    ) -> Any:
+        if not self.enabled:
+            return await handler(event, data)
+        found = self.candidates(event.data)
+        metrics.observe("callback_candidates", len(found), buckets=SIZE_BUCKETS)
+        # то же, что Router.propagate_event + TelegramEventObserver.trigger, но только по кандидатам
+        for _, router, observer, h, _ in found:
+            kwargs = {**data, "event_router": router, "handler": h}
+            ok, extra = await h.check(event, **kwargs)
+            if not ok:
+                continue
+            kwargs.update(extra)
+            try:
+                wrapped = observer.outer_middleware.wrap_middlewares(observer._resolve_middlewares(), h.call)
+                return await wrapped(event, kwargs)
+            except SkipHandler:
+                continue
+        return UNHANDLED
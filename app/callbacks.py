@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+from typing import Annotated, Any, ClassVar, Literal
+
+from aiogram.filters.callback_data import MAX_CALLBACK_LENGTH, CallbackData
+from pydantic import Field
+
+# Типизированные callback_data вместо f"collection:{cid}:{offset}" и ручного
+# cb.data.split(":") в каждом хендлере.
+#
+# Compact — CallbackData aiogram с компактной упаковкой: префикс в 1–2 буквы,
+# целые в base36, все bool-поля одной битовой маской последним сегментом
+# ("co:1b:0" вместо "collection:47:0"). Хендлер пишется как
+# @router.callback_query(CollectionPage.filter()) и получает готовый
+# callback_data: CollectionPage — разбор и маршрутизация в одном месте.
+#
+# Разбор строгий: чужой префикс, не то число сегментов, не base36, лишние биты
+# маски, значение вне Literal / ge / le — unpack бросает ValueError/TypeError,
+# фильтр aiogram отвечает "не подошло", до хендлера подделка не доходит. Права
+# (админ ли) по-прежнему проверяет хендлер.
+#
+# __legacy__ — префиксы старого формата для кнопок, которые живут долго
+# (каталог в чатах пользователей, дайджесты у админов): их разбирает from_legacy.
+# CallbackIndex кладёт такие хендлеры в индекс и по новому, и по старым префиксам.
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+Id = Annotated[int, Field(ge=1)]
+Offset = Annotated[int, Field(ge=0, le=100_000)]
+SculptureStatus = Literal["in_expo", "available", "sold", "on_request"]
+Role = Literal["collector", "dealer", "author", "interest"]
+City = Literal["spb", "moscow", "yerevan", "dubai"]
+
+
+def b36(n: int) -> str:
+    if n < 0:
+        return "-" + b36(-n)
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = _DIGITS[r] + out
+        if not n:
+            return out
+
+
+class Compact(CallbackData, prefix="~"):
+    """База компактных callback_data; сама по себе в кнопках не используется."""
+
+    __legacy__: ClassVar[tuple[str, ...]] = ()
+
+    @classmethod
+    def _layout(cls) -> tuple[list[tuple[str, Any]], list[str]]:
+        """(обычные поля с типом, bool-поля) в порядке объявления."""
+        plain, flags = [], []
+        for name, field in cls.model_fields.items():
+            if field.annotation is bool:
+                flags.append(name)
+            else:
+                plain.append((name, field.annotation))
+        return plain, flags
+
+    def pack(self) -> str:
+        plain, flags = self._layout()
+        parts = [self.__prefix__]
+        for name, _ in plain:
+            value = getattr(self, name)
+            if isinstance(value, int):
+                parts.append(b36(value))
+                continue
+            value = str(value)
+            if self.__separator__ in value:
+                raise ValueError(f"Separator symbol {self.__separator__!r} can not be used in {name}={value!r}")
+            parts.append(value)
+        if flags:
+            parts.append(b36(sum(1 << i for i, name in enumerate(flags) if getattr(self, name))))
+        packed = self.__separator__.join(parts)
+        if len(packed.encode()) > MAX_CALLBACK_LENGTH:
+            raise ValueError(f"Resulted callback data is too long! len({packed!r}) > {MAX_CALLBACK_LENGTH}")
+        return packed
+
+    @classmethod
+    def unpack(cls, value: str) -> Compact:
+        if len(value) > MAX_CALLBACK_LENGTH:
+            raise ValueError("callback data too long")
+        for legacy in cls.__legacy__:
+            if value.startswith(legacy):
+                return cls.from_legacy(legacy, value[len(legacy):].split(cls.__separator__))
+        prefix, *parts = value.split(cls.__separator__)
+        if prefix != cls.__prefix__:
+            raise ValueError(f"Bad prefix ({prefix!r} != {cls.__prefix__!r})")
+        plain, flags = cls._layout()
+        if len(parts) != len(plain) + bool(flags):
+            raise TypeError(f"Callback data {cls.__name__!r} takes {len(plain) + bool(flags)} segments")
+        payload: dict[str, Any] = {}
+        for (name, annotation), raw in zip(plain, parts):
+            payload[name] = int(raw, 36) if annotation is int else raw
+        if flags:
+            mask = int(parts[-1], 36)
+            if mask < 0 or mask >> len(flags):
+                raise ValueError("Bad flags")
+            payload.update((name, bool(mask >> i & 1)) for i, name in enumerate(flags))
+        return cls(**payload)  # pydantic проверит диапазоны и Literal
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> Compact:
+        raise ValueError(f"{cls.__name__}: legacy format is not supported")
+
+
+# ----- каталог -----
+
+class CollectionsPage(Compact, prefix="cp"):
+    offset: Offset = 0
+
+    __legacy__ = ("sculptures:collections:",)
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> CollectionsPage:
+        (offset,) = parts
+        return cls(offset=int(offset))
+
+
+class CollectionPage(Compact, prefix="co"):
+    collection_id: Id
+    offset: Offset = 0
+
+    __legacy__ = ("collection:",)
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> CollectionPage:
+        cid, offset = parts
+        return cls(collection_id=int(cid), offset=int(offset))
+
+
+class SculptureCard(Compact, prefix="sc"):
+    sculpture_id: Id
+    photo: Annotated[int, Field(ge=0, le=99)] = 0
+    in_place: bool = False  # листание фото: меняем экран на месте, в историю не пишем
+
+    __legacy__ = ("sculpture:", "sculpture_photo_next:")
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> SculptureCard:
+        sid, photo = parts
+        return cls(sculpture_id=int(sid), photo=int(photo), in_place=legacy == "sculpture_photo_next:")
+
+
+class FeedPage(Compact, prefix="fd"):
+    feed: Literal["new", "featured"]
+    offset: Offset = 0
+
+    __legacy__ = ("sculptures:new:", "sculptures:featured:")
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> FeedPage:
+        (offset,) = parts
+        return cls(feed=legacy.split(":")[1], offset=int(offset))
+
+
+class ProjectPage(Compact, prefix="pj"):
+    n: Annotated[int, Field(ge=1, le=3)]
+
+    __legacy__ = ("projects:",)
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> ProjectPage:
+        (n,) = parts
+        return cls(n=int(n))
+
+
+# ----- анкета и визит -----
+
+class RoleChoice(Compact, prefix="rl"):
+    role: Role
+
+    __legacy__ = ("role:",)
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> RoleChoice:
+        (role,) = parts
+        return cls(role=role)
+
+
+class CityChoice(Compact, prefix="ct"):
+    city: City
+
+    __legacy__ = ("city:",)
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> CityChoice:
+        (city,) = parts
+        return cls(city=city)
+
+
+# ----- админка -----
+
+class DraftCollection(Compact, prefix="ac"):
+    collection_id: Id
+
+
+class DraftStatus(Compact, prefix="as"):
+    status: SculptureStatus
+
+
+class DraftAnswer(Compact, prefix="aa"):
+    question: Literal["new", "feat", "bc"]
+    yes: bool
+
+
+class DraftAction(Compact, prefix="dr"):
+    draft_id: Id
+    discard: bool = False
+
+
+class JobAction(Compact, prefix="bj"):
+    action: Literal["pause", "resume", "cancel", "show"]
+    job_id: Id
+
+
+class AudiencePick(Compact, prefix="bs"):
+    # сегмент "role:collector" — group="role", value="collector"; без значения — "designer"
+    group: Literal["role", "city", "designer", "new", "reset", "done"]
+    value: str = ""
+
+    @property
+    def segment(self) -> str:
+        return f"{self.group}:{self.value}" if self.value else self.group
+
+    @classmethod
+    def of(cls, segment: str) -> AudiencePick:
+        group, _, value = segment.partition(":")
+        return cls(group=group, value=value)
+
+
+class ScheduledCancel(Compact, prefix="sx"):
+    job_id: Id
+
+
+class LeadsPref(Compact, prefix="ln"):
+    minutes: Annotated[int, Field(ge=0, le=1440)] = 0
+    now: bool = False  # "прислать дайджест сейчас" вместо смены режима
+
+    __legacy__ = ("lp:",)
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> LeadsPref:
+        (choice,) = parts
+        return cls(now=True) if choice == "now" else cls(minutes=int(choice))
+
+
+class DigestPage(Compact, prefix="dd"):
+    digest_id: Id
+    page: Offset = 0
+    edit: bool = False  # листание — правим сообщение; из сводки — шлём новое
+
+    __legacy__ = ("dg:",)
+
+    @classmethod
+    def from_legacy(cls, legacy: str, parts: list[str]) -> DigestPage:
+        # dg:<id> — из сводки, dg:<id>:<page> — листание
+        if len(parts) == 1:
+            return cls(digest_id=int(parts[0]))
+        digest_id, page = parts
+        return cls(digest_id=int(digest_id), page=int(page), edit=True)
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import posixpath
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, InputMediaPhoto, Message
+
+from app.db.repo import Repo, utcnow_iso
+from app.handlers.admin_content import MAX_PHOTOS, STATUSES
+from app.metrics import metrics
+from app.outbound import BULK, outbound_lane
+
+logger = logging.getLogger(__name__)
+
+# Массовый импорт каталога из ZIP (/import, см. handlers/admin_import.py).
+#
+# В архиве — manifest.csv или manifest.json и картинки. Строка манифеста — одна
+# работа: collection, title, artist, year, material, dimensions,
+# description_short, status, featured, new, photos (пути к файлам через ";" или
+# "|", относительно манифеста). Сначала проверяется весь манифест: есть ошибки —
+# ничего не импортируем. Потом пачками по CHUNK работ: фото заливаются в чат
+# админа альбомами по 10 (file_id берём из ответа, сообщения сразу удаляем),
+# не больше UPLOAD_CONCURRENCY запросов разом, в полосе BULK — темп держит
+# OutboundScheduler; затем пачка пишется в БД одной транзакцией.
+
+MAX_ARCHIVE_BYTES = 20 * 1024 * 1024  # больше getFile боту не отдаст
+MAX_UNPACKED_BYTES = 300 * 1024 * 1024
+MAX_PHOTO_BYTES = 10 * 1024 * 1024  # лимит Telegram на фото
+MAX_ITEMS = 1000
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+CHUNK = 25  # работ на транзакцию
+ALBUM = 10  # фото в одном sendMediaGroup
+UPLOAD_CONCURRENCY = 3
+
+_OPTIONAL = ("artist", "year", "material", "dimensions", "description_short")
+_TRUE = {"1", "да", "yes", "y", "true", "+"}
+_FALSE = {"", "0", "нет", "no", "n", "false", "-"}
+
+Progress = Callable[[int, int], Awaitable[None]]
+
+
+class ArchiveError(Exception):
+    """Архив или манифест нельзя прочитать."""
+
+
+@dataclass
+class ImportItem:
+    row: int
+    collection: str
+    fields: dict
+    photos: list[str]  # пути внутри архива
+
+
+@dataclass
+class ImportReport:
+    collections_created: int = 0
+    sculptures: int = 0
+    photos: int = 0
+    failed_photos: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def text(self) -> str:
+        lines = [
+            f"📦 Импорт завершён за {self.seconds:.0f} с.",
+            f"Коллекций создано: {self.collections_created}",
+            f"Скульптур добавлено: {self.sculptures}",
+            f"Фото: {self.photos}",
+        ]
+        if self.failed_photos:
+            lines.append(f"Не загрузились фото ({len(self.failed_photos)}): " + ", ".join(self.failed_photos[:10]))
+        if self.skipped:
+            lines.append(f"Пропущены работы ({len(self.skipped)}):")
+            lines += self.skipped[:10]
+        return "\n".join(lines)
+
+
+def _flag(value) -> bool | None:
+    """Да/нет из CSV или JSON; None — не распознали."""
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    v = str(value).strip().lower()
+    if v in _TRUE:
+        return True
+    if v in _FALSE:
+        return False
+    return None
+
+
+def _text(value) -> str | None:
+    v = str(value).strip() if value is not None else ""
+    return v or None
+
+
+class CatalogImport:
+    def __init__(self, data: bytes) -> None:
+        try:
+            self.zip = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile as e:
+            raise ArchiveError("это не ZIP-архив") from e
+        self.files = {
+            i.filename: i for i in self.zip.infolist()
+            if not i.is_dir() and not i.filename.startswith("__MACOSX/")
+        }
+        self.items: list[ImportItem] = []
+
+    @property
+    def photo_count(self) -> int:
+        return len({p for it in self.items for p in it.photos})
+
+    def _manifest(self) -> tuple[str, list[dict], int]:
+        """(папка манифеста, строки, номер первой строки для сообщений об ошибках)."""
+        found = sorted(
+            (n for n in self.files if posixpath.basename(n).lower() in ("manifest.csv", "manifest.json")),
+            key=lambda n: n.count("/"),
+        )
+        if not found:
+            raise ArchiveError("нет manifest.csv или manifest.json")
+        name = found[0]
+        try:
+            raw = self.zip.read(name).decode("utf-8-sig")
+        except UnicodeDecodeError as e:
+            raise ArchiveError(f"{name}: нужна кодировка UTF-8") from e
+        if name.lower().endswith(".json"):
+            try:
+                data = json.loads(raw)
+            except ValueError as e:
+                raise ArchiveError(f"{name}: {e}") from e
+            if isinstance(data, dict):
+                data = data.get("items")
+            if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+                raise ArchiveError(f"{name}: ожидается список объектов (или {{\"items\": [...]}})")
+            return posixpath.dirname(name), data, 1
+        header = raw.split("\n", 1)[0]
+        delimiter = ";" if header.count(";") > header.count(",") else ","
+        reader = csv.DictReader(io.StringIO(raw), delimiter=delimiter)
+        rows = [{k.strip().lower() if k is not None else None: v for k, v in r.items()} for r in reader]
+        return posixpath.dirname(name), rows, 2  # строка 1 — заголовок
+
+    def validate(self) -> list[str]:
+        """Разбирает манифест целиком; возвращает ошибки (пусто — можно импортировать)."""
+        base, rows, first = self._manifest()
+        if not rows:
+            return ["манифест пустой"]
+        if len(rows) > MAX_ITEMS:
+            return [f"в манифесте {len(rows)} строк, максимум {MAX_ITEMS} — разбейте на несколько архивов"]
+        if sum(i.file_size for i in self.files.values()) > MAX_UNPACKED_BYTES:
+            return [f"распакованный архив больше {MAX_UNPACKED_BYTES // 2**20} МБ"]
+
+        errors: list[str] = []
+        items: list[ImportItem] = []
+        now = utcnow_iso()
+        for n, raw in enumerate(rows, start=first):
+            problems: list[str] = []
+            if None in raw:
+                # DictReader складывает лишние ячейки под ключ None: разделитель внутри поля без кавычек
+                problems.append("лишние ячейки — поле с разделителем возьмите в кавычки или разделяйте фото '|'")
+            collection = _text(raw.get("collection"))
+            if not collection or len(collection) > 80:
+                problems.append("collection 1–80 символов")
+            title = _text(raw.get("title"))
+            if not title or len(title) > 120:
+                problems.append("title 1–120 символов")
+            status = _text(raw.get("status")) or "in_expo"
+            if status not in STATUSES:
+                problems.append(f"status должен быть одним из: {', '.join(STATUSES)}")
+            featured, new = _flag(raw.get("featured")), _flag(raw.get("new"))
+            if featured is None or new is None:
+                problems.append("featured/new: 1/0, да/нет")
+
+            photos = raw.get("photos") or []
+            if isinstance(photos, str):
+                photos = photos.replace("|", ";").split(";")
+            elif not isinstance(photos, list):
+                photos = []
+            paths = [posixpath.normpath(posixpath.join(base, str(p).strip())) for p in photos if str(p).strip()]
+            if not 1 <= len(paths) <= MAX_PHOTOS:
+                problems.append(f"нужно 1–{MAX_PHOTOS} фото")
+            for p in paths:
+                info = self.files.get(p)
+                if info is None:
+                    problems.append(f"нет файла {p}")
+                elif not p.lower().endswith(IMAGE_EXTENSIONS):
+                    problems.append(f"{p}: поддерживаются {', '.join(IMAGE_EXTENSIONS)}")
+                elif info.file_size > MAX_PHOTO_BYTES:
+                    problems.append(f"{p}: больше {MAX_PHOTO_BYTES // 2**20} МБ")
+
+            fields = {k: _text(raw.get(k)) for k in _OPTIONAL}
+            fields.update(title=title, status=status, is_featured=int(bool(featured)), published_at=now if new else None)
+            errors += [f"строка {n}: {e}" for e in problems]
+            items.append(ImportItem(row=n, collection=collection or "", fields=fields, photos=paths))
+        self.items = [] if errors else items
+        return errors
+
+    async def run(self, bot: Bot, repo: Repo, chat_id: int, progress: Progress | None = None) -> ImportReport:
+        report = ImportReport()
+        t0 = time.monotonic()
+        titles = list(dict.fromkeys(it.collection for it in self.items))
+        collection_ids, report.collections_created = await repo.ensure_collections(titles)
+
+        uploaded: dict[str, str] = {}  # путь -> file_id; одно фото у нескольких работ грузим один раз
+        for start in range(0, len(self.items), CHUNK):
+            chunk = self.items[start:start + CHUNK]
+            todo = list(dict.fromkeys(p for it in chunk for p in it.photos if p not in uploaded))
+            failed = await self._upload(bot, chat_id, todo, uploaded)
+            report.failed_photos += failed
+
+            rows = []
+            for it in chunk:
+                file_ids = [uploaded[p] for p in it.photos if p in uploaded]
+                if not file_ids:
+                    report.skipped.append(f"строка {it.row}: {it.fields['title']} — фото не загрузились")
+                    continue
+                rows.append((collection_ids[it.collection], it.fields, file_ids))
+            report.photos += await repo.import_sculptures(rows)
+            report.sculptures += len(rows)
+            if progress is not None:
+                await progress(start + len(chunk), len(self.items))
+
+        report.seconds = time.monotonic() - t0
+        metrics.inc("catalog_imports")
+        metrics.inc("catalog_imported_sculptures", report.sculptures)
+        return report
+
+    async def _upload(self, bot: Bot, chat_id: int, paths: list[str], uploaded: dict[str, str]) -> list[str]:
+        """Заливает фото альбомами, заполняет uploaded; возвращает пути, которые не удалось загрузить."""
+        sem = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        failed: list[str] = []
+
+        async def send(group: list[str]) -> None:
+            async with sem:
+                try:
+                    messages = await self._send_group(bot, chat_id, group)
+                except TelegramBadRequest:
+                    if len(group) == 1:
+                        failed.extend(group)
+                        return
+                    # битая картинка валит весь альбом — находим её поштучно
+                    for p in group:
+                        try:
+                            messages = await self._send_group(bot, chat_id, [p])
+                        except Exception:
+                            logger.warning("import: can't upload %s", p, exc_info=True)
+                            failed.append(p)
+                            continue
+                        await self._keep(bot, chat_id, [p], messages, uploaded)
+                    return
+                except Exception:
+                    logger.warning("import: can't upload %s files", len(group), exc_info=True)
+                    failed.extend(group)
+                    return
+                await self._keep(bot, chat_id, group, messages, uploaded)
+
+        await asyncio.gather(*(send(paths[i:i + ALBUM]) for i in range(0, len(paths), ALBUM)))
+        return failed
+
+    async def _send_group(self, bot: Bot, chat_id: int, group: list[str]) -> list[Message]:
+        files = [BufferedInputFile(self.zip.read(p), filename=posixpath.basename(p)) for p in group]
+        with outbound_lane(BULK):
+            if len(files) == 1:
+                return [await bot.send_photo(chat_id, files[0], disable_notification=True)]
+            return await bot.send_media_group(
+                chat_id, [InputMediaPhoto(media=f) for f in files], disable_notification=True
+            )
+
+    @staticmethod
+    async def _keep(
+        bot: Bot, chat_id: int, group: list[str], messages: list[Message], uploaded: dict[str, str]
+    ) -> None:
+        for p, m in zip(group, messages):
+            uploaded[p] = m.photo[-1].file_id
+        metrics.inc("catalog_import_photos", len(group))
+        try:
+            with outbound_lane(BULK):
+                await bot.delete_messages(chat_id, [m.message_id for m in messages])
+        except Exception:
+            logger.warning("import: can't delete upload messages", exc_info=True)
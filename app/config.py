@@ -16,11 +16,60 @@ def _parse_admin_ids(raw: str | None) -> set[int]:
     return out
 
 
+def _float_env(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def _int_env(name: str, default: int) -> int:
+    raw = (os.getenv(name) or "").strip()
+    return int(raw) if raw.lstrip("-").isdigit() else default
+
+
 @dataclass(frozen=True)
 class Config:
     bot_token: str
     admin_ids: set[int]
     db_path: str
+    # доля переходов Nav, которые трассируются (0..1)
+    trace_sample_rate: float = 1.0
+    # рассылки: сообщений/сек на бота и число параллельных воркеров
+    broadcast_rate: float = 28.0
+    broadcast_workers: int = 16
+    # исходящие запросы к Bot API: общий лимит запросов/сек на бота
+    outbound_rate: float = 30.0
+    # off-peak: "высокая нагрузка" — больше стольких апдейтов/сек от пользователей
+    busy_updates_per_sec: float = 5.0
+    # смещение локального времени админов от UTC (для расписания рассылок), часы
+    tz_offset_hours: int = 3
+    # лиды админам по умолчанию: 0 — сразу, N — дайджестом раз в N минут (админ может поменять в /leads)
+    lead_digest_minutes: int = 0
+    # приём апдейтов: "polling" или "webhook"
+    bot_mode: str = "polling"
+    webhook_base_url: str | None = None  # https://bot.example.com; пусто — setWebhook не вызываем
+    webhook_path: str = "/tg/webhook"
+    webhook_secret: str | None = None
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    # обработка апдейтов (polling и webhook): разные чаты параллельно, не больше update_concurrency
+    # одновременно, апдейты одного чата — строго по очереди; update_queue — предел ожидающих апдейтов
+    update_concurrency: int = 16
+    update_queue: int = 1000
+    # процессов-воркеров: 1 — всё в одном процессе; N — чаты делятся между N воркерами (app/sharding.py),
+    # update_concurrency / update_queue — на каждого
+    workers: int = 1
+    # хранилище FSM: "memory" или "sqlite" (переживает рестарт); TTL брошенных сценариев
+    fsm_storage: str = "memory"
+    fsm_ttl_hours: int = 72
+    # анти-флуд: апдейтов/сек на пользователя и запас (0 — выключено); админов не ограничиваем
+    antiflood_rate: float = 2.0
+    antiflood_burst: int = 5
+    antiflood_exempt_admins: bool = True
 
 
 def load_config() -> Config:
@@ -32,4 +81,26 @@ def load_config() -> Config:
         bot_token=token,
         admin_ids=_parse_admin_ids(os.getenv("ADMIN_IDS")),
         db_path=os.getenv("DB_PATH", "/data/bot.sqlite"),
+        trace_sample_rate=_float_env("TRACE_SAMPLE_RATE", 1.0),
+        broadcast_rate=_float_env("BROADCAST_RATE", 28.0),
+        broadcast_workers=_int_env("BROADCAST_WORKERS", 16),
+        outbound_rate=_float_env("OUTBOUND_RATE", 30.0),
+        busy_updates_per_sec=_float_env("BUSY_UPDATES_PER_SEC", 5.0),
+        tz_offset_hours=_int_env("TZ_OFFSET_HOURS", 3),
+        lead_digest_minutes=_int_env("LEAD_DIGEST_MINUTES", 0),
+        bot_mode=(os.getenv("BOT_MODE") or "polling").strip().lower(),
+        webhook_base_url=os.getenv("WEBHOOK_BASE_URL") or None,
+        webhook_path=os.getenv("WEBHOOK_PATH", "/tg/webhook"),
+        webhook_secret=os.getenv("WEBHOOK_SECRET") or None,
+        webhook_host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        webhook_port=_int_env("WEBHOOK_PORT", 8080),
+        # WEBHOOK_WORKERS / WEBHOOK_QUEUE — прежние имена, пока были только у webhook
+        update_concurrency=_int_env("UPDATE_CONCURRENCY", _int_env("WEBHOOK_WORKERS", 16)),
+        update_queue=_int_env("UPDATE_QUEUE", _int_env("WEBHOOK_QUEUE", 1000)),
+        workers=max(1, _int_env("WORKERS", 1)),
+        fsm_storage=(os.getenv("FSM_STORAGE") or "memory").strip().lower(),
+        fsm_ttl_hours=_int_env("FSM_TTL_HOURS", 72),
+        antiflood_rate=_float_env("ANTIFLOOD_RATE", 2.0),
+        antiflood_burst=_int_env("ANTIFLOOD_BURST", 5),
+        antiflood_exempt_admins=bool(_int_env("ANTIFLOOD_EXEMPT_ADMINS", 1)),
     )
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import asyncio
+import json
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable
 import aiosqlite
 
 
@@ -26,16 +30,89 @@ class User:
     designer_interest_at: str | None  # ✅ когда нажал "Сотрудничать"
     created_at: str | None
     updated_at: str | None
+    unreachable_at: str | None = None  # заблокировал бота / удалён (см. рассылки)
+
+
+@dataclass(frozen=True)
+class OutboxMessage:
+    """Сообщение, которое надо доставить после коммита (уведомления админам о лидах)."""
+    chat_id: int
+    text: str
+    parse_mode: str | None = None
+    kind: str = "lead"
+
+
+UserListener = Callable[[int], Awaitable[None]]
+
+BUSY_TIMEOUT_MS = 5000  # сколько ждать блокировку БД, занятую другим процессом
+
+# колонки users, по которым считаются сегменты рассылок (app/segments.py)
+_SEGMENT_COLS = (
+    "telegram_id, consent, notify_enabled, name, email, role, city, "
+    "designer_interest, unreachable_at, created_at"
+)
+
+# поля черновика, которые мастер может менять (имена колонок content_drafts)
+_DRAFT_FIELDS = frozenset({
+    "collection_id", "title", "artist", "year", "material", "dimensions",
+    "description_short", "status", "is_featured", "published_at",
+})
 
 
 class Repo:
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.conn: aiosqlite.Connection | None = None
+        # соединение одно на процесс: пока одна корутина между await'ами своей
+        # транзакции, чужой commit() зафиксировал бы её недописанной — см. _tx
+        self._tx_lock = asyncio.Lock()
+        self._tx_task: asyncio.Task | None = None
+        self._user_listeners: list[UserListener] = []
+        self._outbox_listeners: list[Callable[[], None]] = []
+
+    def add_user_listener(self, listener: UserListener) -> None:
+        """listener(telegram_id) вызывается после каждого коммита, меняющего строку users."""
+        self._user_listeners.append(listener)
+
+    async def _user_changed(self, *telegram_ids: int) -> None:
+        for listener in self._user_listeners:
+            for tid in telegram_ids:
+                await listener(tid)
+
+    def add_outbox_listener(self, listener: Callable[[], None]) -> None:
+        """listener() вызывается после коммита, добавившего строки в outbox."""
+        self._outbox_listeners.append(listener)
+
+    async def _put_outbox(self, messages: Iterable[OutboxMessage]) -> int:
+        """INSERT в outbox без коммита — внутри _tx вызывающего метода."""
+        now = utcnow_iso()
+        rows = [(m.kind, m.chat_id, m.text, m.parse_mode, now, now) for m in messages]
+        if rows:
+            await self._c().executemany(
+                """
+                INSERT INTO outbox(kind, chat_id, text, parse_mode, status, attempts, next_attempt_at, created_at)
+                VALUES(?, ?, ?, ?, 'pending', 0, ?, ?)
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def _outbox_changed(self) -> None:
+        for listener in self._outbox_listeners:
+            listener()
 
     async def connect(self) -> None:
-        self.conn = await aiosqlite.connect(self.db_path)
+        # БД может быть открыта несколькими процессами (WORKERS > 1, см. app/sharding.py):
+        # WAL — читатели не ждут писателя; транзакция берёт блокировку записи сразу
+        # (BEGIN IMMEDIATE перед первым INSERT/UPDATE), а не при первой записи после
+        # чтения — так занятая БД даёт ожидание busy_timeout, а не SQLITE_BUSY.
+        # Все записи идут через _tx: незакрытый BEGIN IMMEDIATE держал бы блокировку
+        # записи от всех процессов, поэтому транзакция всегда кончается commit или rollback.
+        self.conn = await aiosqlite.connect(self.db_path, isolation_level="IMMEDIATE")
         self.conn.row_factory = aiosqlite.Row
+        await self.conn.execute("PRAGMA journal_mode=WAL;")
+        await self.conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS};")
+        await self.conn.execute("PRAGMA synchronous=NORMAL;")
         await self.conn.execute("PRAGMA foreign_keys=ON;")
 
     async def close(self) -> None:
@@ -48,17 +125,37 @@ class Repo:
             raise RuntimeError("DB not connected")
         return self.conn
 
+    @asynccontextmanager
+    async def _tx(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Транзакция записи: под блокировкой соединения, commit при успехе,
+        rollback при любом исключении (в т.ч. отмене). Вложенные _tx не поддерживаются."""
+        if self._tx_task is not None and self._tx_task is asyncio.current_task():
+            raise RuntimeError("nested Repo._tx")
+        async with self._tx_lock:
+            self._tx_task = asyncio.current_task()
+            conn = self._c()
+            try:
+                yield conn
+                await conn.commit()
+            except BaseException:
+                await asyncio.shield(conn.rollback())
+                raise
+            finally:
+                self._tx_task = None
+
     async def init_schema(self, schema_path: str) -> None:
         """
         1) Создаёт таблицы из schema.sql (CREATE TABLE IF NOT EXISTS)
         2) Делает миграции для существующей БД (ALTER TABLE если колонок нет)
         """
         sql = Path(schema_path).read_text(encoding="utf-8")
-        await self._c().executescript(sql)
-        await self._c().commit()
-        await self._apply_migrations()
+        async with self._tx() as db:
+            await db.executescript(sql)
+        async with self._tx():
+            await self._apply_migrations()
 
     async def _apply_migrations(self) -> None:
+        """Внутри _tx вызывающего метода."""
         # --- users: designer_interest + designer_interest_at ---
         cols = await self._table_columns("users")
 
@@ -67,14 +164,43 @@ class Repo:
         if "designer_interest_at" not in cols:
             await self._c().execute("ALTER TABLE users ADD COLUMN designer_interest_at TEXT NULL")
 
-        await self._c().commit()
+        # --- users: unreachable_at (исключаем из рассылок) ---
+        if "unreachable_at" not in cols:
+            await self._c().execute("ALTER TABLE users ADD COLUMN unreachable_at TEXT NULL")
+        await self._c().execute(
+            "CREATE INDEX IF NOT EXISTS idx_users_unreachable ON users(unreachable_at)"
+        )
+
+        # --- broadcast_jobs: окно доставки + off-peak ---
+        bj_cols = await self._table_columns("broadcast_jobs")
+        if "deliver_until" not in bj_cols:
+            await self._c().execute("ALTER TABLE broadcast_jobs ADD COLUMN deliver_until TEXT NULL")
+        if "offpeak" not in bj_cols:
+            await self._c().execute("ALTER TABLE broadcast_jobs ADD COLUMN offpeak INTEGER DEFAULT 0")
+        if "scheduled_job_id" not in bj_cols:
+            await self._c().execute("ALTER TABLE broadcast_jobs ADD COLUMN scheduled_job_id INTEGER NULL")
+        await self._c().execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_broadcast_jobs_scheduled ON broadcast_jobs(scheduled_job_id)"
+            " WHERE scheduled_job_id IS NOT NULL"
+        )
+
+        # --- outbox: дайджесты лидов ---
+        if "digest_id" not in await self._table_columns("outbox"):
+            await self._c().execute("ALTER TABLE outbox ADD COLUMN digest_id INTEGER NULL")
+        await self._c().execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_digest ON outbox(digest_id) WHERE digest_id IS NOT NULL"
+        )
+        await self._c().execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_held ON outbox(chat_id, id) WHERE status='held'"
+        )
 
     async def _table_columns(self, table: str) -> set[str]:
         cur = await self._c().execute(f"PRAGMA table_info({table})")
         rows = await cur.fetchall()
         return {r["name"] for r in rows}
 
-    async def ensure_user_row(self, telegram_id: int) -> None:
+    async def _upsert_user_row(self, telegram_id: int) -> None:
+        """INSERT/touch строки users без коммита — внутри _tx вызывающего метода."""
         now = utcnow_iso()
         await self._c().execute(
             """
@@ -84,7 +210,11 @@ class Repo:
             """,
             (telegram_id, now, now),
         )
-        await self._c().commit()
+
+    async def ensure_user_row(self, telegram_id: int) -> None:
+        async with self._tx():
+            await self._upsert_user_row(telegram_id)
+        await self._user_changed(telegram_id)
 
     async def get_user(self, telegram_id: int) -> User | None:
         cur = await self._c().execute("SELECT * FROM users WHERE telegram_id=?", (telegram_id,))
@@ -97,87 +227,121 @@ class Repo:
         # На старых БД этих полей может не быть (до миграции)
         d.setdefault("designer_interest", 0)
         d.setdefault("designer_interest_at", None)
+        d.setdefault("unreachable_at", None)
 
         return User(**d)
 
+    async def iter_users_for_segments(self) -> AsyncIterator[aiosqlite.Row]:
+        """Все пользователи (колонки сегментов) в порядке регистрации — курсором, без списка в памяти."""
+        async with self._c().execute(
+            f"SELECT {_SEGMENT_COLS} FROM users ORDER BY COALESCE(created_at, ''), telegram_id"
+        ) as cur:
+            async for r in cur:
+                yield r
+
+    async def get_user_segment_row(self, telegram_id: int) -> aiosqlite.Row | None:
+        cur = await self._c().execute(f"SELECT {_SEGMENT_COLS} FROM users WHERE telegram_id=?", (telegram_id,))
+        return await cur.fetchone()
+
     async def set_consent(self, telegram_id: int, consent: bool, enable_notify: bool) -> None:
         now = utcnow_iso()
-        await self.ensure_user_row(telegram_id)
-        if consent:
-            await self._c().execute(
-                """
-                UPDATE users
-                SET consent=1, consent_at=?, notify_enabled=?, notify_consent_at=?,
-                    updated_at=?
-                WHERE telegram_id=?
-                """,
-                (now, 1 if enable_notify else 0, now if enable_notify else None, now, telegram_id),
-            )
-        else:
-            await self._c().execute(
-                """
-                UPDATE users
-                SET consent=0, consent_at=NULL, notify_enabled=0, notify_consent_at=NULL,
-                    name=NULL, email=NULL, role=NULL, phone=NULL, city=NULL,
-                    designer_interest=0, designer_interest_at=NULL,
-                    updated_at=?
-                WHERE telegram_id=?
-                """,
-                (now, telegram_id),
-            )
-        await self._c().commit()
+        async with self._tx() as db:
+            await self._upsert_user_row(telegram_id)
+            if consent:
+                await db.execute(
+                    """
+                    UPDATE users
+                    SET consent=1, consent_at=?, notify_enabled=?, notify_consent_at=?,
+                        updated_at=?
+                    WHERE telegram_id=?
+                    """,
+                    (now, 1 if enable_notify else 0, now if enable_notify else None, now, telegram_id),
+                )
+            else:
+                await db.execute(
+                    """
+                    UPDATE users
+                    SET consent=0, consent_at=NULL, notify_enabled=0, notify_consent_at=NULL,
+                        name=NULL, email=NULL, role=NULL, phone=NULL, city=NULL,
+                        designer_interest=0, designer_interest_at=NULL,
+                        updated_at=?
+                    WHERE telegram_id=?
+                    """,
+                    (now, telegram_id),
+                )
+        await self._user_changed(telegram_id)
 
-    async def update_profile(self, telegram_id: int, **fields) -> None:
-        await self.ensure_user_row(telegram_id)
+    async def update_profile(self, telegram_id: int, outbox: Iterable[OutboxMessage] = (), **fields) -> None:
+        """outbox — уведомления, которые запишутся в той же транзакции, что и профиль."""
         fields["updated_at"] = utcnow_iso()
         keys = list(fields.keys())
         vals = [fields[k] for k in keys]
         set_sql = ", ".join([f"{k}=?" for k in keys])
-        await self._c().execute(
-            f"UPDATE users SET {set_sql} WHERE telegram_id=?",
-            (*vals, telegram_id),
-        )
-        await self._c().commit()
+        async with self._tx() as db:
+            await self._upsert_user_row(telegram_id)
+            await db.execute(
+                f"UPDATE users SET {set_sql} WHERE telegram_id=?",
+                (*vals, telegram_id),
+            )
+            queued = await self._put_outbox(outbox)
+        await self._user_changed(telegram_id)
+        if queued:
+            self._outbox_changed()
 
     async def toggle_notify(self, telegram_id: int) -> int:
-        u = await self.get_user(telegram_id)
-        if not u:
-            await self.ensure_user_row(telegram_id)
-            u = await self.get_user(telegram_id)
-        assert u
-        new_val = 0 if u.notify_enabled else 1
         now = utcnow_iso()
-        await self._c().execute(
-            """
-            UPDATE users
-            SET notify_enabled=?, notify_consent_at=COALESCE(notify_consent_at, ?),
-                updated_at=?
-            WHERE telegram_id=?
-            """,
-            (new_val, now, now, telegram_id),
-        )
-        await self._c().commit()
+        async with self._tx() as db:
+            # читаем внутри транзакции: между чтением и UPDATE никто не переключит
+            await self._upsert_user_row(telegram_id)
+            cur = await db.execute("SELECT notify_enabled FROM users WHERE telegram_id=?", (telegram_id,))
+            new_val = 0 if (await cur.fetchone())["notify_enabled"] else 1
+            await db.execute(
+                """
+                UPDATE users
+                SET notify_enabled=?, notify_consent_at=COALESCE(notify_consent_at, ?),
+                    updated_at=?
+                WHERE telegram_id=?
+                """,
+                (new_val, now, now, telegram_id),
+            )
+        await self._user_changed(telegram_id)
         return new_val
 
     async def delete_user(self, telegram_id: int) -> None:
-        await self._c().execute("DELETE FROM users WHERE telegram_id=?", (telegram_id,))
-        await self._c().commit()
+        async with self._tx() as db:
+            await db.execute("DELETE FROM users WHERE telegram_id=?", (telegram_id,))
+        await self._user_changed(telegram_id)
 
     # ✅ ДИЗАЙНЕР: отметка интереса к сотрудничеству
-    async def set_designer_interest(self, telegram_id: int, interested: bool) -> None:
-        await self.ensure_user_row(telegram_id)
+    async def set_designer_interest(
+        self, telegram_id: int, interested: bool, outbox: Iterable[OutboxMessage] = ()
+    ) -> None:
         now = utcnow_iso()
-        await self._c().execute(
-            """
-            UPDATE users
-            SET designer_interest=?,
-                designer_interest_at=?,
-                updated_at=?
-            WHERE telegram_id=?
-            """,
-            (1 if interested else 0, now if interested else None, now, telegram_id),
-        )
-        await self._c().commit()
+        async with self._tx() as db:
+            await self._upsert_user_row(telegram_id)
+            await db.execute(
+                """
+                UPDATE users
+                SET designer_interest=?,
+                    designer_interest_at=?,
+                    updated_at=?
+                WHERE telegram_id=?
+                """,
+                (1 if interested else 0, now if interested else None, now, telegram_id),
+            )
+            queued = await self._put_outbox(outbox)
+        await self._user_changed(telegram_id)
+        if queued:
+            self._outbox_changed()
+
+    async def mark_reachable(self, telegram_id: int) -> None:
+        """Пользователь снова пишет боту (/start) — возвращаем его в аудиторию рассылок."""
+        async with self._tx() as db:
+            await db.execute(
+                "UPDATE users SET unreachable_at=NULL WHERE telegram_id=? AND unreachable_at IS NOT NULL",
+                (telegram_id,),
+            )
+        await self._user_changed(telegram_id)
 
     # --------- Visit requests ---------
     async def create_visit_request(
@@ -188,6 +352,7 @@ class Repo:
         contact_value: str | None,
         name_snapshot: str | None = None,   # ✅ теперь НЕ обязательно
         role_snapshot: str | None = None,   # ✅ теперь НЕ обязательно
+        outbox: Iterable[OutboxMessage] = (),
     ) -> None:
         """
         Чтобы меню не падало, snapshots теперь optional.
@@ -202,17 +367,20 @@ class Repo:
                     role_snapshot = u.role
 
         now = utcnow_iso()
-        await self._c().execute(
-            """
-            INSERT INTO visit_requests(
-                telegram_id, name_snapshot, role_snapshot, city,
-                contact_method, contact_value, status, created_at
+        async with self._tx() as db:
+            await db.execute(
+                """
+                INSERT INTO visit_requests(
+                    telegram_id, name_snapshot, role_snapshot, city,
+                    contact_method, contact_value, status, created_at
+                )
+                VALUES(?, ?, ?, ?, ?, ?, 'new', ?)
+                """,
+                (telegram_id, name_snapshot, role_snapshot, city, contact_method, contact_value, now),
             )
-            VALUES(?, ?, ?, ?, ?, ?, 'new', ?)
-            """,
-            (telegram_id, name_snapshot, role_snapshot, city, contact_method, contact_value, now),
-        )
-        await self._c().commit()
+            queued = await self._put_outbox(outbox)
+        if queued:
+            self._outbox_changed()
 
     async def stats(self) -> dict:
         cur1 = await self._c().execute("SELECT COUNT(*) as c FROM users")
@@ -224,19 +392,32 @@ class Repo:
         cur3 = await self._c().execute("SELECT COUNT(*) as c FROM visit_requests WHERE status='new'")
         vr_new = (await cur3.fetchone())["c"]
 
-        return {"users": users_count, "notify": notify_count, "visit_new": vr_new}
+        cur4 = await self._c().execute("SELECT COUNT(*) as c FROM users WHERE unreachable_at IS NOT NULL")
+        unreachable = (await cur4.fetchone())["c"]
+
+        cur5 = await self._c().execute("SELECT status, COUNT(*) AS c FROM outbox GROUP BY status")
+        outbox = {r["status"]: r["c"] for r in await cur5.fetchall()}
+
+        return {
+            "users": users_count,
+            "notify": notify_count,
+            "visit_new": vr_new,
+            "unreachable": unreachable,
+            "outbox_pending": outbox.get("pending", 0),
+            "outbox_dead": outbox.get("dead", 0),
+        }
 
     # --------- Collections / Sculptures ----------
     async def add_collection(self, title: str, short_desc: str | None, cover_file_id: str | None, sort_order: int) -> int:
         now = utcnow_iso()
-        cur = await self._c().execute(
-            """
-            INSERT INTO collections(title, short_desc, cover_photo_file_id, is_active, sort_order, created_at, updated_at)
-            VALUES(?, ?, ?, 1, ?, ?, ?)
-            """,
-            (title, short_desc, cover_file_id, sort_order, now, now),
-        )
-        await self._c().commit()
+        async with self._tx() as db:
+            cur = await db.execute(
+                """
+                INSERT INTO collections(title, short_desc, cover_photo_file_id, is_active, sort_order, created_at, updated_at)
+                VALUES(?, ?, ?, 1, ?, ?, ?)
+                """,
+                (title, short_desc, cover_file_id, sort_order, now, now),
+            )
         return cur.lastrowid
 
     async def list_collections(self, active_only: bool = True, limit: int = 10, offset: int = 0) -> tuple[list[dict], int]:
@@ -261,7 +442,8 @@ class Repo:
         row = await cur.fetchone()
         return dict(row) if row else None
 
-    async def add_sculpture(self, collection_id: int, **fields) -> int:
+    async def _insert_sculpture(self, collection_id: int, fields: dict) -> int:
+        """INSERT в sculptures без коммита — внутри _tx вызывающего метода."""
         now = utcnow_iso()
         base = {
             "collection_id": collection_id,
@@ -272,7 +454,7 @@ class Repo:
             "dimensions": fields.get("dimensions"),
             "description_short": fields.get("description_short"),
             "description_full": fields.get("description_full"),
-            "status": fields.get("status", "in_expo"),
+            "status": fields.get("status") or "in_expo",
             "is_featured": int(bool(fields.get("is_featured", 0))),
             "published_at": fields.get("published_at"),
             "created_at": now,
@@ -293,15 +475,18 @@ class Repo:
                 base["status"], base["is_featured"], base["published_at"], base["created_at"], base["updated_at"]
             ),
         )
-        await self._c().commit()
         return cur.lastrowid
 
+    async def add_sculpture(self, collection_id: int, **fields) -> int:
+        async with self._tx():
+            return await self._insert_sculpture(collection_id, fields)
+
     async def add_sculpture_photo(self, sculpture_id: int, file_id: str, sort_order: int) -> None:
-        await self._c().execute(
-            "INSERT INTO sculpture_photos(sculpture_id, file_id, sort_order) VALUES(?, ?, ?)",
-            (sculpture_id, file_id, sort_order),
-        )
-        await self._c().commit()
+        async with self._tx() as db:
+            await db.execute(
+                "INSERT INTO sculpture_photos(sculpture_id, file_id, sort_order) VALUES(?, ?, ?)",
+                (sculpture_id, file_id, sort_order),
+            )
 
     async def list_sculptures_by_collection(self, collection_id: int, limit: int = 10, offset: int = 0) -> tuple[list[dict], int]:
         cur_cnt = await self._c().execute(
@@ -370,3 +555,539 @@ class Repo:
         )
         rows = await cur.fetchall()
         return [dict(r) for r in rows], total
+
+    # --------- Content drafts ----------
+    async def create_sculpture_draft(self, admin_id: int, collection_id: int, step: str) -> int:
+        now = utcnow_iso()
+        async with self._tx() as db:
+            cur = await db.execute(
+                """
+                INSERT INTO content_drafts(admin_id, step, collection_id, created_at, updated_at)
+                VALUES(?, ?, ?, ?, ?)
+                """,
+                (admin_id, step, collection_id, now, now),
+            )
+        return cur.lastrowid
+
+    async def update_draft(self, draft_id: int, step: str | None = None, **fields) -> None:
+        """Пишет только переданные поля (шаг мастера = одна короткая UPDATE)."""
+        fields = {k: v for k, v in fields.items() if k in _DRAFT_FIELDS}
+        if step is not None:
+            fields["step"] = step
+        if not fields:
+            return
+        fields["updated_at"] = utcnow_iso()
+        sets = ", ".join(f"{k}=?" for k in fields)
+        async with self._tx() as db:
+            await db.execute(
+                f"UPDATE content_drafts SET {sets} WHERE id=?",
+                (*fields.values(), draft_id),
+            )
+
+    async def add_draft_photos(
+        self, draft_id: int, photos: list[tuple[str, str | None]], limit: int
+    ) -> tuple[int, int, int]:
+        """
+        Добавляет пачку фото (file_id, file_unique_id) в конец черновика одной транзакцией.
+        Повторы (тот же file_unique_id уже в черновике или в пачке) пропускаются,
+        сверх limit не добавляем. Возвращает (добавлено, повторов, всего в черновике).
+        """
+        async with self._tx() as db:
+            cur = await db.execute(
+                "SELECT file_unique_id FROM content_draft_photos WHERE draft_id=?",
+                (draft_id,),
+            )
+            rows = await cur.fetchall()
+            seen = {r["file_unique_id"] for r in rows if r["file_unique_id"]}
+            count = len(rows)
+            fresh: list[tuple[str, str | None]] = []
+            dups = 0
+            for file_id, unique_id in photos:
+                if unique_id and unique_id in seen:
+                    dups += 1
+                    continue
+                if unique_id:
+                    seen.add(unique_id)
+                fresh.append((file_id, unique_id))
+            fresh = fresh[: max(0, limit - count)]
+            if fresh:
+                await db.executemany(
+                    """
+                    INSERT INTO content_draft_photos(draft_id, file_id, file_unique_id, sort_order)
+                    VALUES(?, ?, ?, ?)
+                    """,
+                    [(draft_id, fid, uid, count + i) for i, (fid, uid) in enumerate(fresh)],
+                )
+                await db.execute("UPDATE content_drafts SET updated_at=? WHERE id=?", (utcnow_iso(), draft_id))
+        return len(fresh), dups, count + len(fresh)
+
+    async def count_draft_photos(self, draft_id: int) -> int:
+        cur = await self._c().execute("SELECT COUNT(*) AS c FROM content_draft_photos WHERE draft_id=?", (draft_id,))
+        return (await cur.fetchone())["c"]
+
+    async def list_draft_photos(self, draft_id: int) -> list[str]:
+        cur = await self._c().execute(
+            "SELECT file_id FROM content_draft_photos WHERE draft_id=? ORDER BY sort_order, id",
+            (draft_id,),
+        )
+        return [r["file_id"] for r in await cur.fetchall()]
+
+    async def get_draft(self, draft_id: int, admin_id: int) -> dict | None:
+        cur = await self._c().execute(
+            "SELECT * FROM content_drafts WHERE id=? AND admin_id=?",
+            (draft_id, admin_id),
+        )
+        row = await cur.fetchone()
+        return dict(row) if row else None
+
+    async def list_drafts(self, admin_id: int, limit: int = 10) -> list[dict]:
+        cur = await self._c().execute(
+            """
+            SELECT d.*, c.title AS collection_title,
+                   (SELECT COUNT(*) FROM content_draft_photos p WHERE p.draft_id=d.id) AS photos
+            FROM content_drafts d
+            LEFT JOIN collections c ON c.id=d.collection_id
+            WHERE d.admin_id=?
+            ORDER BY d.updated_at DESC
+            LIMIT ?
+            """,
+            (admin_id, limit),
+        )
+        return [dict(r) for r in await cur.fetchall()]
+
+    async def discard_draft(self, draft_id: int, admin_id: int) -> bool:
+        async with self._tx() as db:
+            cur = await db.execute(
+                "DELETE FROM content_drafts WHERE id=? AND admin_id=?",
+                (draft_id, admin_id),
+            )
+        return cur.rowcount == 1
+
+    async def publish_draft(self, draft_id: int) -> int | None:
+        """Черновик -> sculptures + sculpture_photos и удаление черновика, одной транзакцией
+        (упала любая из вставок — откатывается всё, черновик остаётся)."""
+        async with self._tx() as db:
+            cur = await db.execute("SELECT * FROM content_drafts WHERE id=?", (draft_id,))
+            d = await cur.fetchone()
+            if d is None:
+                return None
+            sid = await self._insert_sculpture(d["collection_id"], dict(d))
+            await db.execute(
+                """
+                INSERT INTO sculpture_photos(sculpture_id, file_id, sort_order)
+                SELECT ?, file_id, sort_order FROM content_draft_photos WHERE draft_id=? ORDER BY sort_order, id
+                """,
+                (sid, draft_id),
+            )
+            await db.execute("DELETE FROM content_drafts WHERE id=?", (draft_id,))
+        return sid
+
+    # --------- Catalog import ----------
+    async def ensure_collections(self, titles: list[str]) -> tuple[dict[str, int], int]:
+        """title -> id; недостающие коллекции создаются (одна транзакция). Второе значение — сколько создано."""
+        now = utcnow_iso()
+        created = 0
+        async with self._tx() as db:
+            cur = await db.execute("SELECT id, title FROM collections")
+            ids = {r["title"]: r["id"] for r in await cur.fetchall()}
+            for title in titles:
+                if title in ids:
+                    continue
+                cur = await db.execute(
+                    """
+                    INSERT INTO collections(title, short_desc, cover_photo_file_id, is_active, sort_order, created_at, updated_at)
+                    VALUES(?, NULL, NULL, 1, 0, ?, ?)
+                    """,
+                    (title, now, now),
+                )
+                ids[title] = cur.lastrowid
+                created += 1
+        return ids, created
+
+    async def import_sculptures(self, items: list[tuple[int, dict, list[str]]]) -> int:
+        """items: (collection_id, поля, file_id фото по порядку); вся пачка — одна транзакция:
+        упала на середине — не остаётся ничего из пачки."""
+        photos = 0
+        async with self._tx() as db:
+            for collection_id, fields, file_ids in items:
+                sid = await self._insert_sculpture(collection_id, fields)
+                await db.executemany(
+                    "INSERT INTO sculpture_photos(sculpture_id, file_id, sort_order) VALUES(?, ?, ?)",
+                    [(sid, fid, i) for i, fid in enumerate(file_ids)],
+                )
+                photos += len(file_ids)
+        return photos
+
+    # --------- Broadcast jobs ----------
+    async def create_broadcast_job(
+        self,
+        audience: str,
+        src_chat_id: int,
+        src_msg_id: int,
+        link_text: str | None,
+        link_url: str | None,
+        created_by: int | None,
+        recipients: Iterable[int],
+        deliver_until: str | None = None,
+        offpeak: bool = False,
+        scheduled_job_id: int | None = None,
+    ) -> tuple[int, int]:
+        """Создаёт задание и один раз снимает аудиторию (recipients) в broadcast_deliveries.
+        Возвращает (job_id, total). С scheduled_job_id идемпотентно: задание этой
+        отложенной задачи уже есть (повторный запуск после рестарта) — возвращается оно."""
+        now = utcnow_iso()
+        async with self._tx() as db:
+            if scheduled_job_id is not None:
+                cur = await db.execute(
+                    "SELECT id, total FROM broadcast_jobs WHERE scheduled_job_id=?", (scheduled_job_id,)
+                )
+                row = await cur.fetchone()
+                if row is not None:
+                    return row["id"], row["total"]
+            cur = await db.execute(
+                """
+                INSERT INTO broadcast_jobs(
+                    status, audience, src_chat_id, src_msg_id, link_text, link_url,
+                    created_by, deliver_until, offpeak, scheduled_job_id, created_at, updated_at
+                )
+                VALUES('running', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    audience, src_chat_id, src_msg_id, link_text, link_url,
+                    created_by, deliver_until, int(offpeak), scheduled_job_id, now, now,
+                ),
+            )
+            job_id = cur.lastrowid
+
+            # генератор, без промежуточного списка: executemany читает его по мере вставки
+            await db.executemany(
+                "INSERT OR IGNORE INTO broadcast_deliveries(job_id, telegram_id) VALUES(?, ?)",
+                ((job_id, tid) for tid in recipients),
+            )
+            cur = await db.execute(
+                "SELECT COUNT(*) AS c FROM broadcast_deliveries WHERE job_id=?", (job_id,)
+            )
+            total = (await cur.fetchone())["c"]
+            await db.execute("UPDATE broadcast_jobs SET total=? WHERE id=?", (total, job_id))
+        return job_id, total
+
+    async def get_broadcast_job(self, job_id: int) -> dict | None:
+        cur = await self._c().execute("SELECT * FROM broadcast_jobs WHERE id=?", (job_id,))
+        row = await cur.fetchone()
+        return dict(row) if row else None
+
+    async def get_scheduled_broadcast_job(self, scheduled_job_id: int) -> dict | None:
+        cur = await self._c().execute("SELECT * FROM broadcast_jobs WHERE scheduled_job_id=?", (scheduled_job_id,))
+        row = await cur.fetchone()
+        return dict(row) if row else None
+
+    async def list_broadcast_jobs(self, limit: int = 10, status: str | None = None) -> list[dict]:
+        if status:
+            cur = await self._c().execute(
+                "SELECT * FROM broadcast_jobs WHERE status=? ORDER BY id DESC LIMIT ?",
+                (status, limit),
+            )
+        else:
+            cur = await self._c().execute("SELECT * FROM broadcast_jobs ORDER BY id DESC LIMIT ?", (limit,))
+        rows = await cur.fetchall()
+        return [dict(r) for r in rows]
+
+    async def set_broadcast_job_status(self, job_id: int, status: str) -> None:
+        now = utcnow_iso()
+        finished = now if status in ("done", "cancelled") else None
+        async with self._tx() as db:
+            await db.execute(
+                "UPDATE broadcast_jobs SET status=?, updated_at=?, finished_at=COALESCE(?, finished_at) WHERE id=?",
+                (status, now, finished, job_id),
+            )
+
+    async def iter_pending_deliveries(self, job_id: int, chunk: int = 500) -> AsyncIterator[int]:
+        """Недоставленные получатели задания кусками по chunk (keyset по telegram_id) —
+        память не зависит от размера аудитории, отправка начинается с первого куска."""
+        last = -1
+        while True:
+            cur = await self._c().execute(
+                """
+                SELECT telegram_id FROM broadcast_deliveries
+                WHERE job_id=? AND status='pending' AND telegram_id>?
+                ORDER BY telegram_id
+                LIMIT ?
+                """,
+                (job_id, last, chunk),
+            )
+            rows = await cur.fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield r["telegram_id"]
+            if len(rows) < chunk:
+                return
+            last = rows[-1]["telegram_id"]
+
+    async def mark_deliveries(self, job_id: int, results: list[tuple[int, str]]) -> None:
+        """Пачка итогов доставки одной транзакцией (+ счётчики задания).
+        blocked/deactivated заодно помечают пользователя недоступным."""
+        if not results:
+            return
+        now = utcnow_iso()
+        async with self._tx() as db:
+            await db.executemany(
+                "UPDATE broadcast_deliveries SET status=?, updated_at=? WHERE job_id=? AND telegram_id=?",
+                [(outcome, now, job_id, tid) for tid, outcome in results],
+            )
+            unreachable = [tid for tid, outcome in results if outcome in ("blocked", "deactivated")]
+            if unreachable:
+                await db.executemany(
+                    "UPDATE users SET unreachable_at=? WHERE telegram_id=? AND unreachable_at IS NULL",
+                    [(now, tid) for tid in unreachable],
+                )
+            ok = sum(1 for _, outcome in results if outcome == "ok")
+            await db.execute(
+                "UPDATE broadcast_jobs SET sent_ok=sent_ok+?, sent_fail=sent_fail+?, updated_at=? WHERE id=?",
+                (ok, len(results) - ok, now, job_id),
+            )
+        if unreachable:
+            await self._user_changed(*unreachable)
+
+    async def broadcast_delivery_breakdown(self, job_id: int) -> dict[str, int]:
+        cur = await self._c().execute(
+            "SELECT status, COUNT(*) AS c FROM broadcast_deliveries WHERE job_id=? GROUP BY status",
+            (job_id,),
+        )
+        rows = await cur.fetchall()
+        return {r["status"]: r["c"] for r in rows}
+
+    # --------- Scheduled jobs ----------
+    async def add_scheduled_job(self, kind: str, payload: dict, run_at: str, created_by: int | None) -> int:
+        now = utcnow_iso()
+        async with self._tx() as db:
+            cur = await db.execute(
+                """
+                INSERT INTO scheduled_jobs(kind, payload, run_at, status, created_by, created_at, updated_at)
+                VALUES(?, ?, ?, 'scheduled', ?, ?, ?)
+                """,
+                (kind, json.dumps(payload, ensure_ascii=False), run_at, created_by, now, now),
+            )
+        return cur.lastrowid
+
+    async def claim_due_scheduled_jobs(self, now: str, limit: int = 20) -> list[dict]:
+        """Забирает просроченные задачи: scheduled -> running (UPDATE с условием, чтобы не взять дважды)."""
+        async with self._tx() as db:
+            cur = await db.execute(
+                "SELECT * FROM scheduled_jobs WHERE status='scheduled' AND run_at<=? ORDER BY run_at LIMIT ?",
+                (now, limit),
+            )
+            rows = [dict(r) for r in await cur.fetchall()]
+            claimed = []
+            for r in rows:
+                upd = await db.execute(
+                    "UPDATE scheduled_jobs SET status='running', updated_at=? WHERE id=? AND status='scheduled'",
+                    (utcnow_iso(), r["id"]),
+                )
+                if upd.rowcount == 1:
+                    r["payload"] = json.loads(r["payload"])
+                    claimed.append(r)
+        return claimed
+
+    async def finish_scheduled_job(self, job_id: int, status: str, result: str | None = None) -> None:
+        async with self._tx() as db:
+            await db.execute(
+                "UPDATE scheduled_jobs SET status=?, result=?, updated_at=? WHERE id=?",
+                (status, result, utcnow_iso(), job_id),
+            )
+
+    async def requeue_running_scheduled_jobs(self) -> int:
+        """На старте: задачи, прерванные рестартом посреди запуска, снова ждут выполнения."""
+        async with self._tx() as db:
+            cur = await db.execute(
+                "UPDATE scheduled_jobs SET status='scheduled', updated_at=? WHERE status='running'",
+                (utcnow_iso(),),
+            )
+        return cur.rowcount
+
+    async def cancel_scheduled_job(self, job_id: int) -> bool:
+        async with self._tx() as db:
+            cur = await db.execute(
+                "UPDATE scheduled_jobs SET status='cancelled', updated_at=? WHERE id=? AND status='scheduled'",
+                (utcnow_iso(), job_id),
+            )
+        return cur.rowcount == 1
+
+    async def list_scheduled_jobs(self, limit: int = 10, status: str | None = None) -> list[dict]:
+        if status:
+            cur = await self._c().execute(
+                "SELECT * FROM scheduled_jobs WHERE status=? ORDER BY run_at LIMIT ?",
+                (status, limit),
+            )
+        else:
+            cur = await self._c().execute("SELECT * FROM scheduled_jobs ORDER BY id DESC LIMIT ?", (limit,))
+        rows = [dict(r) for r in await cur.fetchall()]
+        for r in rows:
+            r["payload"] = json.loads(r["payload"])
+        return rows
+
+    # --------- Outbox ----------
+    async def due_outbox(self, now: str, limit: int = 50) -> list[dict]:
+        cur = await self._c().execute(
+            """
+            SELECT * FROM outbox
+            WHERE status='pending' AND next_attempt_at<=?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+            """,
+            (now, limit),
+        )
+        return [dict(r) for r in await cur.fetchall()]
+
+    async def next_outbox_at(self) -> str | None:
+        cur = await self._c().execute("SELECT MIN(next_attempt_at) AS t FROM outbox WHERE status='pending'")
+        return (await cur.fetchone())["t"]
+
+    async def mark_outbox_sent(self, ids: list[int]) -> None:
+        if not ids:
+            return
+        now = utcnow_iso()
+        async with self._tx() as db:
+            await db.executemany(
+                "UPDATE outbox SET status='sent', sent_at=?, last_error=NULL WHERE id=?",
+                [(now, i) for i in ids],
+            )
+
+    async def mark_outbox_failed(self, failures: list[tuple[int, str, str | None]]) -> None:
+        """failures: (id, ошибка, время следующей попытки или None — в dead letter)."""
+        if not failures:
+            return
+        async with self._tx() as db:
+            await db.executemany(
+                """
+                UPDATE outbox
+                SET attempts=attempts+1, last_error=?,
+                    status=CASE WHEN ? IS NULL THEN 'dead' ELSE 'pending' END,
+                    next_attempt_at=COALESCE(?, next_attempt_at)
+                WHERE id=?
+                """,
+                [(err, nxt, nxt, i) for i, err, nxt in failures],
+            )
+
+    async def requeue_dead_outbox(self) -> int:
+        async with self._tx() as db:
+            cur = await db.execute(
+                "UPDATE outbox SET status='pending', attempts=0, next_attempt_at=? WHERE status='dead'",
+                (utcnow_iso(),),
+            )
+        if cur.rowcount:
+            self._outbox_changed()
+        return cur.rowcount
+
+    # --------- Lead digests ----------
+    async def digest_prefs(self) -> dict[int, dict]:
+        """admin_id -> {digest_minutes, last_digest_at}; админов без записи здесь нет (значит "сразу")."""
+        cur = await self._c().execute("SELECT * FROM admin_prefs")
+        return {r["admin_id"]: dict(r) for r in await cur.fetchall()}
+
+    async def set_digest_minutes(self, admin_id: int, minutes: int) -> None:
+        async with self._tx() as db:
+            await db.execute(
+                """
+                INSERT INTO admin_prefs(admin_id, digest_minutes, last_digest_at) VALUES(?, ?, ?)
+                ON CONFLICT(admin_id) DO UPDATE SET digest_minutes=excluded.digest_minutes
+                """,
+                (admin_id, minutes, utcnow_iso()),
+            )
+
+    async def hold_outbox(self, ids: list[int]) -> None:
+        """Лиды для админа в режиме дайджеста: не шлём, ждут сводки."""
+        if not ids:
+            return
+        async with self._tx() as db:
+            await db.executemany("UPDATE outbox SET status='held' WHERE id=? AND status='pending'", [(i,) for i in ids])
+
+    async def held_outbox_admins(self) -> list[int]:
+        cur = await self._c().execute("SELECT DISTINCT chat_id FROM outbox WHERE status='held'")
+        return [r["chat_id"] for r in await cur.fetchall()]
+
+    async def create_lead_digest(self, admin_id: int) -> tuple[int, dict[str, int]] | None:
+        """Собирает отложенные лиды админа в дайджест (одна транзакция). None — собирать нечего."""
+        cur = await self._c().execute("SELECT 1 FROM outbox WHERE chat_id=? AND status='held' LIMIT 1", (admin_id,))
+        if await cur.fetchone() is None:
+            return None
+        now = utcnow_iso()
+        async with self._tx() as db:
+            cur = await db.execute("INSERT INTO lead_digests(admin_id, created_at) VALUES(?, ?)", (admin_id, now))
+            digest_id = cur.lastrowid
+            await db.execute(
+                "UPDATE outbox SET status='sent', sent_at=?, digest_id=? WHERE chat_id=? AND status='held'",
+                (now, digest_id, admin_id),
+            )
+            cur = await db.execute(
+                "SELECT kind, COUNT(*) AS c FROM outbox WHERE digest_id=? GROUP BY kind",
+                (digest_id,),
+            )
+            counts = {r["kind"]: r["c"] for r in await cur.fetchall()}
+            if not counts:
+                await db.execute("DELETE FROM lead_digests WHERE id=?", (digest_id,))
+                return None
+            await db.execute(
+                """
+                INSERT INTO admin_prefs(admin_id, last_digest_at) VALUES(?, ?)
+                ON CONFLICT(admin_id) DO UPDATE SET last_digest_at=excluded.last_digest_at
+                """,
+                (admin_id, now),
+            )
+        return digest_id, counts
+
+    async def undo_lead_digest(self, digest_id: int) -> None:
+        """Дайджест не удалось отправить — лиды снова ждут следующей попытки."""
+        async with self._tx() as db:
+            await db.execute(
+                "UPDATE outbox SET status='held', sent_at=NULL, digest_id=NULL WHERE digest_id=?",
+                (digest_id,),
+            )
+            await db.execute("DELETE FROM lead_digests WHERE id=?", (digest_id,))
+
+    async def list_digest_items(self, digest_id: int, limit: int, offset: int) -> tuple[list[dict], int]:
+        cur = await self._c().execute("SELECT COUNT(*) AS c FROM outbox WHERE digest_id=?", (digest_id,))
+        total = (await cur.fetchone())["c"]
+        cur = await self._c().execute(
+            "SELECT * FROM outbox WHERE digest_id=? ORDER BY id LIMIT ? OFFSET ?",
+            (digest_id, limit, offset),
+        )
+        return [dict(r) for r in await cur.fetchall()], total
+
+    async def get_lead_digest(self, digest_id: int) -> dict | None:
+        cur = await self._c().execute("SELECT * FROM lead_digests WHERE id=?", (digest_id,))
+        row = await cur.fetchone()
+        return dict(row) if row else None
+
+    # --------- FSM storage ----------
+    async def fsm_get(self, key: str, now: int) -> tuple[str | None, str | None] | None:
+        cur = await self._c().execute(
+            "SELECT state, data FROM fsm_states WHERE key=? AND expires_at>?",
+            (key, now),
+        )
+        row = await cur.fetchone()
+        return (row["state"], row["data"]) if row else None
+
+    async def fsm_write(
+        self,
+        upserts: list[tuple[str, str | None, str | None, int]],
+        deletes: list[str],
+    ) -> None:
+        """upserts: (key, state, data, expires_at); одна транзакция на пачку."""
+        async with self._tx() as db:
+            if upserts:
+                await db.executemany(
+                    """
+                    INSERT INTO fsm_states(key, state, data, expires_at) VALUES(?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        state=excluded.state, data=excluded.data, expires_at=excluded.expires_at
+                    """,
+                    upserts,
+                )
+            if deletes:
+                await db.executemany("DELETE FROM fsm_states WHERE key=?", [(k,) for k in deletes])
+
+    async def fsm_purge_expired(self, now: int) -> int:
+        async with self._tx() as db:
+            cur = await db.execute("DELETE FROM fsm_states WHERE expires_at<=?", (now,))
+        return cur.rowcount
@@ -18,6 +18,9 @@ CREATE TABLE IF NOT EXISTS users (
   designer_interest INTEGER DEFAULT 0,
   designer_interest_at TEXT NULL,
 
+  -- бот заблокирован / аккаунт удалён (по итогам рассылки); сбрасывается на /start
+  unreachable_at TEXT NULL,
+
   created_at TEXT,
   updated_at TEXT
 );
@@ -78,3 +81,125 @@ CREATE INDEX IF NOT EXISTS idx_users_notify ON users(consent, notify_enabled, ro
 
 -- ✅ быстрый поиск дизайнеров
 CREATE INDEX IF NOT EXISTS idx_users_designer_interest ON users(designer_interest, designer_interest_at);
+
+-- рассылки: задание + снимок аудитории с состоянием доставки каждому получателю
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  status TEXT NOT NULL DEFAULT 'running',  -- running / paused / cancelled / done
+  audience TEXT NOT NULL,
+  src_chat_id INTEGER NOT NULL,
+  src_msg_id INTEGER NOT NULL,
+  link_text TEXT NULL,
+  link_url TEXT NULL,
+  created_by INTEGER NULL,
+  total INTEGER DEFAULT 0,
+  sent_ok INTEGER DEFAULT 0,
+  sent_fail INTEGER DEFAULT 0,
+  created_at TEXT,
+  updated_at TEXT,
+  finished_at TEXT NULL,
+  deliver_until TEXT NULL,        -- растянуть доставку до (UTC ISO)
+  offpeak INTEGER DEFAULT 0,      -- пауза, пока интерактивная нагрузка высокая
+  scheduled_job_id INTEGER NULL   -- создана отложенной задачей (не больше одной рассылки на задачу)
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+  job_id INTEGER NOT NULL,
+  telegram_id INTEGER NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pending',  -- pending / ok / blocked / deactivated / flood / network / ...
+  updated_at TEXT NULL,
+  PRIMARY KEY (job_id, telegram_id),
+  FOREIGN KEY (job_id) REFERENCES broadcast_jobs(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs(status);
+CREATE INDEX IF NOT EXISTS idx_deliveries_pending ON broadcast_deliveries(job_id, status, telegram_id);
+
+-- отложенные задачи (рассылки по расписанию); переживают рестарт
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL,
+  payload TEXT NOT NULL,                      -- JSON
+  run_at TEXT NOT NULL,                       -- UTC ISO
+  status TEXT NOT NULL DEFAULT 'scheduled',   -- scheduled / running / done / failed / cancelled
+  created_by INTEGER NULL,
+  result TEXT NULL,
+  created_at TEXT,
+  updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_due ON scheduled_jobs(status, run_at);
+
+-- исходящие уведомления (лиды админам): пишутся в одной транзакции с заявкой,
+-- доставляются фоновым диспетчером (app/outbox.py)
+CREATE TABLE IF NOT EXISTS outbox (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL,
+  chat_id INTEGER NOT NULL,
+  text TEXT NOT NULL,
+  parse_mode TEXT NULL,
+  status TEXT NOT NULL DEFAULT 'pending',   -- pending / held (ждёт дайджеста) / sent / dead
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TEXT NOT NULL,            -- UTC ISO
+  last_error TEXT NULL,
+  created_at TEXT,
+  sent_at TEXT NULL,
+  digest_id INTEGER NULL                    -- ушло в составе дайджеста (lead_digests.id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+
+-- как админ получает лиды: 0 — сразу, N — дайджестом раз в N минут
+CREATE TABLE IF NOT EXISTS admin_prefs (
+  admin_id INTEGER PRIMARY KEY,
+  digest_minutes INTEGER NOT NULL DEFAULT 0,
+  last_digest_at TEXT NULL
+);
+
+CREATE TABLE IF NOT EXISTS lead_digests (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  admin_id INTEGER NOT NULL,
+  created_at TEXT
+);
+
+-- состояния FSM (FSM_STORAGE=sqlite): ключ — bot:chat:user:thread:business:destiny
+CREATE TABLE IF NOT EXISTS fsm_states (
+  key TEXT PRIMARY KEY,
+  state TEXT NULL,
+  data TEXT NULL,                 -- компактный JSON
+  expires_at INTEGER NOT NULL     -- unix time; брошенные сценарии удаляются по TTL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_fsm_expires ON fsm_states(expires_at);
+
+-- черновики карточек скульптур (мастер "➕ Добавить скульптуру"): каждый шаг
+-- пишет одно поле, черновик переживает рестарт, публикуется одной транзакцией
+CREATE TABLE IF NOT EXISTS content_drafts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  admin_id INTEGER NOT NULL,
+  step TEXT NULL,                 -- состояние мастера, с которого продолжить
+  collection_id INTEGER NULL,
+  title TEXT NULL,
+  artist TEXT NULL,
+  year TEXT NULL,
+  material TEXT NULL,
+  dimensions TEXT NULL,
+  description_short TEXT NULL,
+  status TEXT NULL,
+  is_featured INTEGER DEFAULT 0,
+  published_at TEXT NULL,
+  created_at TEXT,
+  updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS content_draft_photos (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  draft_id INTEGER NOT NULL,
+  file_id TEXT NOT NULL,
+  file_unique_id TEXT NULL,
+  sort_order INTEGER DEFAULT 0,
+  FOREIGN KEY (draft_id) REFERENCES content_drafts(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_drafts_admin ON content_drafts(admin_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_draft_photos ON content_draft_photos(draft_id, sort_order);
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from app.db.repo import Repo
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# FSM-хранилище в нашей SQLite (FSM_STORAGE=sqlite) — сценарии переживают рестарт.
+#
+# Состояния читаются в кэш и дальше живут в памяти; set_state/set_data/update_data
+# только помечают ключ грязным. Запись — одной транзакцией на пачку ключей:
+# после каждого апдейта (flush из middleware в main.py) и, на всякий случай,
+# через FLUSH_DELAY после первой правки. Так пять update_data в одном хендлере
+# дают одну запись. Каждая запись продлевает TTL; брошенные сценарии удаляются.
+
+DEFAULT_TTL = 72 * 3600  # сек
+CACHE_SIZE = 10_000
+FLUSH_DELAY = 0.5  # сек
+PURGE_INTERVAL = 3600.0  # сек
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(
+        str(p) if p is not None else ""
+        for p in (key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny)
+    )
+
+
+def _dumps(data: dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class _Entry:
+    __slots__ = ("state", "data", "written_at")
+
+    def __init__(self, state: str | None, data: dict[str, Any]) -> None:
+        self.state = state
+        self.data = data
+        self.written_at = time.time()
+
+
+class SqliteStorage(BaseStorage):
+    def __init__(self, repo: Repo, ttl: int = DEFAULT_TTL, cache_size: int = CACHE_SIZE) -> None:
+        self.repo = repo
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, _Entry] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._last_purge = 0.0
+
+    async def _entry(self, key: StorageKey) -> tuple[str, _Entry]:
+        k = _key(key)
+        e = self._cache.get(k)
+        if e is not None:
+            if e.written_at + self.ttl < time.time():
+                # TTL истёк и в кэше: сценарий брошен — начинаем с чистого листа
+                e.state, e.data = None, {}
+                self._touch(k)
+            self._cache.move_to_end(k)
+            return k, e
+        row = await self.repo.fsm_get(k, int(time.time()))
+        # пока ждали БД, ключ мог появиться в кэше (параллельный апдейт) — он свежее
+        e = self._cache.get(k)
+        if e is None:
+            state, raw = row if row else (None, None)
+            e = _Entry(state, json.loads(raw) if raw else {})
+            self._cache[k] = e
+            self._evict()
+        return k, e
+
+    def _evict(self) -> None:
+        # грязные не выбрасываем — дождутся flush
+        while len(self._cache) > self.cache_size:
+            for k in self._cache:
+                if k not in self._dirty:
+                    del self._cache[k]
+                    break
+            else:
+                return
+
+    def _touch(self, k: str) -> None:
+        self._cache[k].written_at = time.time()
+        self._dirty.add(k)
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(FLUSH_DELAY, lambda: asyncio.ensure_future(self._flush_later()))
+
+    async def _flush_later(self) -> None:
+        self._flush_handle = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("fsm: deferred flush failed")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k, e = await self._entry(key)
+        e.state = state.state if isinstance(state, State) else state
+        self._touch(k)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        _, e = await self._entry(key)
+        return e.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        k, e = await self._entry(key)
+        e.data = copy.deepcopy(dict(data))
+        self._touch(k)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, e = await self._entry(key)
+        return copy.deepcopy(e.data)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        k, e = await self._entry(key)
+        e.data.update(copy.deepcopy(dict(data)))
+        self._touch(k)
+        return copy.deepcopy(e.data)
+
+    async def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        expires = int(time.time()) + self.ttl
+        upserts: list[tuple[str, str | None, str | None, int]] = []
+        deletes: list[str] = []
+        # снимок делаем синхронно — правки во время записи попадут в следующий flush
+        for k in self._dirty:
+            e = self._cache.get(k)
+            if e is None:
+                continue
+            if e.state is None and not e.data:
+                deletes.append(k)
+            else:
+                upserts.append((k, e.state, _dumps(e.data) if e.data else None, expires))
+        written = set(self._dirty)
+        self._dirty.clear()
+        try:
+            await self.repo.fsm_write(upserts, deletes)
+        except Exception:
+            # не теряем правки: попробуем ещё раз со следующим flush
+            self._dirty |= written
+            raise
+        metrics.inc("fsm_flushes")
+        metrics.inc("fsm_rows_written", len(upserts) + len(deletes))
+
+        now = time.monotonic()
+        if now - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = now
+            purged = await self.repo.fsm_purge_expired(int(time.time()))
+            if purged:
+                logger.info("fsm: purged %s expired states", purged)
+
+    async def close(self) -> None:
+        await self.flush()
@@ -1,4 +1,8 @@
-from aiogram import Router, F, Bot
+import re
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -6,7 +10,11 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
 from app import texts
+from app.broadcast import BroadcastJobs
+from app.callbacks import AudiencePick, JobAction, ScheduledCancel
 from app.db.repo import Repo
+from app.scheduler import Scheduler
+from app.segments import CITIES, LABELS, NEW_PERIODS, ROLES, Segments, build_spec
 
 router = Router()
 
@@ -17,90 +25,165 @@ class Broadcast(StatesGroup):
     add_link = State()
     link_text = State()
     link_url = State()
+    when = State()
+    when_at = State()
 
 
 def _is_admin(user_id: int, admin_ids: set[int]) -> bool:
     return user_id in admin_ids
 
 
-async def _send_broadcast(
-    bot: Bot,
-    repo: Repo,
+def _job_kb(job_id: int, status: str):
+    kb = InlineKeyboardBuilder()
+    if status == "running":
+        kb.button(text="⏸ Пауза", callback_data=JobAction(action="pause", job_id=job_id))
+    if status == "paused":
+        kb.button(text="▶️ Продолжить", callback_data=JobAction(action="resume", job_id=job_id))
+    if status in ("running", "paused"):
+        kb.button(text="✖️ Отменить", callback_data=JobAction(action="cancel", job_id=job_id))
+    kb.button(text="🔄 Обновить", callback_data=JobAction(action="show", job_id=job_id))
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+async def _start_broadcast(
+    jobs: BroadcastJobs,
+    admin_id: int,
     audience: str,
     src_chat_id: int,
     src_msg_id: int,
     link_text: str | None,
     link_url: str | None,
-):
-    q = "SELECT telegram_id FROM users WHERE consent=1 AND notify_enabled=1"
-    params: list = []
-    if audience != "all":
-        q += " AND role=?"
-        params.append(audience)
+) -> None:
+    """Создаёт долговечное задание рассылки и сообщает админу его номер."""
+    job_id, total = await jobs.create(audience, src_chat_id, src_msg_id, link_text, link_url, admin_id)
+    await jobs.bot.send_message(
+        admin_id,
+        f"Рассылка #{job_id} запущена: {total} получателей.\nИтог придёт отдельным сообщением.",
+        reply_markup=_job_kb(job_id, "running"),
+    )
 
-    cur = await repo._c().execute(q, params)
-    rows = await cur.fetchall()
-    user_ids = [r["telegram_id"] for r in rows]
 
+async def _ask_when(bot, admin_id: int, state: FSMContext) -> None:
+    await state.set_state(Broadcast.when)
     kb = InlineKeyboardBuilder()
-    if link_text and link_url:
-        kb.button(text=link_text, url=link_url)
-    kb.button(text="🏠 Главное меню", callback_data="menu:main")
-    kb.adjust(1)
-    markup = kb.as_markup()
-
-    ok = 0
-    fail = 0
-    for uid in user_ids:
-        try:
-            await bot.copy_message(
-                chat_id=uid,
-                from_chat_id=src_chat_id,
-                message_id=src_msg_id,
-                reply_markup=markup,
-            )
-            ok += 1
-        except Exception:
-            fail += 1
-            continue
-    return ok, fail
+    kb.button(text="🚀 Сейчас", callback_data="bc:when:now")
+    kb.button(text="🕐 Запланировать", callback_data="bc:when:later")
+    kb.adjust(2)
+    await bot.send_message(admin_id, "Когда отправить рассылку?", reply_markup=kb.as_markup())
+
+
+# "25.12 18:30" или "25.12 18:30 6" (растянуть доставку на 6 часов)
+_WHEN_RE = re.compile(r"^(\d{1,2})\.(\d{1,2})\s+(\d{1,2}):(\d{2})(?:\s+(\d{1,2}))?$")
+MAX_WINDOW_HOURS = 48
+
+
+def _parse_when(raw: str, tz_offset_hours: int) -> tuple[datetime, int] | None:
+    """Локальное время админа -> (момент в UTC, окно доставки в часах). Год — ближайший в будущем."""
+    m = _WHEN_RE.match(raw.strip())
+    if not m:
+        return None
+    day, month, hour, minute = (int(x) for x in m.groups()[:4])
+    window = int(m.group(5) or 0)
+    if window > MAX_WINDOW_HOURS:
+        return None
+    tz = timezone(timedelta(hours=tz_offset_hours))
+    now = datetime.now(tz)
+    try:
+        at = now.replace(month=month, day=day, hour=hour, minute=minute, second=0, microsecond=0)
+        if at < now:
+            at = at.replace(year=now.year + 1)
+    except ValueError:
+        return None
+    return at.astimezone(timezone.utc), window
+
+
+PICKER_SEGMENTS = [
+    *(f"role:{r}" for r in ROLES),
+    *(f"city:{c}" for c in CITIES),
+    "designer",
+    *(f"new:{d}d" for d in NEW_PERIODS),
+]
+
+
+def _picker(segments: Segments, selected: list[str]):
+    """Текст + клавиатура выбора аудитории с живыми счётчиками."""
+    base = segments.audience("all")
+    kb = InlineKeyboardBuilder()
+    for seg in PICKER_SEGMENTS:
+        n = segments.count(base & segments.bits(seg))
+        mark = "✅ " if seg in selected else ""
+        kb.button(text=f"{mark}{LABELS.get(seg, seg)} · {n}", callback_data=AudiencePick.of(seg))
+
+    total = segments.count(segments.audience(build_spec(selected)))
+    kb.button(text="♻️ Сбросить", callback_data=AudiencePick(group="reset"))
+    kb.button(text=f"Далее → {total}", callback_data=AudiencePick(group="done"))
+    kb.adjust(2)
+
+    chosen = ", ".join(LABELS.get(s, s) for s in selected) if selected else "все подписчики"
+    text = (
+        f"{texts.BROADCAST_AUDIENCE_TEXT}\n"
+        f"Выбрано: {chosen}\n"
+        f"Получателей: {total} (из {segments.count(base)} подписчиков)\n\n"
+        "Внутри одной группы (роль, город) — ИЛИ, между группами — И."
+    )
+    return text, kb.as_markup()
 
 
 @router.message(Command("broadcast"))
-async def broadcast_cmd(message: Message, admin_ids: set[int], state: FSMContext):
+async def broadcast_cmd(message: Message, admin_ids: set[int], state: FSMContext, segments: Segments):
     if not _is_admin(message.from_user.id, admin_ids):
         return
     await state.set_state(Broadcast.audience)
-    kb = InlineKeyboardBuilder()
-    for a in ["all", "collector", "dealer", "author", "interest"]:
-        kb.button(text=a, callback_data=f"bc:aud:{a}")
-    kb.adjust(2)
-    await message.answer(texts.BROADCAST_AUDIENCE_TEXT, reply_markup=kb.as_markup())
+    await state.update_data(segments=[])
+    text, markup = _picker(segments, [])
+    await message.answer(text, reply_markup=markup)
 
 
 @router.callback_query(F.data == "admin:broadcast")
-async def broadcast_from_panel(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+async def broadcast_from_panel(cb: CallbackQuery, admin_ids: set[int], state: FSMContext, segments: Segments):
     if not _is_admin(cb.from_user.id, admin_ids):
         await cb.answer()
         return
     await state.set_state(Broadcast.audience)
-    kb = InlineKeyboardBuilder()
-    for a in ["all", "collector", "dealer", "author", "interest"]:
-        kb.button(text=a, callback_data=f"bc:aud:{a}")
-    kb.adjust(2)
-    await cb.bot.send_message(cb.from_user.id, texts.BROADCAST_AUDIENCE_TEXT, reply_markup=kb.as_markup())
+    await state.update_data(segments=[])
+    text, markup = _picker(segments, [])
+    await cb.bot.send_message(cb.from_user.id, text, reply_markup=markup)
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("bc:aud:"))
-async def bc_audience(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+@router.callback_query(Broadcast.audience, AudiencePick.filter())
+async def bc_segment(
+    cb: CallbackQuery, callback_data: AudiencePick, admin_ids: set[int], state: FSMContext, segments: Segments
+):
     if not _is_admin(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    aud = cb.data.split(":")[2]
-    await state.update_data(audience=aud)
-    await state.set_state(Broadcast.post)
-    await cb.bot.send_message(cb.from_user.id, texts.BROADCAST_SEND_PROMPT)
+    seg = callback_data.segment
+    data = await state.get_data()
+    selected: list[str] = list(data.get("segments", []))
+
+    if seg == "done":
+        await state.update_data(audience=build_spec(selected))
+        await state.set_state(Broadcast.post)
+        await cb.bot.send_message(cb.from_user.id, texts.BROADCAST_SEND_PROMPT)
+        await cb.answer()
+        return
+
+    if seg == "reset":
+        selected = []
+    elif seg in selected:
+        selected.remove(seg)
+    elif seg in PICKER_SEGMENTS:
+        selected.append(seg)
+    await state.update_data(segments=selected)
+
+    text, markup = _picker(segments, selected)
+    try:
+        await cb.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest:
+        # "message is not modified" — счётчики не изменились
+        pass
     await cb.answer()
 
 
@@ -118,19 +201,12 @@ async def bc_post(message: Message, admin_ids: set[int], state: FSMContext):
 
 
 @router.callback_query(F.data == "bc:link:no")
-async def bc_no_link(cb: CallbackQuery, admin_ids: set[int], state: FSMContext, repo: Repo):
+async def bc_no_link(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
     if not _is_admin(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    data = await state.get_data()
-    ok, fail = await _send_broadcast(
-        cb.bot, repo,
-        data["audience"],
-        data["src_chat_id"], data["src_msg_id"],
-        None, None
-    )
-    await state.clear()
-    await cb.bot.send_message(cb.from_user.id, f"{texts.BROADCAST_DONE_TEXT}\nУспешно: {ok} / Ошибок: {fail}")
+    await state.update_data(link_text=None, link_url=None)
+    await _ask_when(cb.bot, cb.from_user.id, state)
     await cb.answer()
 
 
@@ -158,19 +234,186 @@ async def bc_link_text(message: Message, admin_ids: set[int], state: FSMContext)
 
 
 @router.message(Broadcast.link_url)
-async def bc_link_url(message: Message, admin_ids: set[int], state: FSMContext, repo: Repo):
+async def bc_link_url(message: Message, admin_ids: set[int], state: FSMContext):
     if not _is_admin(message.from_user.id, admin_ids):
         return
     url = (message.text or "").strip()
     if not (url.startswith("http://") or url.startswith("https://")):
         await message.answer("URL должен начинаться с http:// или https://")
         return
+    await state.update_data(link_url=url)
+    await _ask_when(message.bot, message.from_user.id, state)
+
+
+@router.callback_query(Broadcast.when, F.data == "bc:when:now")
+async def bc_when_now(cb: CallbackQuery, admin_ids: set[int], state: FSMContext, broadcast_jobs: BroadcastJobs):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
     data = await state.get_data()
-    ok, fail = await _send_broadcast(
-        message.bot, repo,
+    await state.clear()
+    await _start_broadcast(
+        broadcast_jobs, cb.from_user.id,
         data["audience"],
         data["src_chat_id"], data["src_msg_id"],
-        data.get("link_text"), url
+        data.get("link_text"), data.get("link_url")
     )
+    await cb.answer()
+
+
+@router.callback_query(Broadcast.when, F.data == "bc:when:later")
+async def bc_when_later(cb: CallbackQuery, admin_ids: set[int], state: FSMContext, tz_offset_hours: int):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    await state.set_state(Broadcast.when_at)
+    await cb.bot.send_message(
+        cb.from_user.id,
+        f"Когда отправить? Формат: ДД.ММ ЧЧ:ММ (время UTC{tz_offset_hours:+d}).\n"
+        "Можно добавить окно доставки в часах, например: 25.12 18:30 6 — "
+        "тогда рассылка растянется на 6 часов.\n"
+        "Запланированные рассылки сами притормаживают, пока ботом активно пользуются.",
+    )
+    await cb.answer()
+
+
+@router.message(Broadcast.when_at)
+async def bc_when_at(
+    message: Message, admin_ids: set[int], state: FSMContext, scheduler: Scheduler, tz_offset_hours: int
+):
+    if not _is_admin(message.from_user.id, admin_ids):
+        return
+    parsed = _parse_when(message.text or "", tz_offset_hours)
+    if parsed is None:
+        await message.answer(f"Не понял время. Пример: 25.12 18:30 или 25.12 18:30 6 (окно до {MAX_WINDOW_HOURS} ч).")
+        return
+    run_at, window = parsed
+    data = await state.get_data()
     await state.clear()
-    await message.answer(f"{texts.BROADCAST_DONE_TEXT}\nУспешно: {ok} / Ошибок: {fail}")
+    payload = {
+        "audience": data["audience"],
+        "src_chat_id": data["src_chat_id"],
+        "src_msg_id": data["src_msg_id"],
+        "link_text": data.get("link_text"),
+        "link_url": data.get("link_url"),
+        "window_hours": window,
+        "created_by": message.from_user.id,
+    }
+    job_id = await scheduler.add("broadcast", payload, run_at, message.from_user.id)
+    local = run_at.astimezone(timezone(timedelta(hours=tz_offset_hours)))
+    kb = InlineKeyboardBuilder()
+    kb.button(text="✖️ Отменить", callback_data=ScheduledCancel(job_id=job_id))
+    await message.answer(
+        f"Рассылка запланирована (задача #{job_id}) на {local:%d.%m %H:%M}"
+        + (f", доставка в течение {window} ч." if window else "."),
+        reply_markup=kb.as_markup(),
+    )
+
+
+# ----- управление заданиями рассылки -----
+
+async def _send_jobs_list(bot, admin_id: int, repo: Repo) -> None:
+    jobs = await repo.list_broadcast_jobs(limit=10)
+    if not jobs:
+        await bot.send_message(admin_id, "Рассылок ещё не было.")
+        return
+    kb = InlineKeyboardBuilder()
+    lines = ["Последние рассылки:"]
+    for j in jobs:
+        lines.append(f"#{j['id']} {j['audience']} — {j['status']}, {j['sent_ok'] + j['sent_fail']}/{j['total']}")
+        kb.button(text=f"#{j['id']}", callback_data=JobAction(action="show", job_id=j["id"]))
+    kb.adjust(5)
+    await bot.send_message(admin_id, "\n".join(lines), reply_markup=kb.as_markup())
+
+
+@router.message(Command("broadcasts"))
+async def broadcasts_cmd(message: Message, admin_ids: set[int], repo: Repo):
+    if not _is_admin(message.from_user.id, admin_ids):
+        return
+    await _send_jobs_list(message.bot, message.from_user.id, repo)
+
+
+@router.callback_query(F.data == "admin:broadcasts")
+async def broadcasts_from_panel(cb: CallbackQuery, admin_ids: set[int], repo: Repo):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    await _send_jobs_list(cb.bot, cb.from_user.id, repo)
+    await cb.answer()
+
+
+@router.callback_query(JobAction.filter())
+async def bc_job_control(
+    cb: CallbackQuery, callback_data: JobAction, admin_ids: set[int], repo: Repo, broadcast_jobs: BroadcastJobs
+):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    action, job_id = callback_data.action, callback_data.job_id
+    job = await repo.get_broadcast_job(job_id)
+    if not job:
+        await cb.answer("Рассылка не найдена", show_alert=True)
+        return
+
+    if action == "pause" and job["status"] == "running":
+        await broadcast_jobs.pause(job_id)
+    elif action == "resume" and job["status"] == "paused":
+        await broadcast_jobs.resume(job_id)
+    elif action == "cancel" and job["status"] in ("running", "paused"):
+        await broadcast_jobs.cancel(job_id)
+
+    job = await repo.get_broadcast_job(job_id)
+    await cb.bot.send_message(
+        cb.from_user.id,
+        await broadcast_jobs.progress_text(job_id),
+        reply_markup=_job_kb(job_id, job["status"]),
+    )
+    await cb.answer()
+
+
+# ----- запланированные рассылки -----
+
+async def _send_scheduled_list(bot, admin_id: int, repo: Repo, tz_offset_hours: int) -> None:
+    jobs = await repo.list_scheduled_jobs(limit=20, status="scheduled")
+    if not jobs:
+        await bot.send_message(admin_id, "Запланированных рассылок нет.")
+        return
+    tz = timezone(timedelta(hours=tz_offset_hours))
+    kb = InlineKeyboardBuilder()
+    lines = ["Запланировано:"]
+    for j in jobs:
+        at = datetime.fromisoformat(j["run_at"]).astimezone(tz)
+        p = j["payload"]
+        window = f", окно {p['window_hours']} ч" if p.get("window_hours") else ""
+        lines.append(f"#{j['id']} {at:%d.%m %H:%M} — {p.get('audience', j['kind'])}{window}")
+        kb.button(text=f"✖️ #{j['id']}", callback_data=ScheduledCancel(job_id=j["id"]))
+    kb.adjust(4)
+    await bot.send_message(admin_id, "\n".join(lines), reply_markup=kb.as_markup())
+
+
+@router.message(Command("scheduled"))
+async def scheduled_cmd(message: Message, admin_ids: set[int], repo: Repo, tz_offset_hours: int):
+    if not _is_admin(message.from_user.id, admin_ids):
+        return
+    await _send_scheduled_list(message.bot, message.from_user.id, repo, tz_offset_hours)
+
+
+@router.callback_query(F.data == "admin:scheduled")
+async def scheduled_from_panel(cb: CallbackQuery, admin_ids: set[int], repo: Repo, tz_offset_hours: int):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    await _send_scheduled_list(cb.bot, cb.from_user.id, repo, tz_offset_hours)
+    await cb.answer()
+
+
+@router.callback_query(ScheduledCancel.filter())
+async def scheduled_cancel(cb: CallbackQuery, callback_data: ScheduledCancel, admin_ids: set[int], scheduler: Scheduler):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    job_id = callback_data.job_id
+    if await scheduler.cancel(job_id):
+        await cb.answer(f"Задача #{job_id} отменена", show_alert=True)
+    else:
+        await cb.answer("Задача уже запущена или отменена", show_alert=True)
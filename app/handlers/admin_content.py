@@ -1,11 +1,17 @@
-from aiogram import Router, F
+from typing import get_args
+
+from aiogram import Bot, Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
+from app.albums import AlbumBuffer
+from app.broadcast import BroadcastJobs
+from app.callbacks import DraftAction, DraftAnswer, DraftCollection, DraftStatus, SculptureStatus
 from app.db.repo import Repo, utcnow_iso
+from app.navigation import Nav
 
 router = Router()
 
@@ -32,7 +38,7 @@ class AddSculpture(StatesGroup):
     ask_broadcast = State()
 
 
-STATUSES = ["in_expo", "available", "sold", "on_request"]
+STATUSES = list(get_args(SculptureStatus))
 
 
 def _admin_only(user_id: int, admin_ids: set[int]) -> bool:
@@ -93,7 +99,7 @@ async def add_collection_cover(message: Message, admin_ids: set[int], state: FSM
 
 
 @router.message(AddCollection.sort_order)
-async def add_collection_sort(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
+async def add_collection_sort(message: Message, repo: Repo, nav: Nav, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
     raw = (message.text or "").strip()
@@ -109,10 +115,72 @@ async def add_collection_sort(message: Message, repo: Repo, admin_ids: set[int],
         cover_file_id=data.get("cover"),
         sort_order=so,
     )
+    nav.bump_content_version()
     await state.clear()
     await message.answer(f"Коллекция добавлена. ID={cid}")
 
 
+# ----- скульптура: мастер пишет в черновик (content_drafts), в FSM только draft_id -----
+
+MAX_PHOTOS = 6
+
+albums = AlbumBuffer()
+
+_TEXT_PROMPTS = {
+    AddSculpture.title.state: "Введите title скульптуры:",
+    AddSculpture.artist.state: "Введите artist (или '-' чтобы пропустить):",
+    AddSculpture.material.state: "Введите material (или '-' чтобы пропустить):",
+    AddSculpture.year.state: "Введите year (или '-' чтобы пропустить):",
+    AddSculpture.dimensions.state: "Введите dimensions (или '-' чтобы пропустить):",
+    AddSculpture.desc_short.state: "Введите description_short (или '-' чтобы пропустить):",
+}
+
+_YES_NO_PROMPTS = {
+    AddSculpture.ask_new.state: ("Отметить как новинку? (published_at=now)", "new"),
+    AddSculpture.ask_featured.state: ("Добавить в избранное? (is_featured)", "feat"),
+    AddSculpture.ask_broadcast.state: ("Разослать подписчикам? (notify_enabled=1)", "bc"),
+}
+
+
+async def _ask(bot: Bot, chat_id: int, step: str) -> None:
+    """Вопрос шага мастера — и при обычном проходе, и при продолжении черновика."""
+    kb = InlineKeyboardBuilder()
+    if step == AddSculpture.photos.state:
+        kb.button(text="✅ Готово", callback_data="adm:sc:photos_done")
+        text = f"Отправьте до {MAX_PHOTOS} фото — одним альбомом или по одному. Затем нажмите ✅ Готово."
+    elif step == AddSculpture.status.state:
+        for s in STATUSES:
+            kb.button(text=s, callback_data=DraftStatus(status=s))
+        kb.adjust(2)
+        text = "Выберите status:"
+    elif step in _YES_NO_PROMPTS:
+        text, question = _YES_NO_PROMPTS[step]
+        kb.button(text="Да", callback_data=DraftAnswer(question=question, yes=True))
+        kb.button(text="Нет", callback_data=DraftAnswer(question=question, yes=False))
+        kb.adjust(2)
+    else:
+        await bot.send_message(chat_id, _TEXT_PROMPTS[step])
+        return
+    await bot.send_message(chat_id, text, reply_markup=kb.as_markup())
+
+
+async def _draft_id(state: FSMContext) -> int | None:
+    return (await state.get_data()).get("draft_id")
+
+
+async def _advance(
+    bot: Bot, chat_id: int, repo: Repo, state: FSMContext, draft_id: int | None, step: State, **fields
+) -> None:
+    """Сохраняет поле шага и переходит к следующему: одна UPDATE черновика, FSM-данные не трогаем."""
+    if draft_id is None:
+        await state.clear()
+        await bot.send_message(chat_id, "Черновик не найден. Начните заново: /admin")
+        return
+    await repo.update_draft(draft_id, step=step.state, **fields)
+    await state.set_state(step)
+    await _ask(bot, chat_id, step.state)
+
+
 @router.callback_query(F.data == "admin:add_sculpture")
 async def start_add_sculpture(cb: CallbackQuery, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(cb.from_user.id, admin_ids):
@@ -125,213 +193,296 @@ async def start_add_sculpture(cb: CallbackQuery, repo: Repo, admin_ids: set[int]
         return
     kb = InlineKeyboardBuilder()
     for c in items:
-        kb.button(text=c["title"], callback_data=f"adm:sc:col:{c['id']}")
+        kb.button(text=c["title"], callback_data=DraftCollection(collection_id=c["id"]))
     kb.adjust(1)
     await state.set_state(AddSculpture.choose_collection)
-    await cb.bot.send_message(cb.from_user.id, "Выберите коллекцию:", reply_markup=kb.as_markup())
+    text = "Выберите коллекцию:"
+    if await repo.list_drafts(cb.from_user.id, limit=1):
+        text += "\n\nЕсть незаконченные черновики: /drafts"
+    await cb.bot.send_message(cb.from_user.id, text, reply_markup=kb.as_markup())
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("adm:sc:col:"))
-async def choose_collection(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+@router.callback_query(DraftCollection.filter())
+async def choose_collection(
+    cb: CallbackQuery, callback_data: DraftCollection, repo: Repo, admin_ids: set[int], state: FSMContext
+):
     if not _admin_only(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    cid = int(cb.data.split(":")[3])
-    await state.update_data(collection_id=cid, photos=[])
+    draft_id = await repo.create_sculpture_draft(
+        cb.from_user.id, callback_data.collection_id, AddSculpture.photos.state
+    )
+    await state.set_data({"draft_id": draft_id})
     await state.set_state(AddSculpture.photos)
-    kb = InlineKeyboardBuilder()
-    kb.button(text="✅ Готово", callback_data="adm:sc:photos_done")
-    await cb.bot.send_message(cb.from_user.id, "Отправьте 1–6 фото по одному. Затем нажмите ✅ Готово.", reply_markup=kb.as_markup())
+    await _ask(cb.bot, cb.from_user.id, AddSculpture.photos.state)
     await cb.answer()
 
 
+async def _save_photos(bot: Bot, repo: Repo, chat_id: int, draft_id: int, batch: list[Message]) -> None:
+    """Одиночное фото или целый альбом: одна запись в черновик и один ответ."""
+    photos = [(m.photo[-1].file_id, m.photo[-1].file_unique_id) for m in batch if m.photo]
+    not_photo = len(batch) - len(photos)
+    added, dups, total = await repo.add_draft_photos(draft_id, photos, MAX_PHOTOS)
+    over = len(photos) - added - dups
+    lines = []
+    if added:
+        lines.append(f"Ок, фото добавлено: {added} ({total}/{MAX_PHOTOS}).")
+    if dups:
+        lines.append(f"Уже есть в черновике, пропущено: {dups}.")
+    if not_photo:
+        lines.append(f"Не фото, пропущено: {not_photo}.")
+    if over:
+        lines.append(f"Максимум {MAX_PHOTOS} фото, не влезло: {over}. Нажми ✅ Готово.")
+    await bot.send_message(chat_id, "\n".join(lines))
+
+
 @router.message(AddSculpture.photos)
-async def collect_photos(message: Message, admin_ids: set[int], state: FSMContext):
+async def collect_photos(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
+    draft_id = await _draft_id(state)
+    if draft_id is None:
+        await message.answer("Черновик не найден. Начните заново: /admin")
+        return
+    if message.media_group_id:
+        # альбом: копим все его фото и сохраняем пачкой, когда придёт последнее
+        albums.add(message, lambda batch: _save_photos(message.bot, repo, message.chat.id, draft_id, batch))
+        return
     if not message.photo:
         await message.answer("Нужно фото. Отправь фото или нажми ✅ Готово.")
         return
-    data = await state.get_data()
-    photos = data.get("photos", [])
-    if len(photos) >= 6:
-        await message.answer("Максимум 6 фото. Нажми ✅ Готово.")
-        return
-    photos.append(message.photo[-1].file_id)
-    await state.update_data(photos=photos)
-    await message.answer(f"Ок, фото добавлено ({len(photos)}/6).")
+    await _save_photos(message.bot, repo, message.chat.id, draft_id, [message])
 
 
 @router.callback_query(F.data == "adm:sc:photos_done")
-async def photos_done(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+async def photos_done(cb: CallbackQuery, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    data = await state.get_data()
-    if not data.get("photos"):
+    draft_id = await _draft_id(state)
+    if draft_id is None:
+        await cb.answer("Черновик не найден", show_alert=True)
+        return
+    await albums.flush(cb.from_user.id)
+    if not await repo.count_draft_photos(draft_id):
         await cb.bot.send_message(cb.from_user.id, "Нужно минимум 1 фото.")
         await cb.answer()
         return
-    await state.set_state(AddSculpture.title)
-    await cb.bot.send_message(cb.from_user.id, "Введите title скульптуры:")
+    await _advance(cb.bot, cb.from_user.id, repo, state, draft_id, AddSculpture.title)
     await cb.answer()
 
 
 @router.message(AddSculpture.title)
-async def sc_title(message: Message, admin_ids: set[int], state: FSMContext):
+async def sc_title(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
     t = (message.text or "").strip()
     if not t or len(t) > 120:
         await message.answer("Title 1–120 символов.")
         return
-    await state.update_data(title=t)
-    await state.set_state(AddSculpture.artist)
-    await message.answer("Введите artist (или '-' чтобы пропустить):")
+    draft_id = await _draft_id(state)
+    await _advance(message.bot, message.chat.id, repo, state, draft_id, AddSculpture.artist, title=t)
+
+
+def _optional(message: Message) -> str | None:
+    v = (message.text or "").strip()
+    return None if v == "-" else v
 
 
 @router.message(AddSculpture.artist)
-async def sc_artist(message: Message, admin_ids: set[int], state: FSMContext):
+async def sc_artist(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
-    v = (message.text or "").strip()
-    await state.update_data(artist=None if v == "-" else v)
-    await state.set_state(AddSculpture.material)
-    await message.answer("Введите material (или '-' чтобы пропустить):")
+    draft_id = await _draft_id(state)
+    await _advance(message.bot, message.chat.id, repo, state, draft_id, AddSculpture.material, artist=_optional(message))
 
 
 @router.message(AddSculpture.material)
-async def sc_material(message: Message, admin_ids: set[int], state: FSMContext):
+async def sc_material(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
-    v = (message.text or "").strip()
-    await state.update_data(material=None if v == "-" else v)
-    await state.set_state(AddSculpture.year)
-    await message.answer("Введите year (или '-' чтобы пропустить):")
+    draft_id = await _draft_id(state)
+    await _advance(message.bot, message.chat.id, repo, state, draft_id, AddSculpture.year, material=_optional(message))
 
 
 @router.message(AddSculpture.year)
-async def sc_year(message: Message, admin_ids: set[int], state: FSMContext):
+async def sc_year(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
-    v = (message.text or "").strip()
-    await state.update_data(year=None if v == "-" else v)
-    await state.set_state(AddSculpture.dimensions)
-    await message.answer("Введите dimensions (или '-' чтобы пропустить):")
+    draft_id = await _draft_id(state)
+    await _advance(message.bot, message.chat.id, repo, state, draft_id, AddSculpture.dimensions, year=_optional(message))
 
 
 @router.message(AddSculpture.dimensions)
-async def sc_dimensions(message: Message, admin_ids: set[int], state: FSMContext):
+async def sc_dimensions(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
-    v = (message.text or "").strip()
-    await state.update_data(dimensions=None if v == "-" else v)
-    await state.set_state(AddSculpture.desc_short)
-    await message.answer("Введите description_short (или '-' чтобы пропустить):")
+    draft_id = await _draft_id(state)
+    await _advance(
+        message.bot, message.chat.id, repo, state, draft_id, AddSculpture.desc_short, dimensions=_optional(message)
+    )
 
 
 @router.message(AddSculpture.desc_short)
-async def sc_desc_short(message: Message, admin_ids: set[int], state: FSMContext):
+async def sc_desc_short(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
-    v = (message.text or "").strip()
-    await state.update_data(description_short=None if v == "-" else v)
-    await state.set_state(AddSculpture.status)
-    kb = InlineKeyboardBuilder()
-    for s in STATUSES:
-        kb.button(text=s, callback_data=f"adm:sc:status:{s}")
-    kb.adjust(2)
-    await message.answer("Выберите status:", reply_markup=kb.as_markup())
+    draft_id = await _draft_id(state)
+    await _advance(
+        message.bot, message.chat.id, repo, state, draft_id, AddSculpture.status, description_short=_optional(message)
+    )
 
 
-@router.callback_query(F.data.startswith("adm:sc:status:"))
-async def sc_status(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+@router.callback_query(DraftStatus.filter())
+async def sc_status(cb: CallbackQuery, callback_data: DraftStatus, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    status = cb.data.split(":")[3]
-    await state.update_data(status=status)
-
-    kb = InlineKeyboardBuilder()
-    kb.button(text="Да", callback_data="adm:sc:new:yes")
-    kb.button(text="Нет", callback_data="adm:sc:new:no")
-    kb.adjust(2)
-
-    await state.set_state(AddSculpture.ask_new)
-    await cb.bot.send_message(cb.from_user.id, "Отметить как новинку? (published_at=now)", reply_markup=kb.as_markup())
+    draft_id = await _draft_id(state)
+    if draft_id is None:
+        await cb.answer("Черновик не найден", show_alert=True)
+        return
+    await _advance(cb.bot, cb.from_user.id, repo, state, draft_id, AddSculpture.ask_new, status=callback_data.status)
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("adm:sc:new:"))
-async def sc_new(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+@router.callback_query(DraftAnswer.filter(F.question == "new"))
+async def sc_new(cb: CallbackQuery, callback_data: DraftAnswer, repo: Repo, admin_ids: set[int], state: FSMContext):
     if not _admin_only(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    yes = cb.data.endswith("yes")
-    await state.update_data(published_at=utcnow_iso() if yes else None)
+    draft_id = await _draft_id(state)
+    if draft_id is None:
+        await cb.answer("Черновик не найден", show_alert=True)
+        return
+    await _advance(
+        cb.bot, cb.from_user.id, repo, state, draft_id, AddSculpture.ask_featured,
+        published_at=utcnow_iso() if callback_data.yes else None,
+    )
+    await cb.answer()
 
-    kb = InlineKeyboardBuilder()
-    kb.button(text="Да", callback_data="adm:sc:feat:yes")
-    kb.button(text="Нет", callback_data="adm:sc:feat:no")
-    kb.adjust(2)
 
-    await state.set_state(AddSculpture.ask_featured)
-    await cb.bot.send_message(cb.from_user.id, "Добавить в избранное? (is_featured)", reply_markup=kb.as_markup())
+@router.callback_query(DraftAnswer.filter(F.question == "feat"))
+async def sc_feat(cb: CallbackQuery, callback_data: DraftAnswer, repo: Repo, admin_ids: set[int], state: FSMContext):
+    if not _admin_only(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    draft_id = await _draft_id(state)
+    if draft_id is None:
+        await cb.answer("Черновик не найден", show_alert=True)
+        return
+    await _advance(
+        cb.bot, cb.from_user.id, repo, state, draft_id, AddSculpture.ask_broadcast,
+        is_featured=1 if callback_data.yes else 0,
+    )
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("adm:sc:feat:"))
-async def sc_feat(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+@router.callback_query(DraftAnswer.filter(F.question == "bc"))
+async def sc_finish(
+    cb: CallbackQuery,
+    callback_data: DraftAnswer,
+    repo: Repo,
+    nav: Nav,
+    broadcast_jobs: BroadcastJobs,
+    admin_ids: set[int],
+    state: FSMContext,
+):
     if not _admin_only(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    yes = cb.data.endswith("yes")
-    await state.update_data(is_featured=1 if yes else 0)
+    draft_id = await _draft_id(state)
+    draft = await repo.get_draft(draft_id, cb.from_user.id) if draft_id else None
+    if draft is None:
+        await cb.answer("Черновик не найден", show_alert=True)
+        return
+    photos = await repo.list_draft_photos(draft_id)
+    if not photos or not draft["title"]:
+        await cb.answer("Черновик не заполнен: нужны фото и title. /drafts", show_alert=True)
+        return
+
+    sid = await repo.publish_draft(draft_id)
+    nav.bump_content_version()
 
+    await state.clear()
+    await cb.bot.send_message(cb.from_user.id, f"Скульптура добавлена. ID={sid}")
+
+    if callback_data.yes:
+        # простая рассылка: фото1 + title
+        from app.handlers.admin_broadcast import _start_broadcast
+        tmp = await cb.bot.send_photo(cb.from_user.id, photo=photos[0], caption=f"Новая работа:\n{draft['title']}")
+        await _start_broadcast(broadcast_jobs, cb.from_user.id, "all", cb.from_user.id, tmp.message_id, None, None)
+
+    await cb.answer()
+
+
+# ----- черновики: список / продолжить / удалить -----
+
+async def _send_drafts(bot: Bot, admin_id: int, repo: Repo) -> None:
+    drafts = await repo.list_drafts(admin_id)
+    if not drafts:
+        await bot.send_message(admin_id, "Черновиков нет.")
+        return
     kb = InlineKeyboardBuilder()
-    kb.button(text="Да", callback_data="adm:sc:bc:yes")
-    kb.button(text="Нет", callback_data="adm:sc:bc:no")
+    lines = ["📝 Черновики скульптур:"]
+    for d in drafts:
+        title = d["title"] or "без названия"
+        lines.append(f"#{d['id']} {title} — {d['collection_title'] or '?'}, фото: {d['photos']}, {d['updated_at'][:16]}")
+        kb.button(text=f"▶️ #{d['id']}", callback_data=DraftAction(draft_id=d["id"]))
+        kb.button(text=f"🗑 #{d['id']}", callback_data=DraftAction(draft_id=d["id"], discard=True))
     kb.adjust(2)
+    await bot.send_message(admin_id, "\n".join(lines), reply_markup=kb.as_markup())
 
-    await state.set_state(AddSculpture.ask_broadcast)
-    await cb.bot.send_message(cb.from_user.id, "Разослать подписчикам? (notify_enabled=1)", reply_markup=kb.as_markup())
-    await cb.answer()
+
+@router.message(Command("drafts"))
+async def drafts_cmd(message: Message, repo: Repo, admin_ids: set[int]):
+    if not _admin_only(message.from_user.id, admin_ids):
+        return
+    await _send_drafts(message.bot, message.from_user.id, repo)
 
 
-@router.callback_query(F.data.startswith("adm:sc:bc:"))
-async def sc_finish(cb: CallbackQuery, repo: Repo, admin_ids: set[int], state: FSMContext):
+@router.callback_query(F.data == "admin:drafts")
+async def drafts_from_panel(cb: CallbackQuery, repo: Repo, admin_ids: set[int]):
     if not _admin_only(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    do_bc = cb.data.endswith("yes")
-    data = await state.get_data()
-
-    sid = await repo.add_sculpture(
-        collection_id=int(data["collection_id"]),
-        title=data["title"],
-        artist=data.get("artist"),
-        material=data.get("material"),
-        year=data.get("year"),
-        dimensions=data.get("dimensions"),
-        description_short=data.get("description_short"),
-        status=data.get("status", "in_expo"),
-        is_featured=data.get("is_featured", 0),
-        published_at=data.get("published_at"),
-        description_full=None,
-    )
+    await _send_drafts(cb.bot, cb.from_user.id, repo)
+    await cb.answer()
 
-    for i, fid in enumerate(data["photos"]):
-        await repo.add_sculpture_photo(sid, fid, i)
 
-    await state.clear()
-    await cb.bot.send_message(cb.from_user.id, f"Скульптура добавлена. ID={sid}")
+@router.callback_query(DraftAction.filter(~F.discard))
+async def draft_open(cb: CallbackQuery, callback_data: DraftAction, repo: Repo, admin_ids: set[int], state: FSMContext):
+    if not _admin_only(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    draft_id = callback_data.draft_id
+    draft = await repo.get_draft(draft_id, cb.from_user.id)
+    if draft is None:
+        await cb.answer("Черновик уже опубликован или удалён", show_alert=True)
+        return
+    step = draft["step"] or AddSculpture.photos.state
+    await state.set_data({"draft_id": draft_id})
+    await state.set_state(step)
+    photos = await repo.count_draft_photos(draft_id)
+    await cb.bot.send_message(
+        cb.from_user.id, f"Продолжаем черновик #{draft_id}: {draft['title'] or 'без названия'}, фото: {photos}."
+    )
+    await _ask(cb.bot, cb.from_user.id, step)
+    await cb.answer()
 
-    if do_bc:
-        # простая рассылка: фото1 + title
-        from app.handlers.admin_broadcast import _send_broadcast
-        tmp = await cb.bot.send_photo(cb.from_user.id, photo=data["photos"][0], caption=f"Новая работа:\n{data['title']}")
-        ok, fail = await _send_broadcast(cb.bot, repo, "all", cb.from_user.id, tmp.message_id, None, None)
-        await cb.bot.send_message(cb.from_user.id, f"Разослано подписчикам. Успешно: {ok} / Ошибок: {fail}")
 
-    await cb.answer()
+@router.callback_query(DraftAction.filter(F.discard))
+async def draft_discard(
+    cb: CallbackQuery, callback_data: DraftAction, repo: Repo, admin_ids: set[int], state: FSMContext
+):
+    if not _admin_only(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    draft_id = callback_data.draft_id
+    if not await repo.discard_draft(draft_id, cb.from_user.id):
+        await cb.answer("Черновик уже опубликован или удалён", show_alert=True)
+        return
+    if await _draft_id(state) == draft_id:
+        await state.clear()
+    await cb.answer(f"Черновик #{draft_id} удалён", show_alert=True)
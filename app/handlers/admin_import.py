@@ -0,0 +1,122 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Router, F
+from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.fsm.context import FSMContext
+
+from app.catalog_import import MAX_ARCHIVE_BYTES, ArchiveError, CatalogImport
+from app.db.repo import Repo
+from app.navigation import Nav
+from app.outbound import ADMIN, outbound_lane
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+MAX_ERRORS_SHOWN = 20
+
+IMPORT_HELP = (
+    "📦 Импорт каталога из ZIP.\n\n"
+    "В архиве: manifest.csv (или manifest.json) и картинки.\n"
+    "Колонки: collection, title, artist, year, material, dimensions, description_short, "
+    "status (in_expo / available / sold / on_request), featured (1/0), new (1/0), "
+    "photos — файлы через '|' (или ';' в кавычках) относительно манифеста, 1–6 шт.\n"
+    "Несуществующие коллекции будут созданы.\n\n"
+    f"Пришлите архив документом (до {MAX_ARCHIVE_BYTES // 2**20} МБ) или '-' для отмены."
+)
+
+
+class ImportCatalog(StatesGroup):
+    archive = State()
+
+
+# импорт идёт в фоне, чтобы не держать апдейты админа; одновременно — один
+_running: asyncio.Task | None = None
+
+
+def _is_admin(user_id: int, admin_ids: set[int]) -> bool:
+    return user_id in admin_ids
+
+
+async def _ask_archive(bot: Bot, admin_id: int, state: FSMContext) -> None:
+    await state.set_state(ImportCatalog.archive)
+    await bot.send_message(admin_id, IMPORT_HELP)
+
+
+@router.message(Command("import"))
+async def import_cmd(message: Message, admin_ids: set[int], state: FSMContext):
+    if not _is_admin(message.from_user.id, admin_ids):
+        return
+    await _ask_archive(message.bot, message.from_user.id, state)
+
+
+@router.callback_query(F.data == "admin:import")
+async def import_from_panel(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    await _ask_archive(cb.bot, cb.from_user.id, state)
+    await cb.answer()
+
+
+async def _run_import(bot: Bot, repo: Repo, nav: Nav, admin_id: int, status: Message, imp: CatalogImport) -> None:
+    async def progress(done: int, total: int) -> None:
+        try:
+            with outbound_lane(ADMIN):
+                await status.edit_text(f"Импорт: {done}/{total} работ…")
+        except Exception:
+            pass
+
+    try:
+        report = await imp.run(bot, repo, admin_id, progress)
+    except Exception:
+        logger.exception("import: failed")
+        with outbound_lane(ADMIN):
+            await bot.send_message(admin_id, "Импорт прерван ошибкой; уже записанные пачки остались в каталоге.")
+        return
+    finally:
+        # даже после ошибки часть пачек могла попасть в каталог
+        nav.bump_content_version()
+    with outbound_lane(ADMIN):
+        await bot.send_message(admin_id, report.text())
+
+
+@router.message(ImportCatalog.archive)
+async def import_archive(message: Message, repo: Repo, nav: Nav, admin_ids: set[int], state: FSMContext):
+    global _running
+    if not _is_admin(message.from_user.id, admin_ids):
+        return
+    if (message.text or "").strip() == "-":
+        await state.clear()
+        await message.answer("Импорт отменён.")
+        return
+    doc = message.document
+    if doc is None or not (doc.file_name or "").lower().endswith(".zip"):
+        await message.answer("Нужен ZIP-архив документом (или '-' для отмены).")
+        return
+    if doc.file_size and doc.file_size > MAX_ARCHIVE_BYTES:
+        await message.answer(f"Архив больше {MAX_ARCHIVE_BYTES // 2**20} МБ — разбейте на несколько.")
+        return
+    if _running is not None and not _running.done():
+        await message.answer("Уже идёт импорт — дождитесь отчёта.")
+        return
+    await state.clear()
+
+    data = await message.bot.download(doc)
+    try:
+        imp = CatalogImport(data.getvalue())
+        errors = imp.validate()
+    except ArchiveError as e:
+        await message.answer(f"Архив не принят: {e}")
+        return
+    if errors:
+        shown = "\n".join(errors[:MAX_ERRORS_SHOWN])
+        more = f"\n…и ещё {len(errors) - MAX_ERRORS_SHOWN}" if len(errors) > MAX_ERRORS_SHOWN else ""
+        await message.answer(f"Ошибки в манифесте, ничего не импортировано:\n{shown}{more}")
+        return
+
+    status = await message.answer(f"Проверено: {len(imp.items)} работ, {imp.photo_count} фото. Загружаю…")
+    _running = asyncio.create_task(_run_import(message.bot, repo, nav, message.from_user.id, status, imp))
@@ -0,0 +1,178 @@
+import html
+from html.parser import HTMLParser
+
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from app.callbacks import DigestPage, LeadsPref
+from app.db.repo import Repo
+from app.outbox import LeadDigests, OutboxDispatcher
+
+router = Router()
+
+DIGEST_CHOICES = [0, 15, 60, 180]
+PAGE_SIZE = 5
+
+
+def _is_admin(user_id: int, admin_ids: set[int]) -> bool:
+    return user_id in admin_ids
+
+
+def _choice_label(minutes: int) -> str:
+    if minutes == 0:
+        return "сразу"
+    if minutes % 60 == 0:
+        return f"раз в {minutes // 60} ч"
+    return f"раз в {minutes} мин"
+
+
+def _prefs_kb(current: int):
+    kb = InlineKeyboardBuilder()
+    for m in DIGEST_CHOICES:
+        mark = "✅ " if m == current else ""
+        kb.button(text=f"{mark}{_choice_label(m).capitalize()}", callback_data=LeadsPref(minutes=m))
+    kb.button(text="📬 Прислать дайджест сейчас", callback_data=LeadsPref(now=True))
+    kb.adjust(2, 2, 1)
+    return kb.as_markup()
+
+
+async def _send_prefs(bot, admin_id: int, outbox: OutboxDispatcher) -> None:
+    current = await outbox.digest_minutes(admin_id)
+    await bot.send_message(
+        admin_id,
+        f"Уведомления о лидах: {_choice_label(current)}.\n"
+        "В режиме дайджеста заявки копятся и приходят одним сообщением со счётчиками.",
+        reply_markup=_prefs_kb(current),
+    )
+
+
+@router.message(Command("leads"))
+async def leads_cmd(message: Message, admin_ids: set[int], outbox: OutboxDispatcher):
+    if not _is_admin(message.from_user.id, admin_ids):
+        return
+    await _send_prefs(message.bot, message.from_user.id, outbox)
+
+
+@router.callback_query(F.data == "admin:leads")
+async def leads_from_panel(cb: CallbackQuery, admin_ids: set[int], outbox: OutboxDispatcher):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    await _send_prefs(cb.bot, cb.from_user.id, outbox)
+    await cb.answer()
+
+
+@router.callback_query(LeadsPref.filter())
+async def leads_pref(
+    cb: CallbackQuery,
+    callback_data: LeadsPref,
+    admin_ids: set[int],
+    repo: Repo,
+    outbox: OutboxDispatcher,
+    lead_digests: LeadDigests,
+):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    if callback_data.now:
+        sent = await lead_digests.send(cb.from_user.id)
+        await cb.answer("Отправлено" if sent else "Новых лидов нет")
+        return
+    minutes = callback_data.minutes
+    if minutes not in DIGEST_CHOICES:
+        await cb.answer()
+        return
+    await repo.set_digest_minutes(cb.from_user.id, minutes)
+    try:
+        await cb.message.edit_reply_markup(reply_markup=_prefs_kb(minutes))
+    except TelegramBadRequest:
+        pass
+    await cb.answer(f"Лиды: {_choice_label(minutes)}")
+
+
+# теги, которые понимает Telegram в parse_mode=HTML
+_TAGS = {
+    "b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "span", "tg-spoiler",
+    "a", "code", "pre", "blockquote", "tg-emoji",
+}
+
+
+class _MarkupCheck(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.open: list[str] = []
+        self.ok = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _TAGS:
+            self.open.append(tag)
+        else:
+            self.ok = False
+
+    def handle_endtag(self, tag):
+        if not self.open or self.open.pop() != tag:
+            self.ok = False
+
+
+def _valid_html(text: str) -> bool:
+    """Грубая проверка разметки лида: только теги Telegram и все закрыты."""
+    check = _MarkupCheck()
+    check.feed(text)
+    check.close()
+    return check.ok and not check.open
+
+
+def _digest_text(digest_id: int, page: int, pages: int, items: list, raw: bool = False) -> str:
+    blocks = [
+        # тексты лидов бывают с HTML и без — приводим к одному виду; лид со сломанной
+        # разметкой (старые заявки без экранирования) показываем как текст, чтобы не
+        # ломать всю страницу; raw — так же со всеми
+        it["text"] if it["parse_mode"] == "HTML" and not raw and _valid_html(it["text"]) else html.escape(it["text"])
+        for it in items
+    ]
+    return f"<b>Дайджест #{digest_id}</b> — стр. {page + 1}/{pages}\n\n" + "\n\n———\n\n".join(blocks)
+
+
+@router.callback_query(DigestPage.filter())
+async def digest_page(cb: CallbackQuery, callback_data: DigestPage, admin_ids: set[int], repo: Repo):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    digest_id, page = callback_data.digest_id, callback_data.page
+    digest = await repo.get_lead_digest(digest_id)
+    if not digest or digest["admin_id"] != cb.from_user.id:
+        await cb.answer("Дайджест не найден", show_alert=True)
+        return
+
+    items, total = await repo.list_digest_items(digest_id, PAGE_SIZE, page * PAGE_SIZE)
+    pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+
+    kb = InlineKeyboardBuilder()
+    if page > 0:
+        kb.button(text="←", callback_data=DigestPage(digest_id=digest_id, page=page - 1, edit=True))
+    if page + 1 < pages:
+        kb.button(text="→", callback_data=DigestPage(digest_id=digest_id, page=page + 1, edit=True))
+    kb.adjust(2)
+
+    async def show(text: str) -> None:
+        if not callback_data.edit:
+            await cb.bot.send_message(cb.from_user.id, text, parse_mode="HTML", reply_markup=kb.as_markup())
+        else:
+            await cb.message.edit_text(text, parse_mode="HTML", reply_markup=kb.as_markup())
+
+    try:
+        try:
+            await show(_digest_text(digest_id, page, pages, items))
+        except TelegramBadRequest as e:
+            if "can't parse entities" not in str(e):
+                raise
+            # Telegram не принял разметку, которую пропустила проверка, — вся страница текстом
+            await show(_digest_text(digest_id, page, pages, items, raw=True))
+    except TelegramBadRequest:
+        if not callback_data.edit:
+            raise
+        # страница уже такая ("message is not modified")
+    await cb.answer()
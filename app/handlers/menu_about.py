@@ -46,9 +46,9 @@ def register_screens(nav: Nav, repo: Repo):
             disable_web_page_preview=True,
         )
 
-    nav.register("about", screen_about)
-    nav.register("about:authors", screen_authors)
-    nav.register("about:history", screen_history)
+    nav.register("about", screen_about, static=True)
+    nav.register("about:authors", screen_authors, static=True)
+    nav.register("about:history", screen_history, static=True)
 
 
 @router.callback_query(F.data == "menu:about")
@@ -32,9 +32,9 @@ def register_screens(nav: Nav, repo: Repo):
         kb.adjust(2)
         return Screen(text=texts.GUEST_EMAIL_TEXT, inline=kb.as_markup())
 
-    nav.register("guest_contacts", screen_guest_contacts)
-    nav.register("contacts_phone", screen_phone)
-    nav.register("contacts_email", screen_email)
+    nav.register("guest_contacts", screen_guest_contacts, static=True)
+    nav.register("contacts_phone", screen_phone, static=True)
+    nav.register("contacts_email", screen_email, static=True)
 
 
 @router.callback_query(F.data == "menu:guest_contacts")
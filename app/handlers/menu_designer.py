@@ -1,3 +1,4 @@
+import html
 import re
 
 from aiogram import Router, F
@@ -8,7 +9,8 @@ from aiogram.fsm.context import FSMContext
 
 from app import texts, media
 from app.navigation import Nav, Screen
-from app.db.repo import Repo
+from app.outbox import LEAD_DESIGNER, to_admins
+from app.db.repo import OutboxMessage, Repo, utcnow_iso
 
 router = Router()
 
@@ -32,11 +34,17 @@ def _p(name: str, fallback: str = "PLACEHOLDER") -> str:
     return getattr(media, name, fallback)
 
 
+def _field(value) -> str:
+    # поля пользователя в HTML-тексте: "<" в имени иначе ломает разметку, и Telegram отвергает сообщение
+    return html.escape(str(value)) if value else "—"
+
+
 def _admin_msg(cb: CallbackQuery, u, phone: str) -> str:
-    name = getattr(u, "name", None) or "—"
-    email = getattr(u, "email", None) or "—"
-    role = getattr(u, "role", None) or "—"
-    username = f"@{cb.from_user.username}" if cb.from_user.username else "—"
+    name = _field(getattr(u, "name", None))
+    email = _field(getattr(u, "email", None))
+    role = _field(getattr(u, "role", None))
+    username = _field(f"@{cb.from_user.username}" if cb.from_user.username else None)
+    phone = _field(phone)
 
     return (
         "🎨 <b>Заявка на сотрудничество (дизайнер)</b>\n\n"
@@ -49,12 +57,17 @@ def _admin_msg(cb: CallbackQuery, u, phone: str) -> str:
     )
 
 
-async def _send_to_admins(bot, admin_ids: set[int], text: str) -> None:
-    for aid in admin_ids:
-        try:
-            await bot.send_message(aid, text, disable_web_page_preview=True)
-        except Exception:
-            pass
+def _lead_notice(admin_ids: set[int], u, phone: str, tg_user) -> list[OutboxMessage]:
+    text = (
+        "🎨 <b>Заявка на сотрудничество (дизайнер)</b>\n\n"
+        f"<b>Имя:</b> {_field(getattr(u, 'name', None))}\n"
+        f"<b>Email:</b> {_field(getattr(u, 'email', None))}\n"
+        f"<b>Роль:</b> {_field(getattr(u, 'role', None))}\n"
+        f"<b>Телефон:</b> {_field(phone)}\n"
+        f"<b>Username:</b> {_field(f'@{tg_user.username}' if tg_user.username else None)}\n"
+        f"<b>Профиль:</b> tg://user?id={tg_user.id}"
+    )
+    return to_admins(admin_ids, text, parse_mode="HTML", kind=LEAD_DESIGNER)
 
 
 def register_screens(nav: Nav, repo: Repo):
@@ -118,9 +131,9 @@ def register_screens(nav: Nav, repo: Repo):
             disable_web_page_preview=True,
         )
 
-    nav.register("designer", screen_designer)
-    nav.register("designer:need_phone", screen_need_phone)
-    nav.register("designer:phone_manual", screen_phone_manual)
+    nav.register("designer", screen_designer, static=True)
+    nav.register("designer:need_phone", screen_need_phone, static=True)
+    nav.register("designer:phone_manual", screen_phone_manual, static=True)
 
 
 @router.callback_query(F.data == "menu:designer")
@@ -130,7 +143,7 @@ async def open_designer(cb: CallbackQuery, nav: Nav):
 
 
 @router.callback_query(F.data == "designer:apply")
-async def designer_apply(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext):
+async def designer_apply(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
     # гарантируем строку юзера
     if hasattr(repo, "ensure_user_row"):
         await repo.ensure_user_row(cb.from_user.id)
@@ -152,15 +165,9 @@ async def designer_apply(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMCont
         await cb.answer()
         return
 
-    # телефон уже есть -> фиксируем и шлём
-    try:
-        if hasattr(repo, "set_designer_interest"):
-            await repo.set_designer_interest(cb.from_user.id, True)
-    except Exception:
-        pass
+    # телефон уже есть -> фиксируем и уведомляем админов (через outbox)
+    await repo.set_designer_interest(cb.from_user.id, True, outbox=_lead_notice(admin_ids, u, phone, cb.from_user))
 
-    # админам + пользователю
-    # admin_ids тут не переданы, поэтому уведомление делаем отдельным хэндлером после получения телефона.
     thanks = _t("DESIGNER_THANKS_TEXT", "Спасибо! Заявка принята. Мы свяжемся с вами в ближайшее время.")
     await cb.bot.send_message(cb.from_user.id, thanks, disable_web_page_preview=True)
     await cb.answer("Заявка отправлена ✅")
@@ -186,28 +193,15 @@ async def designer_got_contact(
         await message.answer("Не удалось прочитать номер. Попробуйте ещё раз или введите вручную.")
         return
 
-    await repo.update_profile(message.from_user.id, phone=phone)
-
-    try:
-        if hasattr(repo, "set_designer_interest"):
-            await repo.set_designer_interest(message.from_user.id, True)
-    except Exception:
-        pass
-
     u = await repo.get_user(message.from_user.id)
-    # уведомляем админов
-    tmp_cb = type("Tmp", (), {"from_user": message.from_user})()
-    # аккуратно соберём текст без костылей с CallbackQuery:
-    admin_text = (
-        "🎨 <b>Заявка на сотрудничество (дизайнер)</b>\n\n"
-        f"<b>Имя:</b> {getattr(u, 'name', None) or '—'}\n"
-        f"<b>Email:</b> {getattr(u, 'email', None) or '—'}\n"
-        f"<b>Роль:</b> {getattr(u, 'role', None) or '—'}\n"
-        f"<b>Телефон:</b> {phone}\n"
-        f"<b>Username:</b> {(f'@{message.from_user.username}' if message.from_user.username else '—')}\n"
-        f"<b>Профиль:</b> tg://user?id={message.from_user.id}"
+    # телефон, отметка интереса и уведомления админам — одной транзакцией
+    await repo.update_profile(
+        message.from_user.id,
+        phone=phone,
+        designer_interest=1,
+        designer_interest_at=utcnow_iso(),
+        outbox=_lead_notice(admin_ids, u, phone, message.from_user),
     )
-    await _send_to_admins(message.bot, admin_ids, admin_text)
 
     await state.clear()
     thanks = _t("DESIGNER_THANKS_TEXT", "Спасибо! Заявка принята. Мы свяжемся с вами в ближайшее время.")
@@ -232,25 +226,15 @@ async def designer_got_manual_phone(
         await message.answer("Похоже, номер введён некорректно. Пример: +7 999 123-45-67")
         return
 
-    await repo.update_profile(message.from_user.id, phone=raw)
-
-    try:
-        if hasattr(repo, "set_designer_interest"):
-            await repo.set_designer_interest(message.from_user.id, True)
-    except Exception:
-        pass
-
     u = await repo.get_user(message.from_user.id)
-    admin_text = (
-        "🎨 <b>Заявка на сотрудничество (дизайнер)</b>\n\n"
-        f"<b>Имя:</b> {getattr(u, 'name', None) or '—'}\n"
-        f"<b>Email:</b> {getattr(u, 'email', None) or '—'}\n"
-        f"<b>Роль:</b> {getattr(u, 'role', None) or '—'}\n"
-        f"<b>Телефон:</b> {raw}\n"
-        f"<b>Username:</b> {(f'@{message.from_user.username}' if message.from_user.username else '—')}\n"
-        f"<b>Профиль:</b> tg://user?id={message.from_user.id}"
+    # телефон, отметка интереса и уведомления админам — одной транзакцией
+    await repo.update_profile(
+        message.from_user.id,
+        phone=raw,
+        designer_interest=1,
+        designer_interest_at=utcnow_iso(),
+        outbox=_lead_notice(admin_ids, u, raw, message.from_user),
     )
-    await _send_to_admins(message.bot, admin_ids, admin_text)
 
     await state.clear()
     thanks = _t("DESIGNER_THANKS_TEXT", "Спасибо! Заявка принята. Мы свяжемся с вами в ближайшее время.")
@@ -7,8 +7,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
 from app import texts, media
+from app.callbacks import CityChoice
 from app.db.repo import Repo
 from app.navigation import Nav, Screen
+from app.outbox import LEAD_CONTACT, LEAD_VISIT, to_admins
 
 router = Router()
 
@@ -50,15 +52,20 @@ def _city_address(city: str) -> str:
     return default.get(city, "Адрес: (поставь сюда адрес)")
 
 
-async def _notify_admins(bot, admin_ids: set[int], text: str):
-    for aid in admin_ids:
-        try:
-            await bot.send_message(aid, text, disable_web_page_preview=True)
-        except Exception:
-            pass
+def _visit_notice(admin_ids: set[int], telegram_id: int, city: str, method: str, value: str | None):
+    return to_admins(
+        admin_ids,
+        "🏙 Новая заявка на визит\n"
+        f"Город: {city}\nМетод: {method}\nКонтакт: {value}\n"
+        f"Профиль: tg://user?id={telegram_id}",
+        kind=LEAD_VISIT,
+    )
 
 
-async def _create_visit_request(repo: Repo, telegram_id: int, city: str, method: str, value: str | None):
+async def _create_visit_request(
+    repo: Repo, telegram_id: int, city: str, method: str, value: str | None, admin_ids: set[int]
+):
+    """Заявка и уведомления админам — одной транзакцией; доставит OutboxDispatcher."""
     u = await repo.get_user(telegram_id)
     name_snapshot = u.name if u and u.name else None
     role_snapshot = u.role if u and u.role else None
@@ -70,6 +77,7 @@ async def _create_visit_request(repo: Repo, telegram_id: int, city: str, method:
         city=city,
         contact_method=method,
         contact_value=value,
+        outbox=_visit_notice(admin_ids, telegram_id, city, method, value),
     )
 
 
@@ -144,10 +152,10 @@ def register_screens(nav: Nav, repo: Repo):
 
     async def screen_city(chat_id: int, ctx: dict) -> Screen:
         kb = InlineKeyboardBuilder()
-        kb.button(text="Санкт-Петербург", callback_data="city:spb")
-        kb.button(text="Москва", callback_data="city:moscow")
-        kb.button(text="Ереван", callback_data="city:yerevan")
-        kb.button(text="Дубай", callback_data="city:dubai")
+        kb.button(text="Санкт-Петербург", callback_data=CityChoice(city="spb"))
+        kb.button(text="Москва", callback_data=CityChoice(city="moscow"))
+        kb.button(text="Ереван", callback_data=CityChoice(city="yerevan"))
+        kb.button(text="Дубай", callback_data=CityChoice(city="dubai"))
         kb.button(text="⬅️ Назад", callback_data="nav:back")
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
@@ -191,15 +199,15 @@ def register_screens(nav: Nav, repo: Repo):
             inline=kb.as_markup(),
         )
 
-    nav.register("invite:main", screen_invite_main)
-    nav.register("invite:me", screen_invite_me)
-    nav.register("invite:phone_manual", screen_invite_phone_manual)
-    nav.register("invite:phone_saved", screen_phone_saved)
-    nav.register("invite:contacts", screen_contacts)
-    nav.register("invite:city", screen_city)
-    nav.register("invite:method", screen_method)
+    nav.register("invite:main", screen_invite_main, static=True)
+    nav.register("invite:me", screen_invite_me, static=True)
+    nav.register("invite:phone_manual", screen_invite_phone_manual, static=True)
+    nav.register("invite:phone_saved", screen_phone_saved, static=True)
+    nav.register("invite:contacts", screen_contacts, static=True)
+    nav.register("invite:city", screen_city, static=True)
+    nav.register("invite:method", screen_method, static=True)
     nav.register("invite:visit_done", screen_visit_done)
-    nav.register("invite:email_ask", screen_email_ask)
+    nav.register("invite:email_ask", screen_email_ask, static=True)
 
 
 # ---------- handlers ----------
@@ -243,21 +251,23 @@ async def got_contact(message: Message, repo: Repo, nav: Nav, state: FSMContext,
         await message.answer("Не удалось прочитать номер. Попробуйте ещё раз или введите вручную.")
         return
 
-    await repo.update_profile(message.from_user.id, phone=phone)
-    await state.clear()
-
     u = await repo.get_user(message.from_user.id)
     name = (u.name if u and u.name else "—")
     role = (u.role if u and u.role else "—")
     username = f"@{message.from_user.username}" if message.from_user.username else "—"
 
-    await _notify_admins(
-        message.bot,
-        admin_ids,
-        "📲 Запрос связи (телефон)\n"
-        f"Имя: {name}\nРоль: {role}\nТелефон: {phone}\nUsername: {username}\n"
-        f"Профиль: tg://user?id={message.from_user.id}",
+    await repo.update_profile(
+        message.from_user.id,
+        phone=phone,
+        outbox=to_admins(
+            admin_ids,
+            "📲 Запрос связи (телефон)\n"
+            f"Имя: {name}\nРоль: {role}\nТелефон: {phone}\nUsername: {username}\n"
+            f"Профиль: tg://user?id={message.from_user.id}",
+            kind=LEAD_CONTACT,
+        ),
     )
+    await state.clear()
 
     await nav.show_screen(message.bot, message.from_user.id, "invite:phone_saved", remove_reply_keyboard=True)
 
@@ -273,30 +283,32 @@ async def got_manual_phone(message: Message, repo: Repo, nav: Nav, state: FSMCon
         await message.answer("Похоже, номер введён некорректно. Пример: +7 999 123-45-67")
         return
 
-    await repo.update_profile(message.from_user.id, phone=raw)
-    await state.clear()
-
     u = await repo.get_user(message.from_user.id)
     name = (u.name if u and u.name else "—")
     role = (u.role if u and u.role else "—")
     username = f"@{message.from_user.username}" if message.from_user.username else "—"
 
-    await _notify_admins(
-        message.bot,
-        admin_ids,
-        "📲 Запрос связи (номер вручную)\n"
-        f"Имя: {name}\nРоль: {role}\nТелефон: {raw}\nUsername: {username}\n"
-        f"Профиль: tg://user?id={message.from_user.id}",
+    await repo.update_profile(
+        message.from_user.id,
+        phone=raw,
+        outbox=to_admins(
+            admin_ids,
+            "📲 Запрос связи (номер вручную)\n"
+            f"Имя: {name}\nРоль: {role}\nТелефон: {raw}\nUsername: {username}\n"
+            f"Профиль: tg://user?id={message.from_user.id}",
+            kind=LEAD_CONTACT,
+        ),
     )
+    await state.clear()
 
     await nav.show_screen(message.bot, message.from_user.id, "invite:phone_saved", remove_reply_keyboard=True)
 
 
 # ----- VISIT FLOW -----
 
-@router.callback_query(F.data.startswith("city:"))
-async def pick_city(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext):
-    city = cb.data.split(":", 1)[1]
+@router.callback_query(CityChoice.filter())
+async def pick_city(cb: CallbackQuery, callback_data: CityChoice, repo: Repo, nav: Nav, state: FSMContext):
+    city = callback_data.city
     await repo.update_profile(cb.from_user.id, city=city)
     await state.update_data(visit_city=city)
     await nav.show_screen(cb.bot, cb.from_user.id, "invite:method")
@@ -315,15 +327,7 @@ async def method_tg(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext,
     username = f"@{cb.from_user.username}" if cb.from_user.username else None
     value = username or str(cb.from_user.id)
 
-    await _create_visit_request(repo, cb.from_user.id, city, "tg", value)
-
-    await _notify_admins(
-        cb.bot,
-        admin_ids,
-        "🏙 Новая заявка на визит\n"
-        f"Город: {city}\nМетод: tg\nКонтакт: {value}\n"
-        f"Профиль: tg://user?id={cb.from_user.id}",
-    )
+    await _create_visit_request(repo, cb.from_user.id, city, "tg", value, admin_ids)
 
     await state.clear()
     await nav.show_screen(cb.bot, cb.from_user.id, "invite:visit_done", ctx={"city": city}, remove_reply_keyboard=True)
@@ -331,7 +335,7 @@ async def method_tg(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext,
 
 
 @router.callback_query(F.data == "visit_method:email")
-async def method_email(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext):
+async def method_email(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
     data = await state.get_data()
     city = data.get("visit_city")
     if not city:
@@ -342,7 +346,7 @@ async def method_email(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContex
     u = await repo.get_user(cb.from_user.id)
     if u and u.email:
         # есть email — создаём заявку сразу
-        await _create_visit_request(repo, cb.from_user.id, city, "email", u.email)
+        await _create_visit_request(repo, cb.from_user.id, city, "email", u.email, admin_ids)
         await state.clear()
         await nav.show_screen(cb.bot, cb.from_user.id, "invite:visit_done", ctx={"city": city})
     else:
@@ -363,15 +367,7 @@ async def got_visit_email(message: Message, repo: Repo, nav: Nav, state: FSMCont
 
     email = message.text.strip()
     await repo.update_profile(message.from_user.id, email=email)
-    await _create_visit_request(repo, message.from_user.id, city, "email", email)
-
-    await _notify_admins(
-        message.bot,
-        admin_ids,
-        "🏙 Новая заявка на визит\n"
-        f"Город: {city}\nМетод: email\nКонтакт: {email}\n"
-        f"Профиль: tg://user?id={message.from_user.id}",
-    )
+    await _create_visit_request(repo, message.from_user.id, city, "email", email, admin_ids)
 
     await state.clear()
     await nav.show_screen(message.bot, message.from_user.id, "invite:visit_done", ctx={"city": city})
@@ -388,15 +384,7 @@ async def method_phone(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContex
 
     u = await repo.get_user(cb.from_user.id)
     if u and u.phone:
-        await _create_visit_request(repo, cb.from_user.id, city, "phone", u.phone)
-
-        await _notify_admins(
-            cb.bot,
-            admin_ids,
-            "🏙 Новая заявка на визит\n"
-            f"Город: {city}\nМетод: phone\nКонтакт: {u.phone}\n"
-            f"Профиль: tg://user?id={cb.from_user.id}",
-        )
+        await _create_visit_request(repo, cb.from_user.id, city, "phone", u.phone, admin_ids)
 
         await state.clear()
         await nav.show_screen(cb.bot, cb.from_user.id, "invite:visit_done", ctx={"city": city}, remove_reply_keyboard=True)
@@ -422,15 +410,7 @@ async def got_visit_phone_contact(message: Message, repo: Repo, nav: Nav, state:
         return
 
     await repo.update_profile(message.from_user.id, phone=phone)
-    await _create_visit_request(repo, message.from_user.id, city, "phone", phone)
-
-    await _notify_admins(
-        message.bot,
-        admin_ids,
-        "🏙 Новая заявка на визит\n"
-        f"Город: {city}\nМетод: phone\nКонтакт: {phone}\n"
-        f"Профиль: tg://user?id={message.from_user.id}",
-    )
+    await _create_visit_request(repo, message.from_user.id, city, "phone", phone, admin_ids)
 
     await state.clear()
     await nav.show_screen(message.bot, message.from_user.id, "invite:visit_done", ctx={"city": city}, remove_reply_keyboard=True)
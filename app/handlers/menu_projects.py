@@ -3,6 +3,7 @@ from aiogram.types import CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from app import texts, media
+from app.callbacks import ProjectPage
 from app.navigation import Nav, Screen
 from app.db.repo import Repo
 
@@ -12,9 +13,9 @@ router = Router()
 def register_screens(nav: Nav, repo: Repo):
     async def screen_projects(chat_id: int, ctx: dict) -> Screen:
         kb = InlineKeyboardBuilder()
-        kb.button(text="Golf. Game as Art", callback_data="projects:1")
-        kb.button(text="Балет", callback_data="projects:2")
-        kb.button(text="Две грани творчества", callback_data="projects:3")
+        kb.button(text="Golf. Game as Art", callback_data=ProjectPage(n=1))
+        kb.button(text="Балет", callback_data=ProjectPage(n=2))
+        kb.button(text="Две грани творчества", callback_data=ProjectPage(n=3))
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
         return Screen(text=texts.PROJECTS_TEXT, photo_file_id=media.PHOTO_PROJECTS, inline=kb.as_markup())
@@ -30,8 +31,8 @@ def register_screens(nav: Nav, repo: Repo):
         text = {1: texts.TEXT_PROJECT_1, 2: texts.TEXT_PROJECT_2, 3: texts.TEXT_PROJECT_3}.get(n, "Проект (placeholder)")
         return Screen(text=text, photo_file_id=photo, inline=kb.as_markup())
 
-    nav.register("projects", screen_projects)
-    nav.register("project", project_n)
+    nav.register("projects", screen_projects, static=True)
+    nav.register("project", project_n, cached=True)
 
 
 @router.callback_query(F.data == "menu:projects")
@@ -40,8 +41,7 @@ async def open_projects(cb: CallbackQuery, nav: Nav):
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("projects:"))
-async def open_project(cb: CallbackQuery, nav: Nav):
-    n = cb.data.split(":")[1]
-    await nav.show_screen(cb.bot, cb.from_user.id, f"project:{n}", remove_reply_keyboard=True)
+@router.callback_query(ProjectPage.filter())
+async def open_project(cb: CallbackQuery, callback_data: ProjectPage, nav: Nav):
+    await nav.show_screen(cb.bot, cb.from_user.id, f"project:{callback_data.n}", remove_reply_keyboard=True)
     await cb.answer()
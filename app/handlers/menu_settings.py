@@ -48,7 +48,7 @@ def register_screens(nav: Nav, repo: Repo):
         kb.adjust(1)
         return Screen(text=profile, photo_file_id=media.PHOTO_SETTINGS, inline=kb.as_markup())
 
-    nav.register("settings:guest", guest_settings)
+    nav.register("settings:guest", guest_settings, static=True)
     nav.register("settings:registered", registered_settings)
 
 
@@ -3,6 +3,7 @@ from aiogram.types import CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from app import texts, media
+from app.callbacks import CollectionPage, CollectionsPage, FeedPage, SculptureCard
 from app.navigation import Nav, Screen
 from app.db.repo import Repo
 
@@ -14,9 +15,9 @@ PAGE_SIZE = 8
 def register_screens(nav: Nav, repo: Repo):
     async def sculptures_home(chat_id: int, ctx: dict) -> Screen:
         kb = InlineKeyboardBuilder()
-        kb.button(text="📚 Коллекции", callback_data="sculptures:collections:0")
-        kb.button(text="✨ Новые работы", callback_data="sculptures:new:0")
-        kb.button(text="🔥 Избранные", callback_data="sculptures:featured:0")
+        kb.button(text="📚 Коллекции", callback_data=CollectionsPage())
+        kb.button(text="✨ Новые работы", callback_data=FeedPage(feed="new"))
+        kb.button(text="🔥 Избранные", callback_data=FeedPage(feed="featured"))
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
         return Screen(
@@ -37,17 +38,18 @@ def register_screens(nav: Nav, repo: Repo):
             return Screen(text=texts.COLLECTIONS_EMPTY_TEXT, inline=kb.as_markup())
 
         for c in items:
-            kb.button(text=c["title"], callback_data=f"collection:{c['id']}:0")
+            kb.button(text=c["title"], callback_data=CollectionPage(collection_id=c["id"]))
 
         if offset > 0:
-            kb.button(text="◀️", callback_data=f"sculptures:collections:{max(0, offset - PAGE_SIZE)}")
+            kb.button(text="◀️", callback_data=CollectionsPage(offset=max(0, offset - PAGE_SIZE)))
         if offset + PAGE_SIZE < total:
-            kb.button(text="▶️", callback_data=f"sculptures:collections:{offset + PAGE_SIZE}")
+            kb.button(text="▶️", callback_data=CollectionsPage(offset=offset + PAGE_SIZE))
 
         kb.button(text="⬅️ Назад", callback_data="nav:back")
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
-        return Screen(text="Выберите коллекцию:", inline=kb.as_markup())
+        prefetch = (f"sculptures_collections:{offset + PAGE_SIZE}",) if offset + PAGE_SIZE < total else ()
+        return Screen(text="Выберите коллекцию:", inline=kb.as_markup(), prefetch=prefetch)
 
     # ✅ FIX: в пустой коллекции НЕ показываем "пока нет опубликованных..."
     async def collection_sculptures(chat_id: int, ctx: dict) -> Screen:
@@ -88,21 +90,25 @@ def register_screens(nav: Nav, repo: Repo):
 
         # --- ЕСТЬ СКУЛЬПТУРЫ: список ---
         for s in items:
-            kb.button(text=s["title"], callback_data=f"sculpture:{s['id']}:0")
+            kb.button(text=s["title"], callback_data=SculptureCard(sculpture_id=s["id"]))
 
         if offset > 0:
-            kb.button(text="◀️", callback_data=f"collection:{collection_id}:{max(0, offset - PAGE_SIZE)}")
+            kb.button(text="◀️", callback_data=CollectionPage(collection_id=collection_id, offset=max(0, offset - PAGE_SIZE)))
         if offset + PAGE_SIZE < total:
-            kb.button(text="▶️", callback_data=f"collection:{collection_id}:{offset + PAGE_SIZE}")
+            kb.button(text="▶️", callback_data=CollectionPage(collection_id=collection_id, offset=offset + PAGE_SIZE))
 
         kb.button(text="⬅️ Назад", callback_data="nav:back")
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
 
+        # вероятный следующий шаг — ▶️
+        prefetch = (f"collection:{collection_id}:{offset + PAGE_SIZE}",) if offset + PAGE_SIZE < total else ()
+
         return Screen(
             text=f"{header}\n\nВыберите скульптуру:",
             photo_file_id=cover,
             inline=kb.as_markup(),
+            prefetch=prefetch,
         )
 
     async def sculpture_card(chat_id: int, ctx: dict) -> Screen:
@@ -140,9 +146,11 @@ def register_screens(nav: Nav, repo: Repo):
         text = "\n\n".join(info)
 
         kb = InlineKeyboardBuilder()
+        prefetch: tuple[str, ...] = ()
         if photos and len(photos) > 1:
             next_idx = (pidx + 1) % len(photos)
-            kb.button(text="🖼 Следующее фото", callback_data=f"sculpture_photo_next:{sid}:{next_idx}")
+            kb.button(text="🖼 Следующее фото", callback_data=SculptureCard(sculpture_id=sid, photo=next_idx, in_place=True))
+            prefetch = (f"sculpture:{sid}:{next_idx}",)
 
         u = await repo.get_user(chat_id)
         is_registered = bool(u and u.consent == 1 and u.name and u.email and u.role)
@@ -158,7 +166,7 @@ def register_screens(nav: Nav, repo: Repo):
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
 
-        return Screen(text=text, photo_file_id=file_id, inline=kb.as_markup())
+        return Screen(text=text, photo_file_id=file_id, inline=kb.as_markup(), prefetch=prefetch)
 
     async def new_feed(chat_id: int, ctx: dict) -> Screen:
         offset = int(ctx["screen_id"].split(":")[1])
@@ -172,15 +180,16 @@ def register_screens(nav: Nav, repo: Repo):
             return Screen(text="Пока нет новых работ.", inline=kb.as_markup())
 
         s = items[0]
-        kb.button(text="Подробнее", callback_data=f"sculpture:{s['id']}:0")
+        kb.button(text="Подробнее", callback_data=SculptureCard(sculpture_id=s["id"]))
         if offset + 1 < total:
-            kb.button(text="Следующая", callback_data=f"sculptures:new:{offset+1}")
+            kb.button(text="Следующая", callback_data=FeedPage(feed="new", offset=offset + 1))
         kb.button(text="⬅️ Назад", callback_data="nav:back")
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
 
         text = f"Новая работа:\n{s['title']}"
-        return Screen(text=text, inline=kb.as_markup())
+        prefetch = (f"new:{offset + 1}",) if offset + 1 < total else ()
+        return Screen(text=text, inline=kb.as_markup(), prefetch=prefetch)
 
     async def featured_feed(chat_id: int, ctx: dict) -> Screen:
         offset = int(ctx["screen_id"].split(":")[1])
@@ -194,22 +203,23 @@ def register_screens(nav: Nav, repo: Repo):
             return Screen(text="Пока нет избранных работ.", inline=kb.as_markup())
 
         s = items[0]
-        kb.button(text="Подробнее", callback_data=f"sculpture:{s['id']}:0")
+        kb.button(text="Подробнее", callback_data=SculptureCard(sculpture_id=s["id"]))
         if offset + 1 < total:
-            kb.button(text="Следующая", callback_data=f"sculptures:featured:{offset+1}")
+            kb.button(text="Следующая", callback_data=FeedPage(feed="featured", offset=offset + 1))
         kb.button(text="⬅️ Назад", callback_data="nav:back")
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
 
         text = f"Избранное:\n{s['title']}"
-        return Screen(text=text, inline=kb.as_markup())
+        prefetch = (f"featured:{offset + 1}",) if offset + 1 < total else ()
+        return Screen(text=text, inline=kb.as_markup(), prefetch=prefetch)
 
-    nav.register("sculptures_home", sculptures_home)
-    nav.register("sculptures_collections", collections_page)
-    nav.register("collection", collection_sculptures)
+    nav.register("sculptures_home", sculptures_home, static=True)
+    nav.register("sculptures_collections", collections_page, cached=True)
+    nav.register("collection", collection_sculptures, cached=True)
     nav.register("sculpture", sculpture_card)
-    nav.register("new", new_feed)
-    nav.register("featured", featured_feed)
+    nav.register("new", new_feed, cached=True)
+    nav.register("featured", featured_feed, cached=True)
 
 
 @router.callback_query(F.data == "menu:sculptures")
@@ -218,45 +228,34 @@ async def open_sculptures_home(cb: CallbackQuery, nav: Nav):
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("sculptures:collections:"))
-async def open_collections(cb: CallbackQuery, nav: Nav):
-    offset = cb.data.split(":")[2]
-    await nav.show_screen(cb.bot, cb.from_user.id, f"sculptures_collections:{offset}", remove_reply_keyboard=True)
-    await cb.answer()
-
-
-@router.callback_query(F.data.startswith("collection:"))
-async def open_collection(cb: CallbackQuery, nav: Nav):
-    _, cid, offset = cb.data.split(":")
-    await nav.show_screen(cb.bot, cb.from_user.id, f"collection:{cid}:{offset}", remove_reply_keyboard=True)
-    await cb.answer()
-
-
-@router.callback_query(F.data.startswith("sculpture:"))
-async def open_sculpture(cb: CallbackQuery, nav: Nav):
-    _, sid, pidx = cb.data.split(":")
-    await nav.show_screen(cb.bot, cb.from_user.id, f"sculpture:{sid}:{pidx}", remove_reply_keyboard=True)
+@router.callback_query(CollectionsPage.filter())
+async def open_collections(cb: CallbackQuery, callback_data: CollectionsPage, nav: Nav):
+    screen = f"sculptures_collections:{callback_data.offset}"
+    await nav.show_screen(cb.bot, cb.from_user.id, screen, remove_reply_keyboard=True)
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("sculpture_photo_next:"))
-async def next_photo(cb: CallbackQuery, nav: Nav):
-    _, sid, pidx = cb.data.split(":")
-    await nav.show_screen(cb.bot, cb.from_user.id, f"sculpture:{sid}:{pidx}", push=False, remove_reply_keyboard=True)
+@router.callback_query(CollectionPage.filter())
+async def open_collection(cb: CallbackQuery, callback_data: CollectionPage, nav: Nav):
+    screen = f"collection:{callback_data.collection_id}:{callback_data.offset}"
+    await nav.show_screen(cb.bot, cb.from_user.id, screen, remove_reply_keyboard=True)
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("sculptures:new:"))
-async def new_feed(cb: CallbackQuery, nav: Nav):
-    offset = cb.data.split(":")[2]
-    await nav.show_screen(cb.bot, cb.from_user.id, f"new:{offset}", remove_reply_keyboard=True)
+@router.callback_query(SculptureCard.filter())
+async def open_sculpture(cb: CallbackQuery, callback_data: SculptureCard, nav: Nav):
+    # листание фото (in_place) меняет карточку на месте, "Назад" ведёт к списку
+    screen = f"sculpture:{callback_data.sculpture_id}:{callback_data.photo}"
+    await nav.show_screen(
+        cb.bot, cb.from_user.id, screen, push=not callback_data.in_place, remove_reply_keyboard=True
+    )
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("sculptures:featured:"))
-async def featured_feed(cb: CallbackQuery, nav: Nav):
-    offset = cb.data.split(":")[2]
-    await nav.show_screen(cb.bot, cb.from_user.id, f"featured:{offset}", remove_reply_keyboard=True)
+@router.callback_query(FeedPage.filter())
+async def open_feed(cb: CallbackQuery, callback_data: FeedPage, nav: Nav):
+    screen = f"{callback_data.feed}:{callback_data.offset}"
+    await nav.show_screen(cb.bot, cb.from_user.id, screen, remove_reply_keyboard=True)
     await cb.answer()
 
 
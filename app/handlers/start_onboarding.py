@@ -8,6 +8,7 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from app import texts, media
+from app.callbacks import RoleChoice
 from app.db.repo import Repo
 from app.navigation import Nav, Screen
 
@@ -71,10 +72,10 @@ def register_screens(nav: Nav, repo: Repo):
 
     async def screen_role_ask(chat_id: int, ctx: dict) -> Screen:
         kb = InlineKeyboardBuilder()
-        kb.button(text="💼 Коллекционер", callback_data="role:collector")
-        kb.button(text="🤝 Арт-диллер / Представитель", callback_data="role:dealer")
-        kb.button(text="🗿 Автор", callback_data="role:author")
-        kb.button(text="👀 Просто интересуюсь", callback_data="role:interest")
+        kb.button(text="💼 Коллекционер", callback_data=RoleChoice(role="collector"))
+        kb.button(text="🤝 Арт-диллер / Представитель", callback_data=RoleChoice(role="dealer"))
+        kb.button(text="🗿 Автор", callback_data=RoleChoice(role="author"))
+        kb.button(text="👀 Просто интересуюсь", callback_data=RoleChoice(role="interest"))
         kb.adjust(1)
         return Screen(
             text=texts.ROLE_ASK_TEXT,
@@ -82,13 +83,13 @@ def register_screens(nav: Nav, repo: Repo):
             inline=kb.as_markup(),
         )
 
-    nav.register("welcome", screen_welcome)
-    nav.register("consent", screen_consent)
-    nav.register("consent_more", screen_consent_more)
-    nav.register("consent_denied", screen_consent_denied)
-    nav.register("name_ask", screen_name_ask)
-    nav.register("email_ask", screen_email_ask)
-    nav.register("role_ask", screen_role_ask)
+    nav.register("welcome", screen_welcome, static=True)
+    nav.register("consent", screen_consent, static=True)
+    nav.register("consent_more", screen_consent_more, static=True)
+    nav.register("consent_denied", screen_consent_denied, static=True)
+    nav.register("name_ask", screen_name_ask, static=True)
+    nav.register("email_ask", screen_email_ask, static=True)
+    nav.register("role_ask", screen_role_ask, static=True)
 
 
 def _is_registered(u) -> bool:
@@ -101,6 +102,7 @@ async def _open_start_screen(message: Message, repo: Repo, nav: Nav, state: FSMC
     telegram_id = message.from_user.id
 
     await repo.ensure_user_row(telegram_id)
+    await repo.mark_reachable(telegram_id)
     u = await repo.get_user(telegram_id)
 
     nav.clear(telegram_id)
@@ -191,10 +193,9 @@ async def reg_email(message: Message, repo: Repo, nav: Nav, state: FSMContext):
     await nav.show_screen(message.bot, message.from_user.id, "role_ask")
 
 
-@router.callback_query(F.data.startswith("role:"))
-async def reg_role(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext):
-    role = cb.data.split(":", 1)[1]
-    await repo.update_profile(cb.from_user.id, role=role)
+@router.callback_query(RoleChoice.filter())
+async def reg_role(cb: CallbackQuery, callback_data: RoleChoice, repo: Repo, nav: Nav, state: FSMContext):
+    await repo.update_profile(cb.from_user.id, role=callback_data.role)
     await state.clear()
     await nav.show_screen(cb.bot, cb.from_user.id, "menu:registered", remove_reply_keyboard=True)
     await cb.answer()
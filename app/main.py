@@ -1,15 +1,35 @@
 import asyncio
 import logging
+import multiprocessing
+import shutil
+import signal
+import tempfile
+from functools import lru_cache
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.filters import StateFilter
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import CallbackQuery, Message, Update
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from app.config import load_config
+from app.config import Config, load_config
 from app.db.repo import Repo
+from app.fsm_storage import SqliteStorage
 from app.navigation import Nav, Screen
+from app.antiflood import AntiFlood
+from app.callback_index import CallbackIndex
+from app.broadcast import Broadcaster, BroadcastJobs
+from app.metrics import RateMeter, metrics
+from app.outbound import LANES, OutboundScheduler
+from app.outbox import LeadDigests, OutboxDispatcher
+from app.resilience import ResilientRequests
+from app.scheduler import Scheduler
+from app.segments import Segments
+from app.sharding import (
+    OutboundBudget, ShardFront, ShardWorker, report_outbound, shard_of_chat, socket_path,
+)
+from app.updates import ChatQueues, Poller
+from app.webhook import WebhookServer
 from app import texts, media
 
 from app.handlers import (
@@ -24,12 +44,18 @@ from app.handlers import (
     admin_broadcast,
     admin_content,
     admin_fileid,
+    admin_import,
+    admin_leads,
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("form_bronze_bot")
 
+SCHEMA_PATH = "app/db/schema.sql"
+WORKER_STOP_TIMEOUT = 30.0  # сек воркеру на дообработку очередей после остановки фронта
+
 
+@lru_cache(maxsize=2)
 def build_main_menu_kb(registered: bool):
     kb = InlineKeyboardBuilder()
 
@@ -64,8 +90,72 @@ def register_core_screens(nav: Nav):
             inline=build_main_menu_kb(registered=False),
         )
 
-    nav.register("menu:registered", menu_registered)
-    nav.register("menu:guest", menu_guest)
+    nav.register("menu:registered", menu_registered, static=True)
+    nav.register("menu:guest", menu_guest, static=True)
+
+
+def screen_timings_report(limit: int = 20) -> str:
+    """Сводка трассировки Nav по префиксам экранов (самые медленные сверху)."""
+    totals = metrics.histograms("nav_transition_seconds")
+    if not totals:
+        return "Переходов пока не было."
+
+    phases = metrics.histograms("nav_phase_seconds")
+    calls = metrics.histograms("nav_api_calls")
+    sizes = metrics.histograms("nav_bytes")
+
+    rows = sorted(totals.items(), key=lambda kv: kv[1].quantile(0.95), reverse=True)
+    lines = ["<b>Экраны</b> (n, p50/p95 мс, API-вызовов, байт; фазы — среднее мс)"]
+    for labels, h in rows[:limit]:
+        screen = dict(labels)["screen"]
+        ph = [
+            f"{dict(lb)['phase']} {ph_h.avg * 1000:.0f}"
+            for lb, ph_h in phases.items()
+            if dict(lb)["screen"] == screen
+        ]
+        c = calls.get(labels)
+        b = sizes.get(labels)
+        lines.append(
+            f"\n<code>{screen}</code>: n={h.count}, "
+            f"{h.quantile(0.5) * 1000:.0f}/{h.quantile(0.95) * 1000:.0f} мс, "
+            f"api≈{c.avg if c else 0:.1f}, bytes≈{b.avg if b else 0:.0f}"
+        )
+        if ph:
+            lines.append("  " + ", ".join(ph))
+    coalesced = metrics.counter("nav_coalesced")
+    if coalesced:
+        lines.append(f"\nСклеено двойных тапов: {coalesced:.0f}")
+    waits = metrics.histograms("outbound_wait_seconds")
+    if waits:
+        lines.append("\n<b>Очередь Bot API</b> (ожидание p50/p99 мс)")
+        for lane in LANES:
+            h = waits.get((("lane", lane),))
+            if h:
+                lines.append(
+                    f"{lane}: n={h.count}, {h.quantile(0.5) * 1000:.0f}/{h.quantile(0.99) * 1000:.0f} мс, "
+                    f"в очереди {metrics.gauge('outbound_queued', lane=lane):.0f}"
+                )
+    retries = sum(metrics.counters("api_retries").values())
+    trips = metrics.counter("api_breaker_trips")
+    if retries or trips:
+        lines.append(
+            f"\nПовторов запросов: {retries:.0f}, ошибок: {sum(metrics.counters('api_errors').values()):.0f}, "
+            f"размыканий breaker: {trips:.0f}, отклонено: {sum(metrics.counters('api_breaker_rejected').values()):.0f}"
+        )
+    waits = metrics.histograms("update_wait_seconds")
+    if waits:
+        h = waits[()]
+        lines.append(
+            f"\nОчереди апдейтов: ожидание p50/p99 {h.quantile(0.5) * 1000:.0f}/{h.quantile(0.99) * 1000:.0f} мс, "
+            f"сейчас {metrics.gauge('update_queue'):.0f} в {metrics.gauge('update_chats'):.0f} чатах"
+        )
+    dropped = metrics.counters("antiflood_dropped")
+    if dropped:
+        lines.append(
+            f"\nАнти-флуд: отброшено нажатий {dropped.get((('kind', 'callback'),), 0):.0f}, "
+            f"сообщений {dropped.get((('kind', 'message'),), 0):.0f}"
+        )
+    return "\n".join(lines)
 
 
 async def is_registered(repo: Repo, telegram_id: int) -> bool:
@@ -73,17 +163,73 @@ async def is_registered(repo: Repo, telegram_id: int) -> bool:
     return bool(u and u.consent == 1 and u.name and u.email and u.role)
 
 
-async def main():
-    cfg = load_config()
+def include_routers(dp: Dispatcher) -> None:
+    dp.include_router(start_onboarding.router)
+    dp.include_router(menu_about.router)
+    dp.include_router(menu_projects.router)
+    dp.include_router(menu_contacts_guest.router)
+    dp.include_router(menu_invite_main.router)
+    dp.include_router(menu_settings.router)
+    dp.include_router(sculptures_catalog.router)
+    dp.include_router(menu_designer.router)
+    dp.include_router(admin_broadcast.router)
+    dp.include_router(admin_content.router)
+    dp.include_router(admin_import.router)  # до admin_fileid: тот забирает документы с подписью
+    dp.include_router(admin_fileid.router)
+    dp.include_router(admin_leads.router)
 
-    bot = Bot(token=cfg.bot_token)
-    dp = Dispatcher(storage=MemoryStorage())
 
+async def run_bot(cfg: Config, shard: int | None = None, socket_dir: str | None = None):
+    """Бот целиком: один процесс (shard=None) или воркер shard из cfg.workers (апдейты — от фронта)."""
+    # фоновые задачи — в одном процессе; у воркера 0 и чаты админов (см. app/sharding.py)
+    background = shard in (None, 0)
+
+    bot = Bot(token=cfg.bot_token)
+    # все исходящие запросы — через очередь с приоритетами (interactive > admin > bulk);
+    # общий лимит бота делится поровну между воркерами, воркер 0 (рассылки) забирает
+    # то, что не израсходовали остальные (OutboundBudget в app/sharding.py)
+    outbound = OutboundScheduler(rate=cfg.outbound_rate / cfg.workers)
+    # повторы снаружи очереди: каждая попытка заново проходит лимиты
+    bot.session.middleware(ResilientRequests())
+    bot.session.middleware(outbound)
     repo = Repo(cfg.db_path)
     await repo.connect()
-    await repo.init_schema("app/db/schema.sql")
+    if shard is None:
+        await repo.init_schema(SCHEMA_PATH)  # при шардировании — во фронте, до запуска воркеров
 
-    nav = Nav()
+    if cfg.fsm_storage == "sqlite":
+        storage = SqliteStorage(repo, ttl=cfg.fsm_ttl_hours * 3600)
+    else:
+        storage = MemoryStorage()
+    dp = Dispatcher(storage=storage)
+
+    if isinstance(storage, SqliteStorage):
+        # все правки FSM за апдейт — одной записью, сразу после обработки
+        @dp.update.outer_middleware()
+        async def fsm_flush(handler, event: Update, data: dict):
+            try:
+                return await handler(event, data)
+            finally:
+                await storage.flush()
+
+    nav = Nav(trace_sample_rate=cfg.trace_sample_rate)
+    # сообщения бота не от Nav (рассылки, уведомления, ответы хендлеров) тоже сдвигают экран вверх
+    outbound.add_sent_listener(nav.message_sent)
+    broadcaster = Broadcaster(rate=cfg.broadcast_rate, workers=cfg.broadcast_workers)
+    segments = Segments(repo)
+    await segments.load()
+    repo.add_user_listener(segments.refresh_user)
+    traffic = RateMeter()
+    broadcast_jobs = BroadcastJobs(
+        bot, repo, broadcaster, segments,
+        # воркер видит только свою долю трафика
+        traffic=traffic, busy_updates_per_sec=cfg.busy_updates_per_sec / cfg.workers,
+    )
+    outbox = OutboxDispatcher(bot, repo, default_digest_minutes=cfg.lead_digest_minutes)
+    repo.add_outbox_listener(outbox.wake)
+    lead_digests = LeadDigests(bot, repo, outbox)
+    scheduler = Scheduler(repo)
+    scheduler.register("broadcast", broadcast_jobs.run_scheduled)
 
     # screens
     start_onboarding.register_screens(nav, repo)
@@ -96,18 +242,20 @@ async def main():
     sculptures_catalog.register_screens(nav, repo)
     menu_designer.register_screens(nav, repo)
 
+    # интерактивная нагрузка — по ней off-peak рассылки решают, когда притормозить
+    @dp.update.outer_middleware()
+    async def count_traffic(handler, event: Update, data: dict):
+        traffic.hit()
+        return await handler(event, data)
+
+    # любое входящее сообщение сдвигает экран Nav вверх — следующий переход шлём заново
+    @dp.message.outer_middleware()
+    async def nav_mark_stale(handler, event: Message, data: dict):
+        nav.mark_stale(event.chat.id)
+        return await handler(event, data)
+
     # routers
-    dp.include_router(start_onboarding.router)
-    dp.include_router(menu_about.router)
-    dp.include_router(menu_projects.router)
-    dp.include_router(menu_contacts_guest.router)
-    dp.include_router(menu_invite_main.router)
-    dp.include_router(menu_settings.router)
-    dp.include_router(sculptures_catalog.router)
-    dp.include_router(menu_designer.router)
-    dp.include_router(admin_broadcast.router)
-    dp.include_router(admin_content.router)
-    dp.include_router(admin_fileid.router)
+    include_routers(dp)
 
     # ----- admin panel (/admin) + stats -----
     @dp.message(F.text == "/admin")
@@ -117,8 +265,14 @@ async def main():
         kb = InlineKeyboardBuilder()
         kb.button(text="➕ Добавить коллекцию", callback_data="admin:add_collection")
         kb.button(text="➕ Добавить скульптуру", callback_data="admin:add_sculpture")
+        kb.button(text="📝 Черновики", callback_data="admin:drafts")
+        kb.button(text="📦 Импорт из архива", callback_data="admin:import")
         kb.button(text="📣 Рассылка", callback_data="admin:broadcast")
+        kb.button(text="📋 Рассылки", callback_data="admin:broadcasts")
+        kb.button(text="🕐 Запланированные", callback_data="admin:scheduled")
+        kb.button(text="🔔 Уведомления о лидах", callback_data="admin:leads")
         kb.button(text="📊 Статистика", callback_data="admin:stats")
+        kb.button(text="⏱ Скорость экранов", callback_data="admin:screens")
         kb.adjust(1)
         await message.answer(texts.ADMIN_PANEL_TEXT, reply_markup=kb.as_markup())
 
@@ -130,10 +284,20 @@ async def main():
         st = await repo.stats()
         await cb.bot.send_message(
             cb.from_user.id,
-            f"Статистика:\nUsers: {st['users']}\nNotify enabled: {st['notify']}\nVisit requests NEW: {st['visit_new']}",
+            f"Статистика:\nUsers: {st['users']}\nNotify enabled: {st['notify']}\n"
+            f"Unreachable (blocked/deleted): {st['unreachable']}\nVisit requests NEW: {st['visit_new']}\n"
+            f"Outbox: pending {st['outbox_pending']}, dead {st['outbox_dead']}",
         )
         await cb.answer()
 
+    @dp.callback_query(F.data == "admin:screens")
+    async def admin_screens(cb: CallbackQuery, admin_ids: set[int]):
+        if cb.from_user.id not in admin_ids:
+            await cb.answer()
+            return
+        await cb.bot.send_message(cb.from_user.id, screen_timings_report(), parse_mode="HTML")
+        await cb.answer()
+
     # ------ Global callbacks: main/back ------
     @dp.callback_query(F.data == "menu:main")
     async def go_main(cb: CallbackQuery, repo: Repo, nav: Nav):
@@ -161,11 +325,177 @@ async def main():
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         await message.answer(texts.OPEN_MENU_FALLBACK_TEXT, reply_markup=kb.as_markup())
 
+    # все хендлеры зарегистрированы — callback'и дальше ищутся по индексу, а не перебором фильтров
+    dp.callback_query.outer_middleware(CallbackIndex(dp))
+
+    if background:
+        # рассылки, прерванные рестартом, продолжаются с первого недоставленного
+        await broadcast_jobs.resume_all()
+        await scheduler.start()
+        await outbox.start()
+        await lead_digests.start()
+
+    workflow_data = dict(
+        repo=repo,
+        nav=nav,
+        broadcast_jobs=broadcast_jobs,
+        segments=segments,
+        scheduler=scheduler,
+        outbox=outbox,
+        lead_digests=lead_digests,
+        admin_ids=cfg.admin_ids,
+        tz_offset_hours=cfg.tz_offset_hours,
+    )
+    # анти-флуд — до очереди чата: отброшенный апдейт не ждёт в ней и не задерживает экран Nav
+    antiflood = None
+    if cfg.antiflood_rate > 0:
+        antiflood = AntiFlood(
+            cfg.antiflood_rate,
+            cfg.antiflood_burst,
+            admin_ids=cfg.admin_ids,
+            exempt_admins=cfg.antiflood_exempt_admins,
+        )
+    # апдейты разных чатов — параллельно, одного чата — по очереди (стек Nav, FSM, альбомы)
+    queues = ChatQueues(
+        lambda update: dp.feed_update(bot, update, **workflow_data),
+        concurrency=cfg.update_concurrency,
+        max_pending=cfg.update_queue,
+        admit=antiflood.admit if antiflood is not None else None,
+    )
     try:
-        await dp.start_polling(bot, repo=repo, nav=nav, admin_ids=cfg.admin_ids)
+        if shard is not None:
+            worker = ShardWorker(dp, bot, queues, socket_path(socket_dir, shard), **workflow_data)
+            # изменения, о которых должны узнать остальные воркеры
+            nav.add_content_listener(lambda: worker.publish("content"))
+            repo.add_outbox_listener(lambda: worker.publish("outbox"))
+
+            async def user_changed(telegram_id: int) -> None:
+                worker.publish("user", id=telegram_id)
+
+            repo.add_user_listener(user_changed)
+
+            def sent_elsewhere(chat_id: int | str) -> None:
+                # рассылки и outbox идут из воркера 0, а экран Nav чата — у воркера-владельца
+                if isinstance(chat_id, int) and shard_of_chat(chat_id, cfg.workers, cfg.admin_ids) != shard:
+                    worker.publish("stale", id=chat_id)
+
+            outbound.add_sent_listener(sent_elsewhere)
+            worker.on("content", lambda msg: nav.bump_content_version(notify=False))
+            worker.on("stale", lambda msg: nav.mark_stale(msg["id"]))
+            worker.on("outbox", lambda msg: outbox.wake())
+            worker.on("user", lambda msg: segments.refresh_user(msg["id"]))
+            if shard == 0:
+                worker.on("outbound", OutboundBudget(outbound, cfg.outbound_rate, cfg.workers).on_report)
+                await worker.run()
+            else:
+                reporter = asyncio.create_task(report_outbound(worker, shard, outbound))
+                try:
+                    await worker.run()
+                finally:
+                    reporter.cancel()
+        elif cfg.bot_mode == "webhook":
+            server = WebhookServer(
+                dp,
+                bot,
+                queues,
+                path=cfg.webhook_path,
+                secret=cfg.webhook_secret,
+                base_url=cfg.webhook_base_url,
+                host=cfg.webhook_host,
+                port=cfg.webhook_port,
+                **workflow_data,
+            )
+            await server.run()
+        else:
+            # после работы в webhook-режиме getUpdates вернёт конфликт, пока webhook не снят
+            await bot.delete_webhook()
+            await Poller(dp, bot, queues, **workflow_data).run()
     finally:
+        await scheduler.stop()
+        await lead_digests.stop()
+        await outbox.stop()
+        await broadcast_jobs.shutdown()
+        await outbound.close()
+        await storage.close()
         await repo.close()
 
 
+def _worker_process(shard: int, socket_dir: str) -> None:
+    # останавливает фронт (закрывает сокет), а не сигнал: Ctrl+C приходит всей группе процессов
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(run_bot(load_config(), shard, socket_dir))
+
+
+async def run_front(cfg: Config):
+    """WORKERS > 1: принимаем апдейты и раздаём их воркерам по chat_id (app/sharding.py)."""
+    repo = Repo(cfg.db_path)
+    await repo.connect()
+    await repo.init_schema(SCHEMA_PATH)
+    await repo.close()
+
+    socket_dir = tempfile.mkdtemp(prefix="bot-shards-")
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=_worker_process, args=(shard, socket_dir), name=f"worker-{shard}")
+        for shard in range(cfg.workers)
+    ]
+    for p in processes:
+        p.start()
+
+    bot = Bot(token=cfg.bot_token)
+    # хендлеры фронту не нужны — только список типов апдейтов для getUpdates / setWebhook
+    dp = Dispatcher()
+    include_routers(dp)
+    front = ShardFront(socket_dir, cfg.workers, cfg.admin_ids, cfg.update_concurrency, cfg.update_queue)
+    failed = False
+    try:
+        await front.connect()
+        if cfg.bot_mode == "webhook":
+            intake = WebhookServer(
+                dp,
+                bot,
+                front,
+                path=cfg.webhook_path,
+                secret=cfg.webhook_secret,
+                base_url=cfg.webhook_base_url,
+                host=cfg.webhook_host,
+                port=cfg.webhook_port,
+            ).run()
+        else:
+            await bot.delete_webhook()
+            intake = Poller(dp, bot, front).run()
+        running = asyncio.create_task(intake)
+        lost = asyncio.create_task(front.lost.wait())
+        await asyncio.wait((running, lost), return_when=asyncio.FIRST_COMPLETED)
+        lost.cancel()
+        if running.done():
+            running.result()  # ошибка приёма (занят порт и т.п.) — наружу
+        else:
+            # без воркера часть чатов не обслуживается — падаем целиком, пусть перезапустят
+            failed = True
+            running.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+    finally:
+        await front.close()
+        for p in processes:
+            await asyncio.to_thread(p.join, WORKER_STOP_TIMEOUT)
+            if p.is_alive():
+                logger.warning("sharding: %s did not stop, terminating", p.name)
+                p.terminate()
+        await bot.session.close()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+    if failed:
+        raise SystemExit(1)
+
+
+async def main():
+    cfg = load_config()
+    if cfg.workers > 1:
+        await run_front(cfg)
+    else:
+        await run_bot(cfg)
+
+
 if __name__ == "__main__":
     asyncio.run(main())
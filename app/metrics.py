@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import math
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterator
+
+# Простые метрики в памяти процесса: счётчики и гистограммы с фиксированными бакетами.
+# Смотреть — из /admin (см. main.py), наружу ничего не экспортируется.
+
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf,
+)
+SIZE_BUCKETS: tuple[float, ...] = (0, 1, 2, 3, 4, 5, 8, 16, 64, 256, 1024, 4096, math.inf)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(kw: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "total")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Верхняя граница бакета, в который попадает q-квантиль (оценка сверху)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        acc = 0
+        for bound, c in zip(self.buckets, self.counts):
+            acc += c
+            if acc >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._hists: dict[tuple[str, Labels], Histogram] = {}
+        self._gauges: dict[tuple[str, Labels], float] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self._gauges[(name, _labels(labels))] = value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        **labels,
+    ) -> None:
+        key = (name, _labels(labels))
+        h = self._hists.get(key)
+        if h is None:
+            h = self._hists[key] = Histogram(buckets)
+        h.observe(value)
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get((name, _labels(labels)), 0)
+
+    def gauge(self, name: str, **labels) -> float:
+        return self._gauges.get((name, _labels(labels)), 0)
+
+    def counters(self, name: str) -> dict[Labels, float]:
+        return {lb: v for (n, lb), v in self._counters.items() if n == name}
+
+    def histograms(self, name: str) -> dict[Labels, Histogram]:
+        return {lb: h for (n, lb), h in self._hists.items() if n == name}
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._hists.clear()
+        self._gauges.clear()
+
+
+metrics = Metrics()
+
+
+class RateMeter:
+    """Событий в секунду за скользящее окно (секундные корзины)."""
+
+    __slots__ = ("window", "_buckets")
+
+    def __init__(self, window: int = 10) -> None:
+        self.window = window
+        self._buckets: dict[int, int] = {}
+
+    def hit(self, n: int = 1) -> None:
+        sec = int(time.monotonic())
+        self._buckets[sec] = self._buckets.get(sec, 0) + n
+        if len(self._buckets) > self.window * 2:
+            edge = sec - self.window
+            self._buckets = {k: v for k, v in self._buckets.items() if k > edge}
+
+    def rate(self) -> float:
+        edge = int(time.monotonic()) - self.window
+        return sum(v for k, v in self._buckets.items() if k > edge) / self.window
+
+
+class Trace:
+    """Трассировка одного перехода Nav: фазы, число вызовов Bot API, байты текста.
+
+    Не сэмплированный trace всё равно можно использовать — он просто ничего не пишет.
+    """
+
+    __slots__ = ("sampled", "spans", "api_calls", "bytes_sent", "_t0")
+
+    def __init__(self, sample_rate: float) -> None:
+        self.sampled = sample_rate >= 1.0 or (sample_rate > 0 and random.random() < sample_rate)
+        self.spans: dict[str, float] = {}
+        self.api_calls = 0
+        self.bytes_sent = 0
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[phase] = self.spans.get(phase, 0.0) + time.perf_counter() - t
+
+    def api(self, calls: int = 1, text: str | None = None) -> None:
+        self.api_calls += calls
+        if text:
+            self.bytes_sent += len(text.encode("utf-8"))
+
+    def finish(self, screen: str, outcome: str = "sent") -> None:
+        if not self.sampled:
+            return
+        metrics.observe("nav_transition_seconds", time.perf_counter() - self._t0, screen=screen)
+        for phase, dt in self.spans.items():
+            metrics.observe("nav_phase_seconds", dt, screen=screen, phase=phase)
+        metrics.observe("nav_api_calls", self.api_calls, buckets=SIZE_BUCKETS, screen=screen)
+        metrics.observe("nav_bytes", self.bytes_sent, buckets=SIZE_BUCKETS, screen=screen)
+        metrics.inc("nav_transitions", screen=screen, outcome=outcome)
@@ -1,14 +1,25 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Callable, Awaitable
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Awaitable
 
 from aiogram import Bot
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
 from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
 
+from app.metrics import Trace, metrics
+from app.updates import defer_render, drop_deferred
 from app.utils.safe_delete import safe_delete
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class Screen:
@@ -22,11 +33,40 @@ class Screen:
     disable_web_page_preview: bool = True
     # Если не задан — используем дефолт Nav (HTML)
     parse_mode: ParseMode | None = None
+    # screen_id, куда пользователь скорее всего пойдёт дальше (▶️, "Следующее фото") —
+    # Nav отрендерит их в фоне, чтобы следующий переход не ждал БД
+    prefetch: tuple[str, ...] = ()
+    # считается лениво один раз (static/cached экраны переиспользуют значение)
+    _fingerprint: int | None = field(default=None, init=False, repr=False, compare=False)
+
+    def fingerprint(self) -> int:
+        """Отпечаток того, что реально уйдёт в чат: текст, медиа, клавиатуры."""
+        if self._fingerprint is None:
+            self._fingerprint = hash((
+                self.text,
+                self.photo_file_id,
+                self.video_file_id,
+                self.inline.model_dump_json(exclude_none=True) if self.inline else None,
+                self.reply.model_dump_json(exclude_none=True) if self.reply else None,
+                self.reply_prompt,
+                self.disable_web_page_preview,
+                self.parse_mode,
+            ))
+        return self._fingerprint
 
 
 Renderer = Callable[[int, dict], Awaitable[Screen]]
 
 
+SCREEN_CACHE_SIZE = 512  # сколько параметризованных экранов держим в памяти
+
+PREFETCH_TTL = 30.0  # сек; предзагруженный экран старше — рендерим заново
+PREFETCH_CACHE_SIZE = 1024
+PREFETCH_CONCURRENCY = 2  # одновременных фоновых рендеров; сверх — подсказки просто отбрасываются
+
+# True, пока идёт переход Nav: его собственные сообщения не делают экран устаревшим
+_in_transition: ContextVar[bool] = ContextVar("nav_in_transition", default=False)
+
 CAPTION_LIMIT = 900  # безопасно для фото/видео caption (Telegram 1024, HTML/ссылки съедают байты)
 
 
@@ -38,31 +78,181 @@ def _safe_text(text: str | None, fallback: str = "…") -> str:
     return t if t else fallback
 
 
+class _ChatGate:
+    """Замок одного чата + номер последнего запроса (для склейки двойных тапов)."""
+
+    __slots__ = ("lock", "users", "latest")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.latest = 0
+
+
 class Nav:
     """Навигация “как браузер”:
     - history stack в памяти
     - last message ids (может быть 1-3 сообщения: видео/фото/текст + aux)
+    - кэш готовых Screen:
+        static=True  — экран не зависит от chat_id/ctx/БД, строится один раз;
+        cached=True  — экран зависит только от screen_id и контента каталога,
+                       кэшируется по (screen_id, content_version).
+    - переходы одного чата выполняются строго по очереди; если пока идёт переход
+      пришло несколько новых — выполняется только самый последний; если за
+      текущим апдейтом в очереди чата уже ждёт новое нажатие, переход
+      откладывается и выполняется, только если то нажатие само ничего не
+      нарисует (app/updates.py).
+    - отпечаток показанного экрана: повторный тап на тот же экран ничего не
+      удаляет и не отправляет заново (см. mark_stale; любое сообщение бота в чат
+      не от Nav — рассылка, уведомление, ответ хендлера — тоже сдвигает экран, см.
+      message_sent).
+    - Screen.prefetch: после показа экрана подсказанные screen_id рендерятся в фоне
+      (не больше PREFETCH_CONCURRENCY одновременно) и живут PREFETCH_TTL секунд.
+    - трассировка переходов (доля trace_sample_rate): фазы, вызовы Bot API, байты —
+      по префиксу экрана в app.metrics.
     """
 
-    def __init__(self, default_parse_mode: ParseMode = ParseMode.HTML) -> None:
+    def __init__(
+        self,
+        default_parse_mode: ParseMode = ParseMode.HTML,
+        trace_sample_rate: float = 1.0,
+    ) -> None:
         self._stack: dict[int, list[str]] = {}
         self._last_ids: dict[int, list[int]] = {}
         self._renderers: dict[str, Renderer] = {}
         self._default_parse_mode: ParseMode = default_parse_mode
-
-    def register(self, screen_prefix: str, renderer: Renderer) -> None:
+        self._trace_sample_rate = trace_sample_rate
+
+        self._static: set[str] = set()
+        self._cached: set[str] = set()
+        self._static_screens: dict[str, Screen] = {}
+        self._screen_cache: OrderedDict[tuple[str, int], Screen] = OrderedDict()
+        self._content_version: int = 0
+        self._content_listeners: list[Callable[[], None]] = []
+
+        # chat_id -> gate; запись живёт только пока есть активные/ждущие переходы
+        self._gates: dict[int, _ChatGate] = {}
+        # chat_id -> отпечаток экрана, который сейчас внизу чата
+        self._shown: dict[int, int] = {}
+
+        # (chat_id, screen_id) -> (expires_at, content_version, Screen)
+        self._prefetched: OrderedDict[tuple[int, str], tuple[float, int, Screen]] = OrderedDict()
+        # запущенные фоновые рендеры: счёт растёт при постановке задачи, а не при её старте
+        self._prefetch_inflight = 0
+        self._prefetch_tasks: set[asyncio.Task] = set()
+
+    def register(
+        self,
+        screen_prefix: str,
+        renderer: Renderer,
+        static: bool = False,
+        cached: bool = False,
+    ) -> None:
         self._renderers[screen_prefix] = renderer
-
-    def _resolve(self, screen_id: str) -> Renderer:
+        self._static.discard(screen_prefix)
+        self._cached.discard(screen_prefix)
+        if static:
+            self._static.add(screen_prefix)
+        elif cached:
+            self._cached.add(screen_prefix)
+
+    @property
+    def content_version(self) -> int:
+        return self._content_version
+
+    def add_content_listener(self, listener: Callable[[], None]) -> None:
+        """listener() вызывается после bump_content_version (кроме notify=False)."""
+        self._content_listeners.append(listener)
+
+    def bump_content_version(self, notify: bool = True) -> None:
+        """Вызывать после изменения каталога (коллекции/скульптуры) — сбрасывает cached-экраны.
+        notify=False — сброс пришёл извне (другой процесс), слушателей не зовём."""
+        self._content_version += 1
+        self._screen_cache.clear()
+        self._prefetched.clear()
+        if notify:
+            for listener in self._content_listeners:
+                listener()
+
+    def _resolve_prefix(self, screen_id: str) -> str:
         candidates = [
-            (k, v)
-            for k, v in self._renderers.items()
+            k
+            for k in self._renderers
             if screen_id == k or screen_id.startswith(k + ":")
         ]
         if not candidates:
             raise KeyError(f"No renderer for screen_id={screen_id}")
-        candidates.sort(key=lambda x: len(x[0]), reverse=True)
-        return candidates[0][1]
+        return max(candidates, key=len)
+
+    def _resolve(self, screen_id: str) -> Renderer:
+        return self._renderers[self._resolve_prefix(screen_id)]
+
+    async def render(self, chat_id: int, screen_id: str, ctx: dict | None = None) -> Screen:
+        prefix = self._resolve_prefix(screen_id)
+        renderer = self._renderers[prefix]
+        full_ctx = {"screen_id": screen_id, **(ctx or {})}
+
+        # static: один Screen на screen_id, ctx/chat_id не учитываются
+        if prefix in self._static:
+            screen = self._static_screens.get(screen_id)
+            if screen is None:
+                screen = await renderer(chat_id, full_ctx)
+                self._static_screens[screen_id] = screen
+            return screen
+
+        # cached: ключ — параметры из screen_id + версия контента
+        if prefix in self._cached:
+            key = (screen_id, self._content_version)
+            screen = self._screen_cache.get(key)
+            if screen is not None:
+                self._screen_cache.move_to_end(key)
+                return screen
+            screen = await renderer(chat_id, full_ctx)
+            self._screen_cache[key] = screen
+            if len(self._screen_cache) > SCREEN_CACHE_SIZE:
+                self._screen_cache.popitem(last=False)
+            return screen
+
+        # предзагруженный экран одноразовый и годится только без доп. ctx
+        if not ctx:
+            hit = self._prefetched.pop((chat_id, screen_id), None)
+            if hit and hit[0] > time.monotonic() and hit[1] == self._content_version:
+                return hit[2]
+
+        return await renderer(chat_id, full_ctx)
+
+    def _schedule_prefetch(self, chat_id: int, screen_ids: tuple[str, ...]) -> None:
+        for sid in screen_ids:
+            # бюджет исчерпан — живой трафик важнее, подсказку пропускаем (а не ставим в очередь)
+            if self._prefetch_inflight >= PREFETCH_CONCURRENCY:
+                return
+            self._prefetch_inflight += 1
+            task = asyncio.create_task(self._prefetch(chat_id, sid))
+            self._prefetch_tasks.add(task)
+            task.add_done_callback(self._prefetch_done)
+
+    def _prefetch_done(self, task: asyncio.Task) -> None:
+        self._prefetch_tasks.discard(task)
+        self._prefetch_inflight -= 1
+
+    async def _prefetch(self, chat_id: int, screen_id: str) -> None:
+        try:
+            prefix = self._resolve_prefix(screen_id)
+            if prefix in self._static or prefix in self._cached:
+                # общий кэш заполнится сам
+                await self.render(chat_id, screen_id)
+                return
+            version = self._content_version
+            screen = await self._renderers[prefix](chat_id, {"screen_id": screen_id})
+        except Exception:
+            logger.debug("prefetch failed: %s", screen_id, exc_info=True)
+            return
+
+        key = (chat_id, screen_id)
+        self._prefetched[key] = (time.monotonic() + PREFETCH_TTL, version, screen)
+        self._prefetched.move_to_end(key)
+        while len(self._prefetched) > PREFETCH_CACHE_SIZE:
+            self._prefetched.popitem(last=False)
 
     def push(self, chat_id: int, screen_id: str) -> None:
         self._stack.setdefault(chat_id, []).append(screen_id)
@@ -80,10 +270,49 @@ class Nav:
     def clear(self, chat_id: int) -> None:
         self._stack[chat_id] = []
 
-    async def _delete_last(self, bot: Bot, chat_id: int) -> None:
+    def mark_stale(self, chat_id: int) -> None:
+        """В чате появились сообщения не от Nav (например, пользователь что-то написал) —
+        экран Nav больше не последний, следующий переход надо отправить заново."""
+        self._shown.pop(chat_id, None)
+
+    def message_sent(self, chat_id: int) -> None:
+        """Бот отправил сообщение в чат (зовёт OutboundScheduler): не из перехода Nav — экран устарел."""
+        if not _in_transition.get():
+            self.mark_stale(chat_id)
+
+    def _update_stack(self, chat_id: int, screen_id: str, push: bool, replace_top: bool) -> None:
+        if not push:
+            return
+        st = self._stack.setdefault(chat_id, [])
+        if replace_top and st:
+            st[-1] = screen_id
+        else:
+            st.append(screen_id)
+
+    @asynccontextmanager
+    async def _chat_turn(self, chat_id: int) -> AsyncIterator[bool]:
+        """Сериализует переходы чата. Отдаёт False, если запрос уже устарел
+        (пока ждали замок, пришёл более новый) — такой переход надо пропустить."""
+        gate = self._gates.get(chat_id)
+        if gate is None:
+            gate = self._gates[chat_id] = _ChatGate()
+        gate.users += 1
+        gate.latest += 1
+        ticket = gate.latest
+        try:
+            async with gate.lock:
+                yield ticket == gate.latest
+        finally:
+            gate.users -= 1
+            if gate.users == 0 and self._gates.get(chat_id) is gate:
+                del self._gates[chat_id]
+
+    async def _delete_last(self, bot: Bot, chat_id: int, trace: Trace | None = None) -> None:
         ids = self._last_ids.get(chat_id) or []
         for mid in ids:
             await safe_delete(bot, chat_id, mid)
+        if trace:
+            trace.api(len(ids))
         self._last_ids[chat_id] = []
 
     async def show_screen(
@@ -96,14 +325,77 @@ class Nav:
         replace_top: bool = False,
         remove_reply_keyboard: bool = False,
     ) -> None:
-        ctx = ctx or {}
-
-        # 1) удаляем прошлые сообщения бота этого "экрана"
-        await self._delete_last(bot, chat_id)
-
-        # 2) рендерим экран
-        renderer = self._resolve(screen_id)
-        screen = await renderer(chat_id, {"screen_id": screen_id, **ctx})
+        async with self._chat_turn(chat_id) as current:
+            if not current:
+                metrics.inc("nav_coalesced")
+                return
+            # следующее нажатие уже в очереди: нарисуем, только если оно само экран не покажет
+            if defer_render(
+                chat_id,
+                lambda: self.show_screen(bot, chat_id, screen_id, ctx, push, replace_top, remove_reply_keyboard),
+            ):
+                return
+            if drop_deferred(chat_id):
+                metrics.inc("nav_coalesced")
+            await self._show_screen(bot, chat_id, screen_id, ctx, push, replace_top, remove_reply_keyboard)
+
+    async def _show_screen(
+        self,
+        bot: Bot,
+        chat_id: int,
+        screen_id: str,
+        ctx: dict | None,
+        push: bool,
+        replace_top: bool,
+        remove_reply_keyboard: bool,
+    ) -> None:
+        trace = Trace(self._trace_sample_rate)
+        label = self._resolve_prefix(screen_id)
+        token = _in_transition.set(True)
+        try:
+            outcome = await self._transition(
+                bot, chat_id, screen_id, ctx or {}, push, replace_top, remove_reply_keyboard, trace
+            )
+        except (TelegramNetworkError, TelegramServerError):
+            # повторы уже были в ResilientRequests; экран мог остаться наполовину
+            # показанным — следующий переход отправим заново
+            trace.finish(label, outcome="error")
+            self.mark_stale(chat_id)
+            logger.warning("nav: can't show %s to %s", screen_id, chat_id, exc_info=True)
+            return
+        except Exception:
+            trace.finish(label, outcome="error")
+            raise
+        finally:
+            _in_transition.reset(token)
+        trace.finish(label, outcome=outcome)
+
+    async def _transition(
+        self,
+        bot: Bot,
+        chat_id: int,
+        screen_id: str,
+        ctx: dict,
+        push: bool,
+        replace_top: bool,
+        remove_reply_keyboard: bool,
+        trace: Trace,
+    ) -> str:
+        # 1) рендерим экран (static/cached берутся из памяти)
+        with trace.span("render"):
+            screen = await self.render(chat_id, screen_id, ctx)
+
+        # 1.1) тот же экран уже внизу чата — ничего не трогаем, только стек
+        fp = screen.fingerprint()
+        if self._last_ids.get(chat_id) and self._shown.get(chat_id) == fp:
+            if self.peek(chat_id) != screen_id:
+                self._update_stack(chat_id, screen_id, push, replace_top)
+            return "unchanged"
+
+        # 2) удаляем прошлые сообщения бота этого "экрана"
+        with trace.span("delete"):
+            await self._delete_last(bot, chat_id, trace)
+        self._shown.pop(chat_id, None)
 
         # 3) страхуем текст
         screen_text = _safe_text(screen.text)
@@ -116,23 +408,27 @@ class Nav:
         # 0) если надо убрать reply-клавиатуру (после request_contact)
         # Telegram не позволяет отправить пустой текст — шлём "…" и тут же удаляем.
         if remove_reply_keyboard:
-            rm_msg = await bot.send_message(
-                chat_id=chat_id,
-                text="…",
-                reply_markup=ReplyKeyboardRemove(),
-                parse_mode=pm,
-            )
-            await safe_delete(bot, chat_id, rm_msg.message_id)
+            with trace.span("remove_reply"):
+                rm_msg = await bot.send_message(
+                    chat_id=chat_id,
+                    text="…",
+                    reply_markup=ReplyKeyboardRemove(),
+                    parse_mode=pm,
+                )
+                await safe_delete(bot, chat_id, rm_msg.message_id)
+            trace.api(2)
 
         # helper: отправка длинного текста отдельно
         async def _send_text_only() -> int:
-            m = await bot.send_message(
-                chat_id=chat_id,
-                text=screen_text,
-                reply_markup=screen.inline,
-                disable_web_page_preview=screen.disable_web_page_preview,
-                parse_mode=pm,
-            )
+            with trace.span("text"):
+                m = await bot.send_message(
+                    chat_id=chat_id,
+                    text=screen_text,
+                    reply_markup=screen.inline,
+                    disable_web_page_preview=screen.disable_web_page_preview,
+                    parse_mode=pm,
+                )
+            trace.api(1, screen_text)
             return m.message_id
 
         # 4) основной контент: видео/фото+текст или только текст
@@ -140,32 +436,40 @@ class Nav:
         # 4.1) видео
         if screen.video_file_id and not screen.video_file_id.startswith("PLACEHOLDER"):
             if len(screen_text) <= CAPTION_LIMIT and screen.inline and screen.reply is None:
-                v = await bot.send_video(
-                    chat_id=chat_id,
-                    video=screen.video_file_id,
-                    caption=screen_text,
-                    reply_markup=screen.inline,
-                    parse_mode=pm,
-                )
+                with trace.span("media"):
+                    v = await bot.send_video(
+                        chat_id=chat_id,
+                        video=screen.video_file_id,
+                        caption=screen_text,
+                        reply_markup=screen.inline,
+                        parse_mode=pm,
+                    )
+                trace.api(1, screen_text)
                 sent_ids.append(v.message_id)
             else:
-                v = await bot.send_video(chat_id=chat_id, video=screen.video_file_id)
+                with trace.span("media"):
+                    v = await bot.send_video(chat_id=chat_id, video=screen.video_file_id)
+                trace.api(1)
                 sent_ids.append(v.message_id)
                 sent_ids.append(await _send_text_only())
 
         # 4.2) фото
         elif screen.photo_file_id and not screen.photo_file_id.startswith("PLACEHOLDER"):
             if len(screen_text) <= CAPTION_LIMIT and screen.inline and screen.reply is None:
-                p = await bot.send_photo(
-                    chat_id=chat_id,
-                    photo=screen.photo_file_id,
-                    caption=screen_text,
-                    reply_markup=screen.inline,
-                    parse_mode=pm,
-                )
+                with trace.span("media"):
+                    p = await bot.send_photo(
+                        chat_id=chat_id,
+                        photo=screen.photo_file_id,
+                        caption=screen_text,
+                        reply_markup=screen.inline,
+                        parse_mode=pm,
+                    )
+                trace.api(1, screen_text)
                 sent_ids.append(p.message_id)
             else:
-                p = await bot.send_photo(chat_id=chat_id, photo=screen.photo_file_id)
+                with trace.span("media"):
+                    p = await bot.send_photo(chat_id=chat_id, photo=screen.photo_file_id)
+                trace.api(1)
                 sent_ids.append(p.message_id)
                 sent_ids.append(await _send_text_only())
 
@@ -176,32 +480,41 @@ class Nav:
         # 5) aux message с reply keyboard (request_contact)
         if screen.reply is not None:
             prompt = _safe_text(screen.reply_prompt, fallback="Нажмите кнопку ниже:")
-            aux = await bot.send_message(
-                chat_id=chat_id,
-                text=prompt,
-                reply_markup=screen.reply,
-                parse_mode=pm,
-            )
+            with trace.span("aux"):
+                aux = await bot.send_message(
+                    chat_id=chat_id,
+                    text=prompt,
+                    reply_markup=screen.reply,
+                    parse_mode=pm,
+                )
+            trace.api(1, prompt)
             sent_ids.append(aux.message_id)
 
         # 6) сохраняем последние message_id чтобы потом их удалить при следующем show_screen
         self._last_ids[chat_id] = sent_ids
+        self._shown[chat_id] = fp
 
         # 7) обновляем history stack
-        if push:
-            if replace_top:
-                st = self._stack.setdefault(chat_id, [])
-                if st:
-                    st[-1] = screen_id
-                else:
-                    st.append(screen_id)
-            else:
-                self.push(chat_id, screen_id)
+        self._update_stack(chat_id, screen_id, push, replace_top)
+
+        # 8) фоновая предзагрузка вероятных следующих экранов
+        if screen.prefetch:
+            self._schedule_prefetch(chat_id, screen.prefetch)
+
+        return "sent"
 
     async def back(self, bot: Bot, chat_id: int, fallback_screen: str) -> None:
-        self.pop(chat_id)
-        prev = self.peek(chat_id)
-        if not prev:
-            await self.show_screen(bot, chat_id, fallback_screen, push=True)
-            return
-        await self.show_screen(bot, chat_id, prev, push=False)
+        async with self._chat_turn(chat_id) as current:
+            if not current:
+                metrics.inc("nav_coalesced")
+                return
+            if defer_render(chat_id, lambda: self.back(bot, chat_id, fallback_screen)):
+                return
+            if drop_deferred(chat_id):
+                metrics.inc("nav_coalesced")
+            self.pop(chat_id)
+            prev = self.peek(chat_id)
+            if not prev:
+                await self._show_screen(bot, chat_id, fallback_screen, None, True, False, False)
+                return
+            await self._show_screen(bot, chat_id, prev, None, False, False, False)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from app.metrics import metrics
+from app.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Планировщик исходящих запросов к Bot API: middleware сессии бота.
+#
+# Каждый запрос, адресованный чату (есть chat_id), встаёт в очередь своей полосы:
+#   interactive — ответы пользователям (Nav, хендлеры), по умолчанию;
+#   admin       — уведомления админам;
+#   bulk        — рассылки.
+# Полосы обслуживаются строго по приоритету, внутри полосы — по кругу между
+# чатами (один чат с сотней сообщений не задерживает остальных). Общий лимит
+# скорости — на весь бот, плюс лимит на чат (с небольшим burst'ом) для рассылок
+# и уведомлений админам, и только на запросы, которые шлют новое сообщение
+# (send*, copy, forward): лимит Telegram на чат — про сообщения. Удаления и правки
+# идут в очереди чата по порядку, но лимит не тратят и не ждут. Полоса interactive
+# лимита чата не знает: переход Nav — это delete + send + delete + send, и с
+# лимитом каждый экран ждал бы секунды; частоту там держит антифлуд по апдейтам.
+# Flood control (RetryAfter) останавливает все запросы в чат, в любой полосе.
+# Запросы без chat_id (getUpdates, answerCallbackQuery и т.п.) идут мимо очереди.
+# О каждом отправленном сообщении узнают слушатели add_sent_listener (Nav: экран
+# больше не последний в чате).
+#
+# Полоса задаётся контекстом: `with outbound_lane(BULK): ...` — действует на все
+# вызовы бота внутри блока (и в задачах, созданных из него).
+
+INTERACTIVE = "interactive"
+ADMIN = "admin"
+BULK = "bulk"
+LANES = (INTERACTIVE, ADMIN, BULK)
+
+DEFAULT_RATE = 30.0  # запросов/сек на бота
+PER_CHAT_INTERVAL = 1.0  # сек между сообщениями в один чат в установившемся режиме
+PER_CHAT_BURST = 4  # столько сообщений в чат можно сразу
+
+_lane: ContextVar[str] = ContextVar("outbound_lane", default=INTERACTIVE)
+
+
+def _sends_message(method: TelegramMethod) -> bool:
+    """Запрос создаёт сообщение в чате (на него действует лимит чата)."""
+    name = method.__api_method__
+    return name.startswith(("send", "copyMessage", "forwardMessage")) and name != "sendChatAction"
+
+
+@contextmanager
+def outbound_lane(lane: str) -> Iterator[None]:
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        per_chat_interval: float = PER_CHAT_INTERVAL,
+        per_chat_burst: int = PER_CHAT_BURST,
+    ) -> None:
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.per_chat_burst = per_chat_burst
+        # полоса -> чат -> очередь ожидающих (future, тратит ли лимит чата); порядок чатов = круговой обход
+        self._queues: dict[str, OrderedDict[int | str, deque[tuple[asyncio.Future, bool]]]] = {
+            lane: OrderedDict() for lane in LANES
+        }
+        # GCRA: теоретическое время следующего сообщения в чат
+        self._chat_tat: dict[int | str, float] = {}
+        # RetryAfter: до какого момента в чат нельзя ничего
+        self._chat_blocked: dict[int | str, float] = {}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._sent_listeners: list[Callable[[int | str], None]] = []
+        self.dispatched = 0  # запросов выпущено из очереди (расход лимита, см. app/sharding.py)
+
+    def add_sent_listener(self, listener: Callable[[int | str], None]) -> None:
+        """listener(chat_id) вызывается после каждого успешного запроса, создавшего сообщение в чате."""
+        self._sent_listeners.append(listener)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        lane = _lane.get()
+        sends = _sends_message(method)
+        t0 = time.monotonic()
+        await self._enqueue(lane, chat_id, lane != INTERACTIVE and sends)
+        metrics.observe("outbound_wait_seconds", time.monotonic() - t0, lane=lane)
+        try:
+            response = await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            # flood control по чату: следующие запросы в него подождут
+            metrics.inc("outbound_retry_after", lane=lane)
+            until = time.monotonic() + e.retry_after
+            self._chat_blocked[chat_id] = max(self._chat_blocked.get(chat_id, 0.0), until)
+            raise
+        if sends:
+            for listener in self._sent_listeners:
+                listener(chat_id)
+        return response
+
+    async def _enqueue(self, lane: str, chat_id: int | str, paced: bool = True) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[lane].setdefault(chat_id, deque()).append((fut, paced))
+        self._wake.set()
+        await fut
+
+    def queued(self, lane: str) -> int:
+        return sum(len(q) for q in self._queues[lane].values())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for chats in self._queues.values():
+            for q in chats.values():
+                for fut, _ in q:
+                    fut.cancel()
+            chats.clear()
+
+    # ----- диспетчер -----
+
+    def _chat_delay(self, chat_id: int | str, now: float, paced: bool) -> float:
+        delay = self._chat_blocked.get(chat_id, now) - now
+        tat = self._chat_tat.get(chat_id)
+        if paced and tat is not None:
+            delay = max(delay, tat - (self.per_chat_burst - 1) * self.per_chat_interval - now)
+        return max(0.0, delay)
+
+    def _pick(self, now: float) -> tuple[asyncio.Future | None, float]:
+        """Следующий запрос: первая полоса по приоритету, в ней — первый по кругу чат,
+        которому уже можно. Второе значение — через сколько появится готовый (если никого)."""
+        wait = float("inf")
+        for lane in LANES:
+            chats = self._queues[lane]
+            for chat_id in list(chats):
+                q = chats[chat_id]
+                while q and q[0][0].done():  # отменённые ожидания
+                    q.popleft()
+                if not q:
+                    del chats[chat_id]
+                    continue
+                paced = q[0][1]
+                delay = self._chat_delay(chat_id, now, paced)
+                if delay > 0:
+                    wait = min(wait, delay)
+                    continue
+                fut, _ = q.popleft()
+                # чат уходит в конец круга
+                if q:
+                    chats.move_to_end(chat_id)
+                else:
+                    del chats[chat_id]
+                if paced:
+                    self._chat_tat[chat_id] = max(self._chat_tat.get(chat_id, now), now) + self.per_chat_interval
+                return fut, 0.0
+        return None, wait
+
+    async def _dispatch(self) -> None:
+        while True:
+            # токен берём до выбора запроса — выбираем самый приоритетный на момент отправки
+            await self.bucket.acquire()
+            while True:
+                self._wake.clear()
+                fut, wait = self._pick(time.monotonic())
+                if fut is not None:
+                    fut.set_result(None)
+                    self.dispatched += 1
+                    break
+                timeout = None if wait == float("inf") else wait
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            for lane in LANES:
+                metrics.set("outbound_queued", self.queued(lane), lane=lane)
+            if len(self._chat_tat) + len(self._chat_blocked) > 10_000:
+                now = time.monotonic()
+                self._chat_tat = {k: v for k, v in self._chat_tat.items() if v > now}
+                self._chat_blocked = {k: v for k, v in self._chat_blocked.items() if v > now}
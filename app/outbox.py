@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from app.callbacks import DigestPage
+from app.db.repo import OutboxMessage, Repo, utcnow_iso
+from app.metrics import metrics
+from app.outbound import ADMIN, outbound_lane
+
+logger = logging.getLogger(__name__)
+
+# Доставка outbox: уведомления лежат в БД с момента коммита заявки, пользователь
+# не ждёт отправки админам. Диспетчер просыпается по сигналу Repo (или раз в
+# POLL_INTERVAL), шлёт пачку параллельно и записывает итоги. Временные ошибки —
+# повтор с backoff, постоянные (бот заблокирован, плохой запрос) и исчерпанные
+# попытки — в dead letter (status='dead', видно в статистике /admin).
+#
+# Лиды (kind lead_*) для админа в режиме дайджеста не шлются, а откладываются
+# (status='held'); LeadDigests раз в N минут собирает их в одно сообщение со
+# счётчиками по типам и постраничным просмотром (см. handlers/admin_leads.py).
+
+POLL_INTERVAL = 30.0  # сек — на случай, если сигнал потерялся
+BATCH = 50
+CONCURRENCY = 8
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 5.0  # сек; 5, 10, 20, 40, 80...
+BACKOFF_MAX = 600.0
+
+DIGEST_TICK = 60.0  # сек между проверками, кому пора слать дайджест
+
+LEAD_CONTACT = "lead_contact"
+LEAD_VISIT = "lead_visit"
+LEAD_DESIGNER = "lead_designer"
+LEAD_LABELS = {
+    LEAD_CONTACT: "📲 Запросы связи",
+    LEAD_VISIT: "🏙 Заявки на визит",
+    LEAD_DESIGNER: "🎨 Дизайнеры",
+}
+
+
+def to_admins(
+    admin_ids: set[int], text: str, parse_mode: str | None = None, kind: str = "lead"
+) -> list[OutboxMessage]:
+    return [OutboxMessage(chat_id=aid, text=text, parse_mode=parse_mode, kind=kind) for aid in sorted(admin_ids)]
+
+
+def digest_text(digest_id: int, counts: dict[str, int]) -> str:
+    lines = [f"📬 Новые лиды (дайджест #{digest_id}): {sum(counts.values())}"]
+    for kind, n in sorted(counts.items(), key=lambda kv: -kv[1]):
+        lines.append(f"{LEAD_LABELS.get(kind, kind)}: {n}")
+    return "\n".join(lines)
+
+
+class OutboxDispatcher:
+    def __init__(
+        self, bot: Bot, repo: Repo, concurrency: int = CONCURRENCY, default_digest_minutes: int = 0
+    ) -> None:
+        self.bot = bot
+        self.repo = repo
+        self.concurrency = concurrency
+        self.default_digest_minutes = default_digest_minutes
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            # сбрасываем сигнал до выборки: записи, пришедшие во время отправки, разбудят снова
+            self._wake.clear()
+            try:
+                while await self.run_once() == BATCH:
+                    pass
+                timeout = await self._idle_timeout()
+            except Exception:
+                logger.exception("outbox: dispatch failed")
+                timeout = POLL_INTERVAL
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _idle_timeout(self) -> float:
+        """Спим до ближайшего повтора, но не дольше POLL_INTERVAL."""
+        nxt = await self.repo.next_outbox_at()
+        if nxt is None:
+            return POLL_INTERVAL
+        left = (datetime.fromisoformat(nxt) - datetime.now(timezone.utc)).total_seconds()
+        return min(POLL_INTERVAL, max(1.0, left))
+
+    async def run_once(self) -> int:
+        rows = await self.repo.due_outbox(utcnow_iso(), limit=BATCH)
+        if not rows:
+            return 0
+        fetched = len(rows)
+        rows = await self._hold_for_digest(rows)
+        sem = asyncio.Semaphore(self.concurrency)
+        sent: list[int] = []
+        failed: list[tuple[int, str, str | None]] = []
+
+        async def deliver(row: dict) -> None:
+            async with sem:
+                try:
+                    with outbound_lane(ADMIN):
+                        await self.bot.send_message(
+                            row["chat_id"],
+                            row["text"],
+                            parse_mode=row["parse_mode"],
+                            disable_web_page_preview=True,
+                        )
+                except Exception as e:
+                    failed.append((row["id"], f"{type(e).__name__}: {e}"[:300], self._next_attempt(row, e)))
+                    return
+                sent.append(row["id"])
+
+        await asyncio.gather(*(deliver(r) for r in rows))
+        await self.repo.mark_outbox_sent(sent)
+        await self.repo.mark_outbox_failed(failed)
+
+        metrics.inc("outbox_sent", len(sent))
+        for _, err, nxt in failed:
+            metrics.inc("outbox_dead" if nxt is None else "outbox_retries")
+            if nxt is None:
+                logger.warning("outbox: dead letter: %s", err)
+        return fetched
+
+    async def digest_minutes(self, admin_id: int, prefs: dict[int, dict] | None = None) -> int:
+        if prefs is None:
+            prefs = await self.repo.digest_prefs()
+        p = prefs.get(admin_id)
+        return p["digest_minutes"] if p else self.default_digest_minutes
+
+    async def _hold_for_digest(self, rows: list[dict]) -> list[dict]:
+        """Лиды админам в режиме дайджеста откладываем; возвращает то, что шлём сейчас."""
+        leads = [r for r in rows if r["kind"].startswith("lead")]
+        if not leads:
+            return rows
+        prefs = await self.repo.digest_prefs()
+        held = [r["id"] for r in leads if await self.digest_minutes(r["chat_id"], prefs) > 0]
+        if not held:
+            return rows
+        await self.repo.hold_outbox(held)
+        metrics.inc("outbox_held", len(held))
+        skip = set(held)
+        return [r for r in rows if r["id"] not in skip]
+
+    @staticmethod
+    def _next_attempt(row: dict, exc: BaseException) -> str | None:
+        """Время следующей попытки или None — больше не пытаемся."""
+        if isinstance(exc, (TelegramForbiddenError, TelegramBadRequest)):
+            return None
+        attempts = row["attempts"] + 1
+        if attempts >= MAX_ATTEMPTS:
+            return None
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1)) * (0.75 + random.random() / 2)
+        at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        return at.replace(microsecond=0).isoformat()
+
+
+class LeadDigests:
+    """Раз в DIGEST_TICK проверяет, кому из админов пора отправить дайджест отложенных лидов."""
+
+    def __init__(self, bot: Bot, repo: Repo, dispatcher: OutboxDispatcher) -> None:
+        self.bot = bot
+        self.repo = repo
+        self.dispatcher = dispatcher
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("lead digests: tick failed")
+            await asyncio.sleep(DIGEST_TICK)
+
+    async def run_once(self) -> int:
+        prefs = await self.repo.digest_prefs()
+        now = datetime.now(timezone.utc)
+        sent = 0
+        for admin_id in await self.repo.held_outbox_admins():
+            minutes = await self.dispatcher.digest_minutes(admin_id, prefs)
+            last = prefs.get(admin_id, {}).get("last_digest_at")
+            # minutes == 0: админ переключился на "сразу" — отдаём накопленное одним сообщением
+            if minutes and last and now - datetime.fromisoformat(last) < timedelta(minutes=minutes):
+                continue
+            if await self.send(admin_id):
+                sent += 1
+        return sent
+
+    async def send(self, admin_id: int) -> bool:
+        created = await self.repo.create_lead_digest(admin_id)
+        if created is None:
+            return False
+        digest_id, counts = created
+        kb = InlineKeyboardBuilder()
+        kb.button(text="Подробнее →", callback_data=DigestPage(digest_id=digest_id))
+        try:
+            with outbound_lane(ADMIN):
+                await self.bot.send_message(admin_id, digest_text(digest_id, counts), reply_markup=kb.as_markup())
+        except Exception:
+            logger.warning("lead digests: can't send #%s to %s", digest_id, admin_id, exc_info=True)
+            await self.repo.undo_lead_digest(digest_id)
+            return False
+        metrics.inc("lead_digests_sent")
+        metrics.inc("lead_digest_items", sum(counts.values()))
+        return True
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+
+from aiohttp import ClientConnectorError
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Повторы и circuit breaker для всех запросов к Bot API (middleware сессии бота).
+#
+# - RetryAfter: ждём сколько сказал Telegram (если не слишком долго) и повторяем;
+# - сеть / 5xx: повтор с экспоненциальным backoff и jitter;
+# - отправки (send*/copy/forward) не идемпотентны: при таймауте или 5xx сообщение
+#   могло уже уйти, поэтому их повторяем только если запрос точно не дошёл
+#   (RetryAfter, ошибка соединения) — иначе пользователь получил бы дубль;
+# - подряд BREAKER_THRESHOLD сбоев сети/5xx размыкают breaker: BREAKER_COOLDOWN
+#   секунд запросы сразу падают с CircuitOpenError, потом один пробный запрос.
+#
+# getUpdates идёт мимо: у polling в aiogram свой backoff.
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5  # сек
+BACKOFF_MAX = 8.0
+MAX_RETRY_AFTER = 30.0  # дольше ждать не будем — отдаём ошибку вызывающему
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+_NON_IDEMPOTENT_PREFIXES = ("send", "copy", "forward")
+
+
+class CircuitOpenError(TelegramNetworkError):
+    """Telegram недоступен: breaker разомкнут, запрос не отправлялся."""
+
+
+def _is_idempotent(method: TelegramMethod) -> bool:
+    return not method.__api_method__.startswith(_NON_IDEMPOTENT_PREFIXES)
+
+
+def not_sent(exc: BaseException) -> bool:
+    """Запрос точно не дошёл до Telegram: не смогли соединиться или breaker разомкнут."""
+    if isinstance(exc, CircuitOpenError):
+        return True
+    return isinstance(exc, TelegramNetworkError) and isinstance(exc.__cause__, ClientConnectorError)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """Пробный запрос прерван, ничего не узнали — следующий сможет попробовать снова."""
+        self._probing = False
+
+    def success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("telegram api: circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self._probing = False
+            metrics.inc("api_breaker_trips")
+            logger.warning("telegram api: circuit open for %.0fs after %s failures", self.cooldown, self.failures)
+
+
+class ResilientRequests(BaseRequestMiddleware):
+    def __init__(self, breaker: CircuitBreaker | None = None, max_attempts: int = MAX_ATTEMPTS) -> None:
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        name = method.__api_method__
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.breaker.allow():
+                metrics.inc("api_breaker_rejected", method=name)
+                raise CircuitOpenError(method=method, message="Telegram API circuit is open")
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                # Telegram жив, просто просит притормозить
+                self.breaker.success()
+                if attempt == self.max_attempts or e.retry_after > MAX_RETRY_AFTER:
+                    raise
+                metrics.inc("api_retries", method=name, reason="retry_after")
+                await asyncio.sleep(e.retry_after)
+                continue
+            except (TelegramNetworkError, TelegramServerError) as e:
+                self.breaker.failure()
+                metrics.inc("api_errors", method=name, kind=type(e).__name__)
+                retryable = _is_idempotent(method) or not_sent(e)
+                if attempt == self.max_attempts or not retryable or self.breaker.state != "closed":
+                    raise
+                metrics.inc("api_retries", method=name, reason=type(e).__name__)
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * (0.5 + random.random()))
+                continue
+            except TelegramAPIError:
+                # обычная ошибка запроса (BadRequest, Forbidden...) — Telegram отвечает
+                self.breaker.success()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.success()
+            return response
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from app.db.repo import Repo, utcnow_iso
+
+logger = logging.getLogger(__name__)
+
+# Отложенные задачи: строки scheduled_jobs (kind + JSON payload + run_at в UTC).
+# Планировщик раз в POLL_INTERVAL забирает просроченные задачи и отдаёт их
+# обработчику своего kind. Всё состояние — в БД, поэтому рестарт ничего не теряет:
+# задачи, прерванные посреди запуска, на старте возвращаются в очередь.
+
+POLL_INTERVAL = 15.0  # сек
+
+# обработчик получает id задачи и payload и возвращает короткий результат для админки;
+# после рестарта задачу могут запустить повторно — обработчик должен быть идемпотентным по id
+Handler = Callable[[int, dict], Awaitable[str | None]]
+
+
+class Scheduler:
+    def __init__(self, repo: Repo, poll_interval: float = POLL_INTERVAL) -> None:
+        self.repo = repo
+        self.poll_interval = poll_interval
+        self._handlers: dict[str, Handler] = {}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    async def add(self, kind: str, payload: dict, run_at: datetime, created_by: int | None) -> int:
+        if kind not in self._handlers:
+            raise ValueError(f"unknown scheduled job kind: {kind}")
+        run_at_iso = run_at.astimezone(timezone.utc).replace(microsecond=0).isoformat()
+        job_id = await self.repo.add_scheduled_job(kind, payload, run_at_iso, created_by)
+        self._wake.set()
+        return job_id
+
+    async def cancel(self, job_id: int) -> bool:
+        return await self.repo.cancel_scheduled_job(job_id)
+
+    async def start(self) -> None:
+        requeued = await self.repo.requeue_running_scheduled_jobs()
+        if requeued:
+            logger.info("scheduler: requeued %s interrupted jobs", requeued)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            # сбрасываем до выборки, чтобы не потерять add(), пришедший во время run_due()
+            self._wake.clear()
+            try:
+                await self.run_due()
+            except Exception:
+                logger.exception("scheduler: poll failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_due(self) -> int:
+        jobs = await self.repo.claim_due_scheduled_jobs(utcnow_iso())
+        for job in jobs:
+            handler = self._handlers.get(job["kind"])
+            if handler is None:
+                await self.repo.finish_scheduled_job(job["id"], "failed", "unknown kind")
+                continue
+            try:
+                result = await handler(job["id"], job["payload"])
+            except Exception as e:
+                logger.exception("scheduler: job #%s (%s) failed", job["id"], job["kind"])
+                await self.repo.finish_scheduled_job(job["id"], "failed", f"{type(e).__name__}: {e}"[:200])
+                continue
+            await self.repo.finish_scheduled_job(job["id"], "done", result)
+            logger.info("scheduler: job #%s (%s) done: %s", job["id"], job["kind"], result)
+        return len(jobs)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+from app.db.repo import Repo
+
+logger = logging.getLogger(__name__)
+
+# Сегменты пользователей для таргетинга рассылок.
+#
+# Каждому telegram_id выдаётся плотный индекс (в порядке created_at), сегмент —
+# это битовая маска (Python int) по этим индексам. Пересечения/объединения и
+# подсчёт — операции над int, без запросов к БД. Маски обновляются точечно:
+# Repo сообщает об изменении пользователя, мы перечитываем одну строку.
+#
+# Имена сегментов:
+#   all, consent, notify, registered, reachable, designer,
+#   role:<role>, city:<city>, new:<N>d (зарегистрирован за последние N дней)
+
+ROLES = ["collector", "dealer", "author", "interest"]
+CITIES = ["spb", "moscow", "yerevan", "dubai"]
+NEW_PERIODS = [7, 30]
+
+LABELS = {
+    "all": "Все",
+    "consent": "Дали согласие",
+    "notify": "Подписаны",
+    "registered": "Зарегистрированы",
+    "reachable": "Доступны",
+    "designer": "Дизайнеры",
+    "role:collector": "Коллекционеры",
+    "role:dealer": "Арт-дилеры",
+    "role:author": "Авторы",
+    "role:interest": "Интересуются",
+    "city:spb": "Санкт-Петербург",
+    "city:moscow": "Москва",
+    "city:yerevan": "Ереван",
+    "city:dubai": "Дубай",
+    "new:7d": "Новые за 7 дней",
+    "new:30d": "Новые за 30 дней",
+}
+
+def _row_segments(r) -> set[str]:
+    segs = {"all"}
+    if r["consent"] == 1:
+        segs.add("consent")
+        if r["notify_enabled"] == 1:
+            segs.add("notify")
+        if r["name"] and r["email"] and r["role"]:
+            segs.add("registered")
+    if r["unreachable_at"] is None:
+        segs.add("reachable")
+    if r["designer_interest"] == 1:
+        segs.add("designer")
+    if r["role"]:
+        segs.add(f"role:{r['role']}")
+    if r["city"]:
+        segs.add(f"city:{r['city']}")
+    return segs
+
+
+def _bits_from_indices(indices: list[int], size: int) -> int:
+    buf = bytearray((size + 7) // 8)
+    for i in indices:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def dimension(segment: str) -> str:
+    """role:collector -> role; designer -> designer. Внутри измерения сегменты объединяются (OR)."""
+    return segment.split(":", 1)[0]
+
+
+def build_spec(selected: list[str]) -> str:
+    """Выбор в пикере -> выражение: OR внутри измерения, AND между измерениями."""
+    groups: dict[str, list[str]] = {}
+    for seg in selected:
+        groups.setdefault(dimension(seg), []).append(seg)
+    if not groups:
+        return "all"
+    return "&".join("|".join(sorted(g)) for _, g in sorted(groups.items()))
+
+
+class Segments:
+    def __init__(self, repo: Repo) -> None:
+        self.repo = repo
+        self._idx: dict[int, int] = {}  # telegram_id -> индекс бита
+        self._ids: list[int | None] = []  # индекс -> telegram_id (None — удалён)
+        self._created: list[str] = []  # индекс -> created_at (по возрастанию)
+        self._bits: dict[str, int] = {}
+
+    async def load(self) -> None:
+        idx: dict[int, int] = {}
+        ids: list[int | None] = []
+        created: list[str] = []
+        members: dict[str, list[int]] = {}
+
+        async for r in self.repo.iter_users_for_segments():
+            i = len(ids)
+            idx[r["telegram_id"]] = i
+            ids.append(r["telegram_id"])
+            created.append(r["created_at"] or "")
+            for seg in _row_segments(r):
+                members.setdefault(seg, []).append(i)
+
+        self._idx, self._ids, self._created = idx, ids, created
+        self._bits = {seg: _bits_from_indices(ii, len(ids)) for seg, ii in members.items()}
+        logger.info("segments: loaded %s users, %s segments", len(ids), len(self._bits))
+
+    async def refresh_user(self, telegram_id: int) -> None:
+        """Точечное обновление масок после изменения строки users."""
+        r = await self.repo.get_user_segment_row(telegram_id)
+
+        i = self._idx.get(telegram_id)
+        if r is None:
+            if i is not None:
+                self._drop(i)
+                del self._idx[telegram_id]
+            return
+
+        if i is None:
+            i = len(self._ids)
+            self._idx[telegram_id] = i
+            self._ids.append(telegram_id)
+            self._created.append(r["created_at"] or "")
+
+        bit = 1 << i
+        want = _row_segments(r)
+        for seg in want:
+            self._bits[seg] = self._bits.get(seg, 0) | bit
+        for seg, b in self._bits.items():
+            if seg not in want and b & bit:
+                self._bits[seg] = b & ~bit
+
+    def _drop(self, i: int) -> None:
+        bit = 1 << i
+        self._ids[i] = None
+        for seg, b in self._bits.items():
+            if b & bit:
+                self._bits[seg] = b & ~bit
+
+    # ----- выражения -----
+
+    def bits(self, segment: str) -> int:
+        if segment.startswith("new:") and segment.endswith("d"):
+            days = int(segment[4:-1])
+            since = (datetime.now(timezone.utc) - timedelta(days=days)).replace(microsecond=0).isoformat()
+            k = bisect_left(self._created, since)
+            return self._bits.get("all", 0) >> k << k
+        return self._bits.get(segment, 0)
+
+    def evaluate(self, spec: str) -> int:
+        """spec: группы через '&', варианты внутри группы через '|', '!' — отрицание.
+        Пример: 'role:collector|role:dealer&city:spb&!designer'."""
+        result = self._bits.get("all", 0)
+        if not spec or spec == "all":
+            return result
+        for group in spec.split("&"):
+            acc = 0
+            for seg in group.split("|"):
+                seg = seg.strip()
+                if seg.startswith("!"):
+                    acc |= self._bits.get("all", 0) & ~self.bits(seg[1:])
+                else:
+                    acc |= self.bits(seg)
+            result &= acc
+        return result
+
+    def audience(self, spec: str) -> int:
+        """Аудитория рассылки: выражение ∩ подписаны ∩ доступны."""
+        return self.evaluate(spec) & self.bits("notify") & self.bits("reachable")
+
+    @staticmethod
+    def count(bits: int) -> int:
+        return bits.bit_count()
+
+    def members(self, bits: int) -> Iterator[int]:
+        """telegram_id по маске, в порядке индексов."""
+        raw = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        ids = self._ids
+        for byte_i, byte in enumerate(raw):
+            if not byte:
+                continue
+            base = byte_i << 3
+            for j in range(8):
+                if byte >> j & 1:
+                    tid = ids[base + j]
+                    if tid is not None:
+                        yield tid
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.metrics import metrics
+from app.outbound import OutboundScheduler
+from app.updates import ChatQueues, chat_key
+
+logger = logging.getLogger(__name__)
+
+# Несколько процессов-воркеров (WORKERS > 1): чаты делятся между ними по chat_id.
+#
+# Передний процесс принимает апдейты (polling или webhook, как обычно) и по
+# chat_id отправляет каждый своему воркеру через unix-сокет: одна строка JSON
+# на апдейт. Воркер — полноценный бот (Dispatcher, Nav, FSM, кэши) для своей
+# доли чатов; внутри — те же ChatQueues, так что порядок в чате сохраняется.
+# Чаты админов всегда у воркера 0: там же все фоновые задачи (рассылки,
+# планировщик, outbox, дайджесты), поэтому /admin управляет ими напрямую.
+#
+# Общее между процессами — только БД (WAL + busy_timeout, см. Repo.connect) и
+# события, которые воркер шлёт фронту, а фронт раздаёт остальным воркерам:
+#   content — каталог изменился, сбросить кэш экранов Nav;
+#   user    — строка users изменилась (сегменты рассылок);
+#   outbox  — новые уведомления, разбудить доставку;
+#   stale   — бот написал в чат другого воркера (рассылка, уведомление) — экран Nav устарел;
+#   outbound — сколько запросов в секунду воркер тратит из общего лимита бота.
+#
+# Лимит исходящих (OUTBOUND_RATE) — на весь бот. Рассылки идут только из воркера
+# 0, поэтому остальные получают по равной доле (её хватает на ответы своим
+# чатам), а воркер 0 — всё, что они не израсходовали: раз в USAGE_INTERVAL
+# каждый сообщает свой фактический расход (report_outbound), и воркер 0
+# выставляет себе лимит = общий − их расход (но не меньше своей доли).
+# Метрики у каждого процесса свои; отчёт /admin показывает воркер 0.
+
+STARTUP_TIMEOUT = 60.0  # сек на запуск воркеров (загрузка сегментов и т.п.)
+MAX_BUFFER_BYTES = 4 * 1024 * 1024  # неотправленного воркеру; больше — webhook отвечает 503
+LINE_LIMIT = 16 * 1024 * 1024  # длина одной строки протокола
+USAGE_INTERVAL = 1.0  # сек между отчётами воркера о расходе лимита исходящих
+
+EventHandler = Callable[[dict], Awaitable[None] | None]
+
+
+def socket_path(socket_dir: str, shard: int) -> str:
+    return os.path.join(socket_dir, f"worker-{shard}.sock")
+
+
+def shard_of_chat(chat_id: int, workers: int, admin_ids: set[int]) -> int:
+    if chat_id in admin_ids:
+        return 0
+    return chat_id % workers
+
+
+def shard_of(update: Update, workers: int, admin_ids: set[int]) -> int:
+    key = chat_key(update)
+    if key is None:
+        return update.update_id % workers
+    return shard_of_chat(key, workers, admin_ids)
+
+
+def _line(msg: dict) -> bytes:
+    return json.dumps(msg, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+def _update_line(update: Update) -> bytes:
+    body = update.model_dump_json(exclude_unset=True, by_alias=True)
+    return b'{"update":' + body.encode() + b"}\n"
+
+
+class ShardFront:
+    """Передний процесс: апдейт — воркеру его чата, события воркеров — остальным воркерам.
+    Для Poller / WebhookServer выглядит как ChatQueues (put, try_put, close)."""
+
+    def __init__(self, socket_dir: str, workers: int, admin_ids: set[int], concurrency: int, max_pending: int) -> None:
+        self.socket_dir = socket_dir
+        self.workers = workers
+        self.admin_ids = admin_ids
+        # для логов и max_connections webhook — суммарно по воркерам
+        self.concurrency = concurrency * workers
+        self.max_pending = max_pending * workers
+        self.lost = asyncio.Event()  # воркер отключился — фронту пора останавливаться
+        self._writers: list[asyncio.StreamWriter] = []
+        self._relays: list[asyncio.Task] = []
+        self._closed = False
+
+    async def connect(self, timeout: float = STARTUP_TIMEOUT) -> None:
+        deadline = time.monotonic() + timeout
+        for shard in range(self.workers):
+            path = socket_path(self.socket_dir, shard)
+            while True:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(path, limit=LINE_LIMIT)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"sharding: worker {shard} did not start in {timeout:.0f}s")
+                    await asyncio.sleep(0.2)
+            self._writers.append(writer)
+            self._relays.append(asyncio.create_task(self._relay(shard, reader)))
+        logger.info("sharding: %s workers connected", self.workers)
+
+    def try_put(self, update: Update) -> bool:
+        shard = shard_of(update, self.workers, self.admin_ids)
+        writer = self._writers[shard]
+        if writer.transport.get_write_buffer_size() > MAX_BUFFER_BYTES:
+            metrics.inc("shard_rejected", shard=shard)
+            return False
+        writer.write(_update_line(update))
+        metrics.inc("shard_updates", shard=shard)
+        return True
+
+    async def put(self, update: Update) -> None:
+        """Как try_put, но ждёт, пока воркер разберёт очередь."""
+        shard = shard_of(update, self.workers, self.admin_ids)
+        writer = self._writers[shard]
+        writer.write(_update_line(update))
+        metrics.inc("shard_updates", shard=shard)
+        await writer.drain()
+
+    def health(self) -> dict:
+        return {
+            "workers": self.workers,
+            "buffered": [w.transport.get_write_buffer_size() for w in self._writers],
+        }
+
+    async def _relay(self, shard: int, reader: asyncio.StreamReader) -> None:
+        try:
+            async for line in reader:
+                for i, writer in enumerate(self._writers):
+                    if i != shard:
+                        writer.write(line)
+                metrics.inc("shard_events")
+        except Exception:
+            logger.exception("sharding: relay from worker %s failed", shard)
+        if not self._closed:
+            logger.error("sharding: worker %s disconnected", shard)
+            self.lost.set()
+
+    async def close(self) -> None:
+        """EOF воркерам: они дообрабатывают очереди и завершаются."""
+        if self._closed:
+            return
+        self._closed = True
+        for t in self._relays:
+            t.cancel()
+        await asyncio.gather(*self._relays, return_exceptions=True)
+        for writer in self._writers:
+            writer.close()
+        await asyncio.gather(*(w.wait_closed() for w in self._writers), return_exceptions=True)
+
+
+class ShardWorker:
+    """Воркер: апдейты от фронта — в свои ChatQueues; события — фронту и от фронта."""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, queues: ChatQueues, path: str, **workflow_data) -> None:
+        self.dp = dp
+        self.bot = bot
+        self.queues = queues
+        self.path = path
+        self.workflow_data = workflow_data
+        self._handlers: dict[str, EventHandler] = {}
+        self._writer: asyncio.StreamWriter | None = None
+        self._done = asyncio.Event()
+
+    def on(self, event: str, handler: EventHandler) -> None:
+        """handler(msg) для события от других воркеров."""
+        self._handlers[event] = handler
+
+    def publish(self, event: str, **args: Any) -> None:
+        """Событие остальным воркерам (через фронт); пока фронт не подключён — не отправляется."""
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(_line({"event": event, **args}))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self._writer is not None:
+            writer.close()  # фронт один
+            return
+        self._writer = writer
+        try:
+            async for line in reader:
+                try:
+                    await self._handle(json.loads(line))
+                except Exception:
+                    logger.exception("sharding: bad message from front")
+        except Exception:
+            logger.exception("sharding: connection to front failed")
+        finally:
+            self._writer = None
+            writer.close()
+            self._done.set()
+
+    async def _handle(self, msg: dict) -> None:
+        if "update" in msg:
+            # ждём места в очередях — фронт упрётся в буфер сокета (backpressure)
+            await self.queues.put(Update.model_validate(msg["update"], context={"bot": self.bot}))
+            return
+        handler = self._handlers.get(msg.get("event"))
+        if handler is not None:
+            result = handler(msg)
+            if inspect.isawaitable(result):
+                await result
+
+    async def run(self) -> None:
+        """Работает, пока фронт не закроет соединение; затем дообрабатывает очереди."""
+        await self.dp.emit_startup(bot=self.bot, **self.workflow_data)
+        server = await asyncio.start_unix_server(self._serve, path=self.path, limit=LINE_LIMIT)
+        logger.info("sharding: worker listening on %s", self.path)
+        try:
+            await self._done.wait()
+        finally:
+            server.close()
+            await self.queues.close()
+            await self.dp.emit_shutdown(bot=self.bot, **self.workflow_data)
+
+
+async def report_outbound(worker: ShardWorker, shard: int, outbound: OutboundScheduler) -> None:
+    """Воркер ≠ 0: раз в USAGE_INTERVAL сообщает, сколько запросов в секунду выпустил."""
+    last = outbound.dispatched
+    while True:
+        await asyncio.sleep(USAGE_INTERVAL)
+        used, last = outbound.dispatched - last, outbound.dispatched
+        worker.publish("outbound", shard=shard, rate=used / USAGE_INTERVAL)
+
+
+class OutboundBudget:
+    """Воркер 0: лимит исходящих = общий лимит бота − расход остальных воркеров."""
+
+    def __init__(self, outbound: OutboundScheduler, total_rate: float, workers: int) -> None:
+        self.outbound = outbound
+        self.total_rate = total_rate
+        self.share = total_rate / workers
+        # пока отчётов нет, считаем, что остальные тратят свою долю целиком
+        self._used = {shard: self.share for shard in range(1, workers)}
+        self._apply()
+
+    def on_report(self, msg: dict) -> None:
+        self._used[msg["shard"]] = min(self.share, msg["rate"])
+        self._apply()
+
+    def _apply(self) -> None:
+        rate = max(self.share, self.total_rate - sum(self._used.values()))
+        self.outbound.bucket.set_rate(rate)
+        metrics.set("outbound_rate", rate)
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+import time
+from collections import deque
+from contextvars import ContextVar
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.metrics import SIZE_BUCKETS, metrics
+
+if TYPE_CHECKING:
+    from app.sharding import ShardFront
+
+logger = logging.getLogger(__name__)
+
+# Обработка апдейтов: разные чаты — параллельно, один чат — строго по очереди.
+#
+# У каждого чата своя очередь (deque) и, пока в ней что-то есть, своя задача,
+# которая разбирает её по одному апдейту. Одновременно обрабатывается не больше
+# concurrency апдейтов (общий семафор), так что медленный show_screen одного
+# пользователя (фото + несколько delete) не задерживает остальных, а переходы
+# Nav, FSM и альбомы внутри чата идут в том порядке, в каком их прислал Telegram.
+#
+# Двойные тапы: пока обрабатывается нажатие, следующие ждут в очереди чата, и
+# без подсказки Nav честно рисовал бы каждый промежуточный экран. Поэтому, если
+# за апдейтом в очереди чата ждёт ещё нажатие (callback_query), Nav не рисует
+# сразу, а откладывает отрисовку через defer_render(): сам хендлер отрабатывает,
+# cb.answer() тоже. Отложенный экран вытесняет только настоящая отрисовка
+# следующего нажатия (Nav зовёт drop_deferred). Нажатие, которое экран не
+# рисует (алерт, устаревшая кнопка), ничего не вытесняет: как только за
+# обработанным апдейтом нажатий не осталось, отложенный экран рисуется.
+# Нажатия, отброшенные анти-флудом (admit), в очередь не попадают вовсе.
+#
+# Всего в очередях не больше max_pending апдейтов: polling ждёт места перед
+# следующим getUpdates, webhook отвечает 503 (Telegram повторит).
+# Метрики: update_queue — апдейтов ждёт/в работе, update_chats — чатов с
+# очередью, update_wait_seconds — от приёма до начала обработки,
+# update_chat_depth — длина очереди чата при постановке.
+
+DRAIN_TIMEOUT = 10.0  # сек на дообработку очередей при остановке
+POLL_TIMEOUT = 30  # сек long polling getUpdates
+POLL_BACKOFF_MIN = 1.0  # сек паузы после ошибки getUpdates; растёт вдвое до POLL_BACKOFF_MAX
+POLL_BACKOFF_MAX = 30.0
+
+Render = Callable[[], Awaitable[Any]]
+
+# (очереди, чат апдейта в работе, его очередь) — ставит ChatQueues._run
+_current: ContextVar[tuple[ChatQueues, int, deque] | None] = ContextVar("chat_queue", default=None)
+
+
+def _taps(q: deque, start: int = 0) -> bool:
+    return any(u.callback_query is not None for u, _ in islice(q, start, None))
+
+
+def defer_render(chat_id: int, render: Render) -> bool:
+    """Если апдейт в работе — из chat_id и за ним в очереди уже ждёт нажатие, запоминает render
+    (вместо отложенного раньше) и возвращает True: нарисует ChatQueues, когда нажатий за ним не останется."""
+    current = _current.get()
+    if current is None or current[1] != chat_id or not _taps(current[2], 1):
+        return False
+    current[0]._deferred[chat_id] = render
+    return True
+
+
+def drop_deferred(chat_id: int) -> bool:
+    """Забывает отложенную отрисовку чата (её вытесняет новая); True — было что забыть."""
+    current = _current.get()
+    if current is None or current[1] != chat_id:
+        return False
+    return current[0]._deferred.pop(chat_id, None) is not None
+
+
+def chat_key(update: Update) -> int | None:
+    """Чат апдейта (для нажатий — чат сообщения с кнопкой, иначе пользователь); None — не к чату."""
+    try:
+        event = update.event
+    except Exception:  # тип апдейта, которого aiogram не знает
+        return None
+    message = getattr(event, "message", None)  # callback_query
+    chat = getattr(message, "chat", None) or getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None)
+    return user.id if user is not None else None
+
+
+class ChatQueues:
+    def __init__(
+        self,
+        process: Callable[[Update], Awaitable[Any]],
+        concurrency: int = 16,
+        max_pending: int = 1000,
+        admit: Callable[[Update], bool] | None = None,
+    ) -> None:
+        self.process = process
+        self.admit = admit
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max(1, max_pending)
+        self.pending = 0
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._chats: dict[int, deque[tuple[Update, float]]] = {}
+        self._deferred: dict[int, Render] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._room = asyncio.Event()
+        self._room.set()
+
+    @property
+    def chats(self) -> int:
+        return len(self._chats)
+
+    def health(self) -> dict:
+        return {"queue": self.pending, "chats": len(self._chats), "concurrency": self.concurrency}
+
+    def try_put(self, update: Update) -> bool:
+        """Ставит апдейт в очередь его чата; False — очереди заполнены.
+        Апдейт, который не пропустил admit (анти-флуд), принят, но в очередь не попадает."""
+        if self.pending >= self.max_pending:
+            return False
+        if self.admit is not None and not self.admit(update):
+            return True
+        key = chat_key(update)
+        item = (update, time.monotonic())
+        q = self._chats.get(key) if key is not None else None
+        if q is not None:
+            q.append(item)
+        else:
+            # апдейты не из чата (inline-запросы и т.п.) порядка не требуют — своя очередь на один апдейт
+            q = deque((item,))
+            if key is not None:
+                self._chats[key] = q
+            task = asyncio.create_task(self._run(key, q))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self.pending += 1
+        if self.pending >= self.max_pending:
+            self._room.clear()
+        metrics.observe("update_chat_depth", len(q), buckets=SIZE_BUCKETS)
+        metrics.set("update_queue", self.pending)
+        metrics.set("update_chats", len(self._chats))
+        return True
+
+    async def put(self, update: Update) -> None:
+        """Как try_put, но при заполненных очередях ждёт места."""
+        while not self.try_put(update):
+            await self._room.wait()
+
+    async def _run(self, key: int | None, q: deque[tuple[Update, float]]) -> None:
+        # q[0] — апдейт в работе; defer_render смотрит, есть ли нажатие за ним
+        if key is not None:
+            _current.set((self, key, q))
+        try:
+            while q:
+                # апдейт остаётся в голове очереди, пока обрабатывается: новые этого чата встают за ним
+                update, queued = q[0]
+                async with self._sem:
+                    metrics.observe("update_wait_seconds", time.monotonic() - queued)
+                    try:
+                        await self.process(update)
+                    except Exception:
+                        logger.exception("updates: update %s failed", update.update_id)
+                q.popleft()
+                self.pending -= 1
+                self._room.set()
+                if key in self._deferred and not _taps(q):
+                    await self._render_deferred(key)
+        finally:
+            # между последней проверкой q и этим местом await нет — апдейт не может потеряться
+            if key is not None and self._chats.get(key) is q:
+                del self._chats[key]
+                self._deferred.pop(key, None)
+            metrics.set("update_queue", self.pending)
+            metrics.set("update_chats", len(self._chats))
+
+    async def _render_deferred(self, key: int) -> None:
+        render = self._deferred.pop(key)
+        # вне апдейта: рисуем сразу, а не откладываем снова
+        token = _current.set(None)
+        try:
+            async with self._sem:
+                await render()
+        except Exception:
+            logger.exception("updates: deferred render for chat %s failed", key)
+        finally:
+            _current.reset(token)
+
+    async def close(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """Дообработать очереди (новых апдейтов уже не принимаем); не успели за timeout — отменяем."""
+        if not self._tasks:
+            return
+        _, left = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if left:
+            logger.warning("updates: %s updates dropped on shutdown", self.pending)
+            for t in left:
+                t.cancel()
+            await asyncio.gather(*left, return_exceptions=True)
+
+
+async def wait_for_signal() -> None:
+    """Ждёт SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    await stop.wait()
+
+
+class Poller:
+    """getUpdates вместо dp.start_polling: апдейты идут в ChatQueues, а не отдельной задачей каждый."""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, queues: ChatQueues | ShardFront, **workflow_data) -> None:
+        self.dp = dp
+        self.bot = bot
+        self.queues = queues
+        self.workflow_data = workflow_data
+
+    async def _poll(self) -> None:
+        # цикл getUpdates свой, на публичном API: offset = последний update_id + 1,
+        # ошибки сети / API — пауза с ростом и повтор (как в start_polling)
+        allowed = self.dp.resolve_used_update_types()
+        # запрос ждёт дольше long poll, иначе таймаут сессии оборвёт пустой ответ
+        request_timeout = int(self.bot.session.timeout + POLL_TIMEOUT)
+        offset: int | None = None
+        backoff = POLL_BACKOFF_MIN
+        failed = False
+        while True:
+            try:
+                updates = await self.bot.get_updates(
+                    offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed, request_timeout=request_timeout
+                )
+            except Exception as e:
+                failed = True
+                logger.error("polling: getUpdates failed (%s: %s), retry in %.0fs", type(e).__name__, e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, POLL_BACKOFF_MAX)
+                continue
+            if failed:
+                logger.info("polling: connection restored")
+                failed, backoff = False, POLL_BACKOFF_MIN
+            for update in updates:
+                await self.queues.put(update)
+                offset = update.update_id + 1
+
+    async def run(self) -> None:
+        """Работает до SIGINT/SIGTERM, затем дообрабатывает очереди."""
+        await self.dp.emit_startup(bot=self.bot, **self.workflow_data)
+        poll = asyncio.create_task(self._poll())
+        logger.info(
+            "polling: %s concurrent updates, up to %s queued", self.queues.concurrency, self.queues.max_pending
+        )
+        try:
+            await wait_for_signal()
+        finally:
+            poll.cancel()
+            await asyncio.gather(poll, return_exceptions=True)
+            await self.queues.close()
+            await self.dp.emit_shutdown(bot=self.bot, **self.workflow_data)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hmac
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.metrics import metrics
+from app.sharding import ShardFront
+from app.updates import ChatQueues, wait_for_signal
+
+logger = logging.getLogger(__name__)
+
+# Приём апдейтов через webhook (BOT_MODE=webhook).
+#
+# HTTP-обработчик только проверяет секрет, разбирает JSON и кладёт апдейт в
+# очередь его чата (app/updates.py) — Telegram сразу получает 200. Очереди
+# переполнены — отвечаем 503, Telegram повторит доставку позже (естественный
+# backpressure).
+#
+# Локальная проверка без публичного адреса: WEBHOOK_BASE_URL не задавать
+# (setWebhook тогда не вызывается) и слать записанные апдейты руками:
+#   curl -X POST localhost:8080/tg/webhook \
+#        -H 'X-Telegram-Bot-Api-Secret-Token: <WEBHOOK_SECRET>' \
+#        -H 'Content-Type: application/json' -d @update.json
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        queues: ChatQueues | ShardFront,
+        *,
+        path: str,
+        secret: str | None,
+        base_url: str | None,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        **workflow_data,
+    ) -> None:
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.host = host
+        self.port = port
+        self.queues = queues
+        self.workflow_data = workflow_data
+        self._runner: web.AppRunner | None = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.router.add_get("/healthz", self.health)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            metrics.inc("webhook_rejected", reason="secret")
+            return web.Response(status=403)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            metrics.inc("webhook_rejected", reason="payload")
+            logger.warning("webhook: bad payload from %s", request.remote)
+            return web.Response(status=400)
+        if not self.queues.try_put(update):
+            metrics.inc("webhook_rejected", reason="queue_full")
+            return web.Response(status=503)
+        metrics.inc("webhook_updates")
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response(self.queues.health())
+
+    async def start(self) -> None:
+        await self.dp.emit_startup(bot=self.bot, **self.workflow_data)
+
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("webhook: listening on %s:%s%s", self.host, self.port, self.path)
+
+        if self.base_url:
+            await self.bot.set_webhook(
+                f"{self.base_url}{self.path}",
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types(),
+                max_connections=min(100, self.queues.concurrency * 2),
+            )
+            logger.info("webhook: set to %s%s", self.base_url, self.path)
+
+    async def stop(self) -> None:
+        if self.base_url:
+            try:
+                await self.bot.delete_webhook()
+            except Exception:
+                logger.warning("webhook: can't delete webhook", exc_info=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        await self.queues.close()
+        await self.dp.emit_shutdown(bot=self.bot, **self.workflow_data)
+
+    async def run(self) -> None:
+        """Работает до SIGINT/SIGTERM, затем аккуратно останавливается."""
+        await self.start()
+        try:
+            await wait_for_signal()
+        finally:
+            await self.stop()
@@ -0,0 +1,139 @@
+"""CallbackIndex против настоящей цепочки aiogram.
+
+Индекс повторяет Router.propagate_event / TelegramEventObserver.trigger на
+внутренностях aiogram (см. app/callback_index.py), а CallbackIndex.verify
+сверяет только фильтры data. Здесь оба пути прогоняются через
+Dispatcher.feed_update с одними и теми же callback'ами (в том числе в
+состояниях FSM), и должен сработать один и тот же хендлер. Упал после
+обновления aiogram — индекс разошёлся с цепочкой.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+
+from aiogram import Bot, Dispatcher
+from aiogram.filters import StateFilter
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from app.callback_index import CallbackIndex
+from app.callbacks import (
+    AudiencePick, CityChoice, CollectionPage, CollectionsPage, DigestPage, DraftAction, DraftAnswer,
+    DraftCollection, DraftStatus, FeedPage, JobAction, LeadsPref, ProjectPage, RoleChoice, ScheduledCancel,
+    SculptureCard,
+)
+from app.main import include_routers
+
+CHAT_ID = 1001
+_ids = itertools.count(1)
+
+
+def _build() -> tuple[Dispatcher, CallbackIndex, list[str]]:
+    dp = Dispatcher(storage=MemoryStorage())
+    include_routers(dp)
+    index = CallbackIndex(dp)
+    dp.callback_query.outer_middleware(index)
+    assert index.enabled
+
+    ran: list[str] = []
+    for router in dp.chain_tail:
+        for h in router.observers["callback_query"].handlers:
+            name = f"{h.callback.__module__}.{h.callback.__qualname__}"
+
+            async def record(*args, name=name, **kwargs):
+                ran.append(name)
+
+            h.call = record
+    return dp, index, ran
+
+
+DP, INDEX, RAN = _build()
+BOT = Bot(token="42:TEST")
+
+
+def _states() -> list[str | None]:
+    """Без состояния, состояния из фильтров callback-хендлеров и одно постороннее."""
+    states = {"Unrelated:state"}
+    for router in DP.chain_tail:
+        for h in router.observers["callback_query"].handlers:
+            for f in h.filters or ():
+                if isinstance(f.callback, State):
+                    states.add(f.callback.state)
+                elif isinstance(f.callback, StateFilter):
+                    states |= {s.state if isinstance(s, State) else s for s in f.callback.states}
+    return [None, *sorted(s for s in states if isinstance(s, str) and s != "*")]
+
+
+def _samples() -> list[str]:
+    data = set(INDEX.exact)
+    for p in INDEX.prefixes:
+        data |= {p, p + "0", p + "1", p + "1:0", p + "zz", p + "x:1"}
+    data |= {
+        CollectionsPage(offset=10).pack(),
+        CollectionPage(collection_id=47, offset=10).pack(),
+        SculptureCard(sculpture_id=3, photo=1, in_place=True).pack(),
+        FeedPage(feed="featured", offset=20).pack(),
+        ProjectPage(n=2).pack(),
+        DraftCollection(collection_id=5).pack(),
+        DraftStatus(status="sold").pack(),
+        DraftAnswer(question="bc", yes=True).pack(),
+        DraftAnswer(question="feat", yes=False).pack(),
+        DraftAction(draft_id=9).pack(),
+        DraftAction(draft_id=9, discard=True).pack(),
+        JobAction(action="pause", job_id=4).pack(),
+        ScheduledCancel(job_id=4).pack(),
+        DigestPage(digest_id=2, page=1, edit=True).pack(),
+        AudiencePick.of("role:collector").pack(),
+        AudiencePick.of("designer").pack(),
+        AudiencePick(group="done").pack(),
+        LeadsPref(minutes=15).pack(),
+        LeadsPref(now=True).pack(),
+        RoleChoice(role="author").pack(),
+        CityChoice(city="yerevan").pack(),
+        "lp:15", "lp:now", "lp:7", "role:dealer", "role:admin", "city:spb", "city:paris", "bc:seg:designer",
+        "collection:47:0", "sculpture:3:1", "sculpture_photo_next:3:2", "dg:5", "dg:5:1",
+        "sculptures:new:10", "projects:2",
+        "co:1b:0:1", "aa:new:2", "as:stolen", "unknown", "", "menu", ":",
+    }
+    return sorted(data)
+
+
+async def _run(data: str, state: str | None, indexed: bool) -> list[str]:
+    INDEX.enabled = indexed
+    user = User(id=CHAT_ID, is_bot=False, first_name="t")
+    await DP.fsm.get_context(BOT, chat_id=CHAT_ID, user_id=CHAT_ID).set_state(state)
+    message = Message(message_id=1, date=0, chat=Chat(id=CHAT_ID, type="private"), text="x")
+    cb = CallbackQuery(id=str(next(_ids)), from_user=user, chat_instance="ci", message=message, data=data)
+    RAN.clear()
+    await DP.feed_update(BOT, Update(update_id=next(_ids), callback_query=cb))
+    return list(RAN)
+
+
+def test_index_runs_same_handler_as_dispatcher():
+    async def main() -> list[tuple]:
+        diffs = []
+        try:
+            for state in _states():
+                for data in _samples():
+                    chain = await _run(data, state, indexed=False)
+                    indexed = await _run(data, state, indexed=True)
+                    if chain != indexed:
+                        diffs.append((state, data, chain, indexed))
+        finally:
+            INDEX.enabled = True
+        return diffs
+
+    assert asyncio.run(main()) == []
+
+
+def test_state_filtered_handlers_are_reached():
+    async def main() -> tuple[list[str], list[str]]:
+        outside = await _run("bc:when:now", None, indexed=True)
+        inside = await _run("bc:when:now", "Broadcast:when", indexed=True)
+        return outside, inside
+
+    outside, inside = asyncio.run(main())
+    assert outside == []
+    assert inside == ["app.handlers.admin_broadcast.bc_when_now"]
@@ -0,0 +1,79 @@
+"""Compact: pack/unpack туда и обратно, строгий разбор, старые форматы кнопок."""
+from __future__ import annotations
+
+import pytest
+from aiogram.filters.callback_data import MAX_CALLBACK_LENGTH
+
+from app.callbacks import (
+    AudiencePick, CityChoice, CollectionPage, CollectionsPage, DigestPage, DraftAction, DraftAnswer, FeedPage,
+    JobAction, LeadsPref, ProjectPage, RoleChoice, SculptureCard, b36,
+)
+
+SAMPLES = [
+    CollectionsPage(offset=0),
+    CollectionsPage(offset=100_000),
+    CollectionPage(collection_id=47, offset=10),
+    SculptureCard(sculpture_id=123456789, photo=99, in_place=True),
+    FeedPage(feed="featured", offset=20),
+    ProjectPage(n=3),
+    DraftAnswer(question="bc", yes=True),
+    DraftAction(draft_id=9, discard=True),
+    JobAction(action="resume", job_id=4),
+    DigestPage(digest_id=2, page=1, edit=True),
+    AudiencePick.of("new:7d"),
+    AudiencePick.of("designer"),
+    LeadsPref(minutes=180),
+    LeadsPref(now=True),
+    RoleChoice(role="dealer"),
+    CityChoice(city="yerevan"),
+]
+
+
+@pytest.mark.parametrize("value", SAMPLES, ids=lambda v: v.pack())
+def test_round_trip(value):
+    packed = value.pack()
+    assert len(packed.encode()) <= MAX_CALLBACK_LENGTH
+    assert type(value).unpack(packed) == value
+
+
+def test_b36():
+    assert [b36(n) for n in (0, 35, 36, 47, -47)] == ["0", "z", "10", "1b", "-1b"]
+
+
+@pytest.mark.parametrize(
+    "cls, data",
+    [
+        (CollectionPage, "cp:1b:0"),  # чужой префикс
+        (CollectionPage, "co:1b"),  # не хватает сегмента
+        (CollectionPage, "co:1b:0:0"),  # лишний
+        (CollectionPage, "co:!!:0"),  # не base36
+        (CollectionPage, "co:0:0"),  # id >= 1
+        (SculptureCard, "sc:3:1:2"),  # лишний бит маски
+        (FeedPage, "fd:old:0"),  # не из Literal
+        (ProjectPage, "pj:4"),  # le=3
+        (RoleChoice, "rl:admin"),
+        (CityChoice, "city:paris"),
+        (LeadsPref, "lp:soon"),
+        (DigestPage, "dd:" + "1" * MAX_CALLBACK_LENGTH),
+    ],
+)
+def test_strict_unpack(cls, data):
+    with pytest.raises((ValueError, TypeError)):
+        cls.unpack(data)
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        ("collection:47:10", CollectionPage(collection_id=47, offset=10)),
+        ("sculpture_photo_next:3:2", SculptureCard(sculpture_id=3, photo=2, in_place=True)),
+        ("sculptures:new:10", FeedPage(feed="new", offset=10)),
+        ("dg:5", DigestPage(digest_id=5)),
+        ("dg:5:1", DigestPage(digest_id=5, page=1, edit=True)),
+        ("lp:now", LeadsPref(now=True)),
+        ("role:author", RoleChoice(role="author")),
+        ("city:spb", CityChoice(city="spb")),
+    ],
+)
+def test_legacy_buttons(data, expected):
+    assert type(expected).unpack(data) == expected
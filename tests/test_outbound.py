@@ -0,0 +1,135 @@
+"""OutboundScheduler: лимит чата (GCRA), приоритет полос, круговой обход, RetryAfter.
+
+_pick получает время явно, так что очередь проверяется на "часах" теста, без
+ожиданий. Полный путь через middleware — с заглушкой make_request вместо сети.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import DeleteMessage, SendMessage
+
+from app.outbound import ADMIN, BULK, INTERACTIVE, PER_CHAT_BURST, PER_CHAT_INTERVAL, OutboundScheduler, outbound_lane
+from app.utils.rate_limit import TokenBucket
+
+
+def _queue(s: OutboundScheduler, lane: str, chat_id: int, n: int, paced: bool = True) -> list[asyncio.Future]:
+    loop = asyncio.get_running_loop()
+    futs = [loop.create_future() for _ in range(n)]
+    q = s._queues[lane].setdefault(chat_id, deque())
+    q.extend((f, paced) for f in futs)
+    return futs
+
+
+def _drain(s: OutboundScheduler, now: float, futs: dict) -> list:
+    """Выбирает всё, что можно отправить в момент now; возвращает метки выбранных."""
+    order = []
+    while True:
+        fut, _ = s._pick(now)
+        if fut is None:
+            return order
+        order.append(futs[fut])
+
+
+def test_bulk_chat_gets_burst_then_one_per_interval():
+    async def main():
+        s = OutboundScheduler()
+        futs = {f: i for i, f in enumerate(_queue(s, BULK, 1, PER_CHAT_BURST + 2))}
+        first = _drain(s, 100.0, futs)
+        _, wait = s._pick(100.0)
+        later = _drain(s, 100.0 + PER_CHAT_INTERVAL, futs)
+        last = _drain(s, 100.0 + 2 * PER_CHAT_INTERVAL, futs)
+        return first, wait, later, last
+
+    first, wait, later, last = asyncio.run(main())
+    assert first == list(range(PER_CHAT_BURST))
+    assert wait == pytest.approx(PER_CHAT_INTERVAL)
+    assert later == [PER_CHAT_BURST]
+    assert last == [PER_CHAT_BURST + 1]
+
+
+def test_interactive_and_unpaced_requests_do_not_wait_for_chat_limit():
+    async def main():
+        s = OutboundScheduler()
+        futs = {f: ("i", i) for i, f in enumerate(_queue(s, INTERACTIVE, 1, 10, paced=False))}
+        futs |= {f: ("d", i) for i, f in enumerate(_queue(s, BULK, 2, 10, paced=False))}
+        return _drain(s, 0.0, futs)
+
+    order = asyncio.run(main())
+    assert len(order) == 20
+
+
+def test_lanes_by_priority_chats_round_robin():
+    async def main():
+        s = OutboundScheduler()
+        futs = {f: "bulk-a" for f in _queue(s, BULK, 1, 2)}
+        futs |= {f: "bulk-b" for f in _queue(s, BULK, 2, 1)}
+        futs |= {f: "admin" for f in _queue(s, ADMIN, 3, 1)}
+        futs |= {f: "interactive" for f in _queue(s, INTERACTIVE, 4, 1, paced=False)}
+        return _drain(s, 0.0, futs)
+
+    assert asyncio.run(main()) == ["interactive", "admin", "bulk-a", "bulk-b", "bulk-a"]
+
+
+def test_retry_after_blocks_chat_in_every_lane():
+    async def main():
+        s = OutboundScheduler()
+        s._chat_blocked[1] = 5.0
+        futs = {f: "blocked" for f in _queue(s, INTERACTIVE, 1, 1, paced=False)}
+        futs |= {f: "other" for f in _queue(s, BULK, 2, 1)}
+        now = _drain(s, 0.0, futs)
+        _, wait = s._pick(0.0)
+        return now, wait, _drain(s, 5.0, futs)
+
+    now, wait, later = asyncio.run(main())
+    assert now == ["other"]
+    assert wait == pytest.approx(5.0)
+    assert later == ["blocked"]
+
+
+def test_middleware_records_retry_after_and_reports_sends():
+    async def main():
+        s = OutboundScheduler(rate=1000)
+        sent: list = []
+        s.add_sent_listener(sent.append)
+
+        async def ok(bot, method):
+            return True
+
+        async def flood(bot, method):
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=30)
+
+        try:
+            await s(ok, None, SendMessage(chat_id=1, text="x"))
+            await s(ok, None, DeleteMessage(chat_id=1, message_id=5))
+            with outbound_lane(BULK):
+                with pytest.raises(TelegramRetryAfter):
+                    await s(flood, None, SendMessage(chat_id=2, text="x"))
+            return sent, dict(s._chat_blocked), s.dispatched
+        finally:
+            await s.close()
+
+    sent, blocked, dispatched = asyncio.run(main())
+    assert sent == [1]
+    assert set(blocked) == {2}
+    assert dispatched == 3
+
+
+def test_token_bucket_rate_change_and_pause(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.utils.rate_limit.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+    now[0] += 0.5
+    bucket.set_rate(10)  # накопленное за 0.5 с — по старой скорости: 1 токен
+    assert [bucket.try_acquire() for _ in range(2)] == [True, False]
+    now[0] += 0.1
+    assert bucket.try_acquire() is True
+    bucket.pause(3)  # RetryAfter у рассылки: пауза и запас с нуля
+    now[0] += 2.9
+    assert bucket.try_acquire() is False
+    now[0] += 0.25  # 0.15 с после паузы при 10/с
+    assert [bucket.try_acquire() for _ in range(2)] == [True, False]
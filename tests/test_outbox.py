@@ -0,0 +1,73 @@
+"""Outbox: что повторяем, что сразу в dead letter; доставка пачки на настоящей БД и заглушке бота."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from pathlib import Path
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError
+from aiogram.methods import SendMessage
+
+from app.db.repo import OutboxMessage, Repo
+from app.outbox import BACKOFF_BASE, BACKOFF_MAX, MAX_ATTEMPTS, OutboxDispatcher
+
+SCHEMA = Path(__file__).resolve().parents[1] / "app" / "db" / "schema.sql"
+METHOD = SendMessage(chat_id=1, text="x")
+
+
+def _delay(row: dict, exc: BaseException) -> float | None:
+    at = OutboxDispatcher._next_attempt(row, exc)
+    if at is None:
+        return None
+    return (datetime.fromisoformat(at) - datetime.now(timezone.utc)).total_seconds()
+
+
+def test_permanent_errors_go_to_dead_letter():
+    row = {"attempts": 0}
+    assert _delay(row, TelegramForbiddenError(method=METHOD, message="bot was blocked by the user")) is None
+    assert _delay(row, TelegramBadRequest(method=METHOD, message="can't parse entities")) is None
+
+
+def test_temporary_errors_back_off_until_attempts_run_out():
+    exc = TelegramNetworkError(method=METHOD, message="timeout")
+    for attempts in range(MAX_ATTEMPTS - 1):
+        expected = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempts)
+        delay = _delay({"attempts": attempts}, exc)
+        # джиттер ±25%, время округлено до секунды
+        assert expected * 0.75 - 1 <= delay <= expected * 1.25 + 1
+    assert _delay({"attempts": MAX_ATTEMPTS - 1}, exc) is None
+
+
+class _Bot:
+    def __init__(self, errors: dict[int, Exception]) -> None:
+        self.errors = errors
+        self.sent: list[int] = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.errors:
+            raise self.errors[chat_id]
+        self.sent.append(chat_id)
+
+
+def test_run_once_marks_sent_retry_and_dead(tmp_path):
+    async def main():
+        repo = Repo(str(tmp_path / "bot.db"))
+        await repo.connect()
+        try:
+            await repo.init_schema(str(SCHEMA))
+            async with repo._tx():
+                await repo._put_outbox(OutboxMessage(chat_id=c, text=f"to {c}", kind="notice") for c in (1, 2, 3))
+            bot = _Bot({
+                2: TelegramForbiddenError(method=METHOD, message="bot was blocked by the user"),
+                3: TelegramNetworkError(method=METHOD, message="timeout"),
+            })
+            fetched = await OutboxDispatcher(bot, repo).run_once()
+            cur = await repo._c().execute("SELECT chat_id, status, attempts FROM outbox ORDER BY chat_id")
+            return fetched, bot.sent, [tuple(r) for r in await cur.fetchall()]
+        finally:
+            await repo.close()
+
+    fetched, sent, rows = asyncio.run(main())
+    assert fetched == 3
+    assert sent == [1]
+    assert rows == [(1, "sent", 0), (2, "dead", 1), (3, "pending", 1)]
@@ -0,0 +1,114 @@
+"""Repo._tx: commit, rollback при ошибке и отмене, запрет вложенности, очередь писателей."""
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.db.repo import OutboxMessage, Repo
+
+SCHEMA = Path(__file__).resolve().parents[1] / "app" / "db" / "schema.sql"
+
+
+async def _repo(tmp_path) -> Repo:
+    repo = Repo(str(tmp_path / "bot.db"))
+    await repo.connect()
+    await repo.init_schema(str(SCHEMA))
+    return repo
+
+
+async def _outbox(repo: Repo) -> list[str]:
+    cur = await repo._c().execute("SELECT text FROM outbox ORDER BY id")
+    return [r["text"] for r in await cur.fetchall()]
+
+
+async def _put(repo: Repo, text: str) -> None:
+    await repo._put_outbox([OutboxMessage(chat_id=1, text=text)])
+
+
+def test_tx_commits_and_rolls_back(tmp_path):
+    async def main():
+        repo = await _repo(tmp_path)
+        try:
+            async with repo._tx():
+                await _put(repo, "kept")
+            with pytest.raises(ValueError):
+                async with repo._tx():
+                    await _put(repo, "lost")
+                    raise ValueError
+            return await _outbox(repo)
+        finally:
+            await repo.close()
+
+    assert asyncio.run(main()) == ["kept"]
+
+
+def test_cancelled_tx_rolls_back_and_frees_lock(tmp_path):
+    async def main():
+        repo = await _repo(tmp_path)
+        started = asyncio.Event()
+
+        async def slow():
+            async with repo._tx():
+                await _put(repo, "cancelled")
+                started.set()
+                await asyncio.sleep(10)
+
+        try:
+            task = asyncio.create_task(slow())
+            await started.wait()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            async with repo._tx():
+                await _put(repo, "after")
+            return await _outbox(repo)
+        finally:
+            await repo.close()
+
+    assert asyncio.run(main()) == ["after"]
+
+
+def test_nested_tx_is_refused(tmp_path):
+    async def main():
+        repo = await _repo(tmp_path)
+        try:
+            async with repo._tx():
+                await _put(repo, "outer")
+                with pytest.raises(RuntimeError):
+                    async with repo._tx():
+                        pass
+            return await _outbox(repo)
+        finally:
+            await repo.close()
+
+    assert asyncio.run(main()) == ["outer"]
+
+
+def test_failed_tx_does_not_undo_concurrent_writer(tmp_path):
+    # второй писатель ждёт замка и коммитит своё после отката первого
+    async def main():
+        repo = await _repo(tmp_path)
+        inside = asyncio.Event()
+
+        async def failing():
+            async with repo._tx():
+                await _put(repo, "failed")
+                inside.set()
+                await asyncio.sleep(0.01)
+                raise ValueError
+
+        async def writer():
+            await inside.wait()
+            async with repo._tx():
+                await _put(repo, "committed")
+
+        try:
+            results = await asyncio.gather(failing(), writer(), return_exceptions=True)
+            return [type(r).__name__ for r in results], await _outbox(repo)
+        finally:
+            await repo.close()
+
+    results, rows = asyncio.run(main())
+    assert results == ["ValueError", "NoneType"]
+    assert rows == ["committed"]
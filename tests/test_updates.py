@@ -0,0 +1,182 @@
+"""ChatQueues: порядок внутри чата, отложенная отрисовка Nav при очереди нажатий, анти-флуд до очереди."""
+from __future__ import annotations
+
+import asyncio
+import itertools
+
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from app.antiflood import AntiFlood
+from app.navigation import Nav
+from app.updates import ChatQueues
+
+_ids = itertools.count(1)
+
+
+def _tap(data: str, chat_id: int = 1) -> Update:
+    message = Message(message_id=1, date=0, chat=Chat(id=chat_id, type="private"), text="x")
+    user = User(id=chat_id, is_bot=False, first_name="t")
+    cb = CallbackQuery(id=str(next(_ids)), from_user=user, chat_instance="ci", message=message, data=data)
+    return Update(update_id=next(_ids), callback_query=cb)
+
+
+def _text(text: str, chat_id: int = 1) -> Update:
+    user = User(id=chat_id, is_bot=False, first_name="t")
+    message = Message(message_id=1, date=0, chat=Chat(id=chat_id, type="private"), from_user=user, text=text)
+    return Update(update_id=next(_ids), message=message)
+
+
+def _nav(shown: list[str]) -> Nav:
+    nav = Nav()
+
+    async def show(bot, chat_id, screen_id, *args):
+        shown.append(screen_id)
+        await asyncio.sleep(0)
+
+    nav._show_screen = show
+    return nav
+
+
+async def _feed(updates: list[Update], handler, **kwargs) -> ChatQueues:
+    queues = ChatQueues(handler, **kwargs)
+    for u in updates:
+        assert queues.try_put(u)
+    await queues.close()
+    return queues
+
+
+def test_same_chat_in_order_other_chats_in_parallel():
+    seen: list[str] = []
+    active = 0
+    peak = 0
+
+    async def handle(update: Update) -> None:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        seen.append(update.message.text)
+        active -= 1
+
+    updates = [_text(f"{chat}:{i}", chat_id=chat) for i in range(3) for chat in (1, 2)]
+    queues = asyncio.run(_feed(updates, handle, concurrency=4))
+    assert [t for t in seen if t.startswith("1:")] == ["1:0", "1:1", "1:2"]
+    assert [t for t in seen if t.startswith("2:")] == ["2:0", "2:1", "2:2"]
+    assert peak == 2
+    assert queues.pending == 0 and queues.chats == 0
+
+
+def test_only_last_screen_of_queued_taps_is_drawn():
+    shown: list[str] = []
+    nav = _nav(shown)
+
+    async def handle(update: Update) -> None:
+        await nav.show_screen(None, 1, update.callback_query.data)
+
+    asyncio.run(_feed([_tap(f"s{i}") for i in range(8)], handle))
+    assert shown == ["s7"]
+
+
+def test_tap_without_screen_does_not_swallow_previous_one():
+    # алерт / устаревшая кнопка за нажатием с экраном: экран всё равно рисуется
+    shown: list[str] = []
+    answered: list[str] = []
+    nav = _nav(shown)
+
+    async def handle(update: Update) -> None:
+        data = update.callback_query.data
+        answered.append(data)
+        if data.startswith("s"):
+            await nav.show_screen(None, 1, data)
+
+    taps = [_tap("s1"), _tap("s2"), _tap("alert"), _tap("expired")]
+    asyncio.run(_feed(taps, handle))
+    assert answered == ["s1", "s2", "alert", "expired"]
+    assert shown == ["s2"]
+
+
+def test_deferred_back_pops_once():
+    shown: list[str] = []
+    nav = _nav(shown)
+    nav._stack[1] = ["main", "catalog", "card"]
+
+    async def handle(update: Update) -> None:
+        if update.callback_query.data == "back":
+            await nav.back(None, 1, "main")
+
+    asyncio.run(_feed([_tap("back"), _tap("noop")], handle))
+    assert shown == ["catalog"]
+    assert nav._stack[1] == ["main", "catalog"]
+
+
+def test_antiflood_drops_before_queue():
+    shown: list[str] = []
+    nav = _nav(shown)
+    flood = AntiFlood(rate=0.001, burst=2)
+    flood._answer = lambda update: asyncio.sleep(0)
+    handled: list[str] = []
+
+    async def handle(update: Update) -> None:
+        handled.append(update.callback_query.data)
+        await nav.show_screen(None, 1, update.callback_query.data)
+
+    async def main() -> ChatQueues:
+        queues = ChatQueues(handle, admit=flood.admit)
+        for i in range(5):
+            assert queues.try_put(_tap(f"s{i}"))
+        assert queues.pending == 2
+        await queues.close()
+        return queues
+
+    asyncio.run(main())
+    assert handled == ["s0", "s1"]
+    assert shown == ["s1"]
+
+
+def test_antiflood_exempts_admins():
+    flood = AntiFlood(rate=0.001, burst=1, admin_ids={1})
+    assert all(flood.admit(_tap("s")) for _ in range(5))
+
+
+def test_antiflood_refills_and_counts_album_once(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.antiflood.time.monotonic", lambda: now[0])
+    flood = AntiFlood(rate=2.0, burst=2)
+    assert [flood.allow(1) for _ in range(3)] == [True, True, False]
+    now[0] += 0.5  # +1 токен
+    assert [flood.allow(1) for _ in range(2)] == [True, False]
+    now[0] += 0.5
+    assert [flood.allow(1, media_group="a") for _ in range(5)] == [True] * 5
+    assert flood.allow(1, media_group="b") is False
+
+
+def test_close_drains_queues_and_cancels_after_timeout():
+    done: list[str] = []
+
+    async def handle(update: Update) -> None:
+        if update.message.text == "stuck":
+            await asyncio.sleep(10)
+        done.append(update.message.text)
+
+    async def main() -> ChatQueues:
+        queues = ChatQueues(handle)
+        for text in ("a", "b"):
+            queues.try_put(_text(text, chat_id=1))
+        queues.try_put(_text("stuck", chat_id=2))
+        queues.try_put(_text("c", chat_id=2))
+        await queues.close(timeout=0.1)
+        return queues
+
+    queues = asyncio.run(main())
+    assert done == ["a", "b"]
+    assert queues.chats == 0
+
+
+def test_full_queues_refuse_updates():
+    async def main() -> list[bool]:
+        queues = ChatQueues(lambda update: asyncio.sleep(0), max_pending=2)
+        accepted = [queues.try_put(_text(str(i), chat_id=i)) for i in range(3)]
+        await queues.close()
+        return accepted
+
+    assert asyncio.run(main()) == [True, True, False]